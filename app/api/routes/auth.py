@@ -1,26 +1,38 @@
+import hashlib
+import json
 import logging
+import time
 import urllib.parse
+from typing import Dict, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse
 
 from app.core.config import settings
 from app.core.errors import AppError
+from app.core.http_cache import conditional_json
 from app.services.token_store import TokenStore, get_token_store
 from app.services.instagram_client import InstagramClient, get_instagram_client
+from app.services.token_manager import get_token_manager
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Resultado serializado de debug_probe por user token: (expira, body)
+_me_accounts_cache: Dict[str, Tuple[float, bytes]] = {}
+
 
 @router.get("/debug/me-accounts")
 async def debug_me_accounts(
+    request: Request,
+    refresh: bool = Query(False, description="Ignorar el cache y volver a consultar Graph"),
     token_store: TokenStore = Depends(get_token_store),
     ig: InstagramClient = Depends(get_instagram_client),
 ):
     """
     Diagnóstico: usa el user access token guardado para consultar
     /me/accounts y, por cada página, connected_instagram_account.
+    El resultado se cachea ME_ACCOUNTS_CACHE_TTL_S y soporta If-None-Match.
     """
     tokens = await token_store.get_tokens()
     if not tokens or not getattr(tokens, "user_access_token", None):
@@ -28,8 +40,14 @@ async def debug_me_accounts(
             status_code=401,
             detail="No autenticado (no hay user token guardado)",
         )
-    data = await ig.debug_probe(tokens.user_access_token)
-    return data
+    key = hashlib.sha256(tokens.user_access_token.encode()).hexdigest()
+    cached = _me_accounts_cache.get(key)
+    if refresh or cached is None or cached[0] < time.monotonic():
+        data = await ig.debug_probe(tokens.user_access_token)
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        _me_accounts_cache.clear()  # un solo user token vigente a la vez
+        cached = _me_accounts_cache[key] = (time.monotonic() + settings.ME_ACCOUNTS_CACHE_TTL_S, body)
+    return conditional_json(request, cached[1])
 
 
 @router.get("/login")
@@ -88,15 +106,22 @@ async def callback(
 
 
 @router.get("/me")
-async def me(token_store: TokenStore = Depends(get_token_store)):
+async def me(request: Request, token_store: TokenStore = Depends(get_token_store)):
     """
-    Devuelve datos básicos de la sesión guardada.
+    Devuelve datos básicos de la sesión guardada (ETag por contenido).
     """
     tokens = await token_store.get_tokens()
     if not tokens:
         raise HTTPException(status_code=401, detail="No autenticado")
-    return {
-        "page_id": tokens.page_id,
-        "ig_user_id": tokens.ig_user_id,
-        "scopes": tokens.scopes,
-    }
+    # Último resultado de /debug_token (None si el manager aún no lo verificó)
+    status = get_token_manager().status_for(tokens.access_token)
+    body = json.dumps(
+        {
+            "page_id": tokens.page_id,
+            "ig_user_id": tokens.ig_user_id,
+            "scopes": tokens.scopes,
+            "token_status": status.to_dict() if status else None,
+        },
+        separators=(",", ":"),
+    ).encode()
+    return conditional_json(request, body)
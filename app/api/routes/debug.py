@@ -0,0 +1,107 @@
+import asyncio
+import hmac
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from app.core.config import settings
+from app.core.fair_scheduler import get_scheduler
+from app.core.loop_monitor import get_loop_monitor
+from app.core.profiling import get_profiler
+from app.core.tracing import get_tracer
+from app.services.delta_sync import get_delta_sync
+from app.services.inbound import get_inbound_dispatcher
+from app.services.sinks import get_event_fanout
+
+
+def require_debug_key(x_debug_key: Optional[str] = Header(default=None)) -> None:
+    """Los endpoints de diagnóstico exigen X-Debug-Key; sin DEBUG_API_KEY configurado no se abren."""
+    expected = settings.DEBUG_API_KEY
+    if not expected or not hmac.compare_digest(expected, x_debug_key or ""):
+        raise HTTPException(status_code=403, detail="X-Debug-Key inválido")
+
+
+router = APIRouter(dependencies=[Depends(require_debug_key)])
+
+
+@router.get("/traces")
+async def list_traces(
+    mid: Optional[str] = Query(None, description="Solo trazas que incluyan este mid"),
+    slowest: bool = Query(False, description="Ordenar por duración (más lentas primero)"),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """Últimas trazas de entregas de webhook (ring buffer en memoria)."""
+    traces = get_tracer().query(mid=mid, slowest=slowest, limit=limit)
+    return {"count": len(traces), "traces": [t.to_dict() for t in traces]}
+
+
+@router.get("/sinks")
+async def sink_metrics():
+    """Por sink: profundidad de cola, entregados/descartados/fallidos y lag."""
+    return get_event_fanout().metrics()
+
+
+@router.get("/loop")
+async def loop_state(format: str = Query("json", pattern="^(json|prometheus)$")):
+    """Histograma de lag del event loop y últimos bloqueos (con stack)."""
+    monitor = get_loop_monitor()
+    if format == "prometheus":
+        return PlainTextResponse(monitor.histogram.to_prometheus("event_loop_lag_seconds"))
+    return monitor.snapshot()
+
+
+@router.get("/sync")
+async def sync_state():
+    """Delta sync: marcas de agua, intervalo actual y resultado de la última pasada."""
+    return get_delta_sync().snapshot()
+
+
+@router.post("/sync/run")
+async def run_sync():
+    """Fuerza una pasada de delta sync ahora (como mucho una cada DELTA_SYNC_MIN_INTERVAL_S)."""
+    if not settings.DELTA_SYNC_ENABLED:
+        raise HTTPException(status_code=409, detail="Delta sync desactivado (DELTA_SYNC_ENABLED=false)")
+    engine = get_delta_sync()
+    wait_s = settings.DELTA_SYNC_MIN_INTERVAL_S - (time.time() - engine.last_started_at)
+    if wait_s > 0:
+        raise HTTPException(status_code=429, detail=f"Última pasada muy reciente; reintentá en {wait_s:.0f}s")
+    return await engine.sync_once()
+
+
+@router.get("/scheduler")
+async def scheduler_state():
+    """Planificadores por cuenta (en curso, en cola, peso, espera media) y eventos del webhook pendientes."""
+    state = {kind: get_scheduler(kind).snapshot() for kind in ("inbound", "outbound")}
+    state["inbound_pending"] = get_inbound_dispatcher().snapshot()
+    return state
+
+
+@router.post("/profile/start")
+async def start_profile(seconds: float = Query(30, gt=0, le=3600), label: str = Query("process")):
+    """Muestrea todos los hilos del proceso durante `seconds` y guarda un .collapsed."""
+    return get_profiler().start_session(seconds, label)
+
+
+@router.post("/profile/stop")
+async def stop_profile():
+    return get_profiler().stop_session()
+
+
+@router.get("/profile/status")
+async def profile_status():
+    return get_profiler().status()
+
+
+@router.get("/profiles")
+async def list_profiles():
+    return {"profiles": await asyncio.to_thread(get_profiler().store.list)}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    path = get_profiler().store.path_for(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -1,13 +1,20 @@
+import time
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.core.http_cache import conditional_json, etag_matches, not_modified
 
 from app.schemas.messages import (
     Conversation,
+    SearchHit,
+    SearchResponse,
     SendMessageRequest,          # lo vamos a ampliar para compat
     SendMessageResponse,
 )
+from app.services.conversation_cache import ConversationCache, get_conversation_cache
 from app.services.instagram_client import InstagramClient, get_instagram_client
+from app.services.search_index import SearchIndex, get_search_index
 from app.services.token_store import TokenStore, get_token_store
 
 # --------------------------------------------------------------------
@@ -21,13 +28,56 @@ router_public = APIRouter()   # <-- público para recibir desde el Core
 # --------------------------------------------------------------------
 @router.get("/conversations", response_model=List[Conversation])
 async def list_conversations(
+    request: Request,
     ig: InstagramClient = Depends(get_instagram_client),
     token_store: TokenStore = Depends(get_token_store),
+    cache: ConversationCache = Depends(get_conversation_cache),
+):
+    """
+    Soporta GET condicional: con If-None-Match y sin cambios en la cuenta
+    responde 304 sin consultar Graph ni serializar.
+    """
+    tokens = await token_store.get_tokens()
+    if not tokens:
+        raise HTTPException(status_code=401, detail="No autenticado")
+    account = tokens.ig_user_id or tokens.page_id or ""
+    cached = cache.fresh(account)
+    if cached is not None and etag_matches(request, cached.etag):
+        return not_modified(cached.etag)
+    cached = await cache.get_or_refresh(account, lambda: ig.list_conversations(tokens))
+    return conditional_json(request, cached.body, cached.etag)
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_messages(
+    q: str = Query(..., min_length=1, description="Texto a buscar; 'term*' para prefijo"),
+    limit: int = Query(20, ge=1, le=200),
+    prefix: bool = Query(False, description="Tratar todos los términos como prefijo"),
+    index: SearchIndex = Depends(get_search_index),
+    token_store: TokenStore = Depends(get_token_store),
 ):
+    """Búsqueda full-text (sin tildes, con prefijos) sobre los DMs recibidos y enviados."""
     tokens = await token_store.get_tokens()
     if not tokens:
         raise HTTPException(status_code=401, detail="No autenticado")
-    return await ig.list_conversations(tokens)
+
+    started = time.perf_counter()
+    total, results, truncated = index.search(q, limit=limit, prefix=prefix)
+    hits = [
+        SearchHit(
+            mid=doc.mid,
+            sender_id=doc.sender_id,
+            recipient_id=doc.recipient_id,
+            sender_username=doc.sender_username,
+            recipient_username=doc.recipient_username,
+            text=doc.text,
+            timestamp=doc.timestamp,
+            score=round(score, 4),
+        )
+        for doc, score in results
+    ]
+    took_ms = (time.perf_counter() - started) * 1000
+    return SearchResponse(query=q, total=total, truncated=truncated, took_ms=round(took_ms, 3), hits=hits)
 
 
 @router.post("/send", response_model=SendMessageResponse)
@@ -75,13 +125,22 @@ async def _do_send(
     # Normalización: prioriza el formato nativo; cae al formato del Core
     recipient_id = payload.recipient_id or payload.to
     text = payload.text or payload.message
+    has_media = (payload.message_type or "text").lower() != "text" and bool(payload.media_url)
 
-    if not recipient_id or not text:
+    if not recipient_id or not (text or has_media):
         raise HTTPException(
             status_code=422,
-            detail="Faltan campos: usa recipient_id+text o to+message",
+            detail="Faltan campos: usa recipient_id+text, to+message o message_type+media_url",
         )
 
     # Construye un payload "nativo" para el cliente IG
-    normalized = SendMessageRequest(recipient_id=recipient_id, text=text)
-    return await ig.send_message(tokens, normalized)
\ No newline at end of file
+    normalized = SendMessageRequest(
+        recipient_id=recipient_id,
+        text=text,
+        message_type=payload.message_type,
+        media_url=payload.media_url,
+    )
+    result = await ig.send_message(tokens, normalized)
+    # El hilo cambió: el próximo listado de conversaciones se vuelve a leer
+    get_conversation_cache().invalidate(tokens.ig_user_id, tokens.page_id)
+    return result
\ No newline at end of file
@@ -1,18 +1,35 @@
 # app/api/routes/webhook.py
 
+import asyncio
+import functools
 import hashlib
 import hmac
 import json
 import logging
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+import uuid
+from datetime import datetime
+from typing import Optional
 
-import httpx
 from fastapi import APIRouter, Header, HTTPException, Request, Response
 
 from app.core.config import settings
+from app.core import deadline
+from app.core.deadline import deadline_scope
+from app.core.fair_scheduler import get_scheduler
+from app.core.tracing import get_tracer
+from app.services.auto_reply import get_auto_reply_engine
+from app.services.capture import get_webhook_capture
+from app.services.conversation_cache import get_conversation_cache
+from app.services.delta_sync import get_delta_sync
+from app.services.events import KIND_DELIVERY, KIND_MESSAGE, KIND_READ, IgEvent, parse_events
+from app.services.hedging import get_hedged_reader
+from app.services.http_clients import get_graph_http
+from app.services.inbound import get_inbound_dispatcher
+from app.services.media import get_media_relay
 from app.services.messenger import send_ig_message
-from app.services.token_store import get_token_store
+from app.services.profile_cache import get_profile_cache
+from app.services.search_index import index_message_safely
+from app.services.sinks import get_event_fanout
 
 logger = logging.getLogger(__name__)
 
@@ -67,65 +84,50 @@ def _verify_instagram_webhook_impl(request: Request) -> Response:
     raise HTTPException(status_code=403, detail="Token de verificación inválido")
 
 # --------------------------------------------------------------------------------------
-# Push al Core unificado
+# Usernames (Graph)
 # --------------------------------------------------------------------------------------
 
-def _iso_utc_from_ms(ts_ms: Optional[int]) -> str:
-    if ts_ms:
-        return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).isoformat()
-    return datetime.now(tz=timezone.utc).isoformat()
-
-async def _push_to_core_unified(
-    *,
-    channel: str,
-    sender: str,
-    message: str,
-    timestamp: str,
-    message_id: Optional[str] = None,
-    message_type: str = "text",
-    sender_name: Optional[str] = None,
-    recipient_name: Optional[str] = None,  # ✅ Agregar este parámetro
-):
-    """Envía mensaje al Core unificado."""
-    core_url = settings.CORE_UNIFIED_URL.rstrip("/") + "/api/v1/messages/unified"
-    
-    payload = {
-        "channel": channel,
-        "sender": sender,
-        "message": message,
-        "timestamp": timestamp,
-        "message_id": message_id,
-        "message_type": message_type,
-        "sender_name": sender_name,
-        "recipient_name": recipient_name,  # ✅ Agregar al payload
-    }
-    
-    async with httpx.AsyncClient() as client:
-        r = await client.post(core_url, json=payload, timeout=10.0)
-        logger.info(f"➡️  Push Core {r.status_code} {r.text[:200]}")
-        r.raise_for_status()
-
 async def _get_instagram_username(user_id: str) -> Optional[str]:
-    """Obtiene el username de Instagram desde Graph API."""
+    """
+    Obtiene el username de Instagram desde Graph API.
+    Lectura hedged y acotada por el deadline del evento: si no llega a tiempo
+    devuelve None y el flujo sigue (degradación en lugar de espera).
+    """
     if not user_id or not getattr(settings, "PAGE_ACCESS_TOKEN", None):
         return None
-    
+
+    cache = get_profile_cache()
+    hit, cached = cache.get(user_id)
+    if hit:
+        return cached
+
     try:
         url = f"https://graph.facebook.com/{settings.GRAPH_API_VERSION}/{user_id}"
         params = {
             "fields": "username,name",
             "access_token": settings.PAGE_ACCESS_TOKEN
         }
-        
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, params=params, timeout=5.0)
-            r.raise_for_status()
-            data = r.json()
-            return data.get("username") or data.get("name")
+
+        r = await get_hedged_reader().get(
+            get_graph_http(), url, params, timeout=5.0, key="graph:profile"
+        )
+        r.raise_for_status()
+        data = r.json()
+        username = data.get("username") or data.get("name")
+        cache.set(user_id, username)
+        return username
+    except asyncio.TimeoutError:
+        # Sin cachear: el perfil existe, solo que Graph no respondió dentro del presupuesto
+        logger.warning("⏱️ Username de %s no disponible dentro del presupuesto", user_id)
+        return None
     except Exception as e:
         logger.warning("⚠️ No se pudo obtener username para %s: %s", user_id, e)
+        cache.set(user_id, None)
         return None
 
+async def _none() -> None:
+    return None
+
 # --------------------------------------------------------------------------------------
 # GET (verify)
 # --------------------------------------------------------------------------------------
@@ -142,11 +144,110 @@ async def verify_instagram_webhook_root(request: Request):
 # POST (events)
 # --------------------------------------------------------------------------------------
 
+async def _process_message_event(event: IgEvent) -> None:
+    """Procesa un evento `message` dentro de su presupuesto (WEBHOOK_EVENT_BUDGET_S)."""
+    # Todo el evento queda acotado: lecturas a Graph, publish a los sinks y auto-respuesta
+    with deadline_scope(settings.WEBHOOK_EVENT_BUDGET_S):
+        await _handle_message_event(event)
+
+
+async def _handle_message_event(event: IgEvent) -> None:
+    """Índice, sinks, adjuntos y auto-respuesta."""
+    tracer = get_tracer()
+    sender, recipient, mid, text = event.sender, event.recipient, event.mid, event.text
+
+    hora = datetime.fromtimestamp(event.ts_ms / 1000).strftime("%H:%M:%S") if event.ts_ms else "?"
+    logger.info("💬 %s | PSID:%s → Page:%s | mid:%s | “%s”", hora, sender, recipient, mid, text)
+    # Entrante o eco: el hilo de la cuenta cambió (el ETag de /messages/conversations también)
+    get_conversation_cache().invalidate(sender, recipient)
+    # Ya procesado: el delta sync no lo vuelve a rellenar
+    get_delta_sync().note_seen(mid, event.ts_ms)
+
+    # ✅ Filtrar mensajes outgoing
+    if event.is_echo or sender == settings.INSTAGRAM_PAGE_ID:
+        logger.info("⏭️  Mensaje outgoing detectado, no se envía al core")
+        # Los ecos sí se indexan: incluyen respuestas enviadas desde la app de IG
+        index_message_safely(
+            mid=mid, text=text, sender_id=sender, recipient_id=recipient, timestamp=event.ts_s,
+        )
+        return
+
+    # Ambas lecturas en paralelo, con una porción acotada del presupuesto del evento
+    with tracer.span("graph.usernames"), deadline_scope(settings.WEBHOOK_LOOKUP_BUDGET_S):
+        sender_name, recipient_name = await asyncio.gather(
+            _get_instagram_username(sender) if sender else _none(),
+            _get_instagram_username(recipient) if recipient else _none(),
+        )
+
+    index_message_safely(
+        mid=mid,
+        text=text,
+        sender_id=sender,
+        recipient_id=recipient,
+        sender_username=sender_name,
+        recipient_username=recipient_name,
+        timestamp=event.ts_s,
+    )
+
+    # 1) Fan-out a los sinks (Core unificado, archivo, cola...): un solo dict compartido,
+    # encolado por sink; un sink lento no frena a los demás ni al webhook
+    with tracer.span("sinks.publish"):
+        await get_event_fanout().publish(event.unified_payload(sender_name, recipient_name))
+
+    # 1.b) Adjuntos: descarga/relay en streaming y en segundo plano
+    if event.attachments:
+        get_media_relay().relay_inbound(
+            event.attachments,
+            {"channel": "instagram", "message_id": mid, "sender": sender},
+        )
+
+    # 2) (Opcional) Auto-respuesta al usuario en IG según las reglas configuradas
+    try:
+        if getattr(settings, "PAGE_ACCESS_TOKEN", None):
+            with tracer.span("reply.rules"):
+                reply = await get_auto_reply_engine().reply_for(sender or "", text)
+            if reply and deadline.expired():
+                logger.warning("⏱️ Sin presupuesto para la auto-respuesta a %s (mid:%s)", sender, mid)
+            elif reply:
+                with tracer.span("reply.send"):
+                    resp = await send_ig_message(sender, reply)
+                logger.info("✅ Respuesta enviada | %s", resp)
+        else:
+            logger.info("ℹ️ PAGE_ACCESS_TOKEN no configurado; no se envía eco.")
+    except Exception as e:
+        logger.exception("❌ Error enviando respuesta: %s", e)
+
+
 async def _receive_instagram_webhook_impl(
     request: Request,
     x_hub_signature: Optional[str],
     x_hub_signature_256: Optional[str],
 ):
+    # Una traza por entrega de webhook (si está muestreada)
+    delivery_id = request.headers.get("X-Request-Id") or uuid.uuid4().hex
+    with get_tracer().trace("webhook.instagram", delivery=delivery_id):
+        return await _handle_instagram_delivery(request, x_hub_signature, x_hub_signature_256, delivery_id)
+
+
+async def _process_queued_event(event: IgEvent, account: Optional[str], delivery_id: str) -> None:
+    """Corre fuera de la request (InboundDispatcher), con traza propia."""
+    tracer = get_tracer()
+    with tracer.trace("webhook.event", delivery=delivery_id):
+        tracer.add_mid(event.mid)
+        # Turno justo por cuenta (la página/IG que recibe; en ecos, la que envía)
+        async with get_scheduler("inbound").slot(account):
+            with tracer.span("event.message", mid=event.mid or ""):
+                await _process_message_event(event)
+
+
+async def _handle_instagram_delivery(
+    request: Request,
+    x_hub_signature: Optional[str],
+    x_hub_signature_256: Optional[str],
+    delivery_id: str,
+):
+    tracer = get_tracer()
+
     # Bytes crudos (para firma)
     body = await request.body()
 
@@ -156,86 +257,50 @@ async def _receive_instagram_webhook_impl(
     logger.info("🪪 Firmas: X-Hub-Signature=%s | X-Hub-Signature-256=%s", sig_sha1, sig_sha256)
 
     # Validación de firma (solo estricta en producción)
-    if getattr(settings, "APP_SECRET", None) and not _valid_signature(sig_sha1, sig_sha256, body):
+    with tracer.span("signature"):
+        signature_ok = _valid_signature(sig_sha1, sig_sha256, body)
+
+    # Captura para replay (si está activada), antes de cualquier rechazo
+    capture = get_webhook_capture()
+    if capture is not None:
+        capture.record(request.url.path, dict(request.headers), body, signature_ok)
+    if getattr(settings, "APP_SECRET", None) and not signature_ok:
         if (getattr(settings, "ENV", "development") or "development").lower() != "production":
             logger.warning("⚠️ Firma inválida, bypass por entorno=%s", getattr(settings, "ENV", None))
         else:
             raise HTTPException(status_code=401, detail="Firma inválida")
 
     # Payload
-    payload = await request.json()
-    logger.info("📩 Payload:\n%s", json.dumps(payload, indent=2, ensure_ascii=False))
-
-    # Recorrido de eventos (estilo Messenger/IG)
-    # Meta puede enviar tanto entry[].changes[].value.messaging[] como entry[].messaging[]
-    entries = payload.get("entry", [])
-    for entry in entries:
-        # Variante A: messaging directo
-        events = entry.get("messaging")
-        if not events:
-            # Variante B: dentro de changes[].value.messaging
-            events = []
-            for change in entry.get("changes", []):
-                value = change.get("value", {})
-                events.extend(value.get("messaging", []))
-
-        for event in events or []:
-            sender = (event.get("sender") or {}).get("id")
-            recipient = (event.get("recipient") or {}).get("id")
-            ts_ms = event.get("timestamp")
-
-            if "message" in event:
-                message_obj = event.get("message", {})
-                text = message_obj.get("text") or ""
-                mid = message_obj.get("mid")
-                is_echo = message_obj.get("is_echo", False)
-
-                hora = datetime.fromtimestamp((ts_ms or 0) / 1000).strftime("%H:%M:%S") if ts_ms else "?"
-                logger.info("💬 %s | PSID:%s → Page:%s | mid:%s | “%s”", hora, sender, recipient, mid, text)
-
-                 # ✅ Filtrar mensajes outgoing
-                if is_echo or sender == settings.INSTAGRAM_PAGE_ID:
-                    logger.info("⏭️  Mensaje outgoing detectado, no se envía al core")
-                    continue
-
-                sender_name = await _get_instagram_username(sender) if sender else None
-                recipient_name = await _get_instagram_username(recipient) if recipient else None
-
-
-                # 1) Enviar al Core (unified)
-                try:
-                    await _push_to_core_unified(
-                        channel="instagram",
-                        sender=sender or "",
-                        message=text or "",
-                        timestamp=_iso_utc_from_ms(ts_ms),
-                        message_id=mid or "",
-                        message_type="text",
-                        sender_name=sender_name,
-                        recipient_name=recipient_name,
-                    )
-                except Exception as e:
-                    logger.exception("❌ Error al enviar al Core: %s", e)
-
-                # 2) (Opcional) Responder eco al usuario en IG
-                try:
-                    if getattr(settings, "PAGE_ACCESS_TOKEN", None):
-                        resp = await send_ig_message(sender, f"Recibí: {text or '(sin texto)'}")
-                        logger.info("✅ Respuesta enviada | %s", resp)
-                    else:
-                        logger.info("ℹ️ PAGE_ACCESS_TOKEN no configurado; no se envía eco.")
-                except Exception as e:
-                    logger.exception("❌ Error enviando respuesta: %s", e)
-
-            elif "read" in event:
-                watermark = (event["read"] or {}).get("watermark")
-                logger.info("👁️  PSID:%s leyó hasta %s", sender, watermark)
-            elif "delivery" in event:
-                mids = (event["delivery"] or {}).get("mids")
-                logger.info("📬 Entregado: %s", mids)
-            else:
-                logger.info("ℹ️  Evento no manejado: %s", list(event.keys()))
+    with tracer.span("parse"):
+        payload = await request.json()
+        # El dump completo (indentado) es caro y corre en el loop: solo en DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📩 Payload:\n%s", json.dumps(payload, indent=2, ensure_ascii=False))
+        else:
+            logger.info("📩 Payload: %d bytes, %d entries", len(body), len(payload.get("entry", [])))
+
+    # Normalización única: desde acá solo circulan IgEvent (sin el payload crudo)
+    with tracer.span("normalize"):
+        events = parse_events(payload)
+    del payload
+
+    jobs = []
+    for event in events:
+        if event.kind == KIND_MESSAGE:
+            tracer.add_mid(event.mid)
+            account = event.sender if event.is_echo else event.recipient
+            jobs.append((account, functools.partial(_process_queued_event, event, account, delivery_id)))
+        elif event.kind == KIND_READ:
+            logger.info("👁️  PSID:%s leyó hasta %s", event.sender, event.extra)
+        elif event.kind == KIND_DELIVERY:
+            logger.info("📬 Entregado: %s", list(event.extra))
+        else:
+            logger.info("ℹ️  Evento no manejado: %s", list(event.extra))
 
+    # Se procesan fuera de la request: esperar turno por cuenta no retiene la admisión
+    if jobs and not get_inbound_dispatcher().try_submit(jobs):
+        logger.warning("🚦 Entrega rechazada: demasiados eventos pendientes (%s)", [a for a, _ in jobs])
+        raise HTTPException(status_code=503, detail="Demasiados eventos pendientes; reintentar más tarde")
     return {"received": True}
 
 @router.post("/instagram")
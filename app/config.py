@@ -1,15 +1,5 @@
 # app/config.py
-from pydantic import BaseSettings
+# Compat: la configuración vive en app.core.config (una sola instancia de Settings)
+from app.core.config import Settings, settings
 
-class Settings(BaseSettings):
-    APP_ID: str
-    APP_SECRET: str
-    VERIFY_TOKEN: str  # o INSTAGRAM_VERIFY_TOKEN mapeado por .env
-    GRAPH_API_VERSION: str = "v19.0"
-    PAGE_ACCESS_TOKEN: str  # <-- IMPRESCINDIBLE
-
-    class Config:
-        env_file = ".env"
-        # opcional: env_file_encoding = "utf-8"
-
-settings = Settings()
+__all__ = ["Settings", "settings"]
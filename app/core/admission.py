@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RouteLimiter:
+    """
+    Límite de concurrencia adaptativo (AIMD) para un grupo de rutas.
+
+    - Aumento aditivo: cada request que termina por debajo de la latencia
+      objetivo suma ~1/limit (≈ +1 por "ventana" completa).
+    - Disminución multiplicativa: latencia por encima del objetivo o requests
+      descartadas por espera en cola reducen el límite (como mucho una vez
+      por intervalo, para no colapsarlo ante una ráfaga puntual).
+    - Las requests que no consiguen lugar esperan en cola FIFO como mucho
+      `queue_timeout_s`; si no, se descartan (503).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        *,
+        min_limit: int,
+        max_limit: int,
+        queue_timeout_s: float,
+        max_queue: int,
+        target_latency_s: float,
+    ):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_timeout_s = queue_timeout_s
+        self.max_queue = max_queue
+        self.target_latency_s = target_latency_s
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.last_shed_at = 0.0
+        self.admitted = 0
+        self.shed = 0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self) -> bool:
+        if self.in_flight < self.capacity and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self._on_shed()
+            return False
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # Se le concedió lugar justo al vencer: lo aprovecha
+                self.admitted += 1
+                return True
+            fut.cancel()
+            self._on_shed()
+            return False
+        except asyncio.CancelledError:
+            # El cliente se fue mientras esperaba: devolver el lugar si ya se le había dado
+            if fut.done() and not fut.cancelled():
+                self.in_flight -= 1
+                self._wake()
+            fut.cancel()
+            raise
+        finally:
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+        self.admitted += 1
+        return True
+
+    def release(self, latency_s: float) -> None:
+        self.in_flight -= 1
+        if latency_s <= self.target_latency_s:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / max(self.limit, 1.0))
+        else:
+            self._decrease()
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.capacity:
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            # El lugar se transfiere directamente al que espera
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * 0.9)
+
+    def _on_shed(self) -> None:
+        self.shed += 1
+        self.last_shed_at = time.monotonic()
+        self._decrease()
+
+    def retry_after_s(self) -> int:
+        return max(1, math.ceil(self.queue_timeout_s))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class AdmissionController:
+    def __init__(self, routes: Dict[str, int]):
+        # Prefijos más largos primero para que el match sea el más específico
+        self._routes: List[tuple] = []
+        for prefix, limit in sorted(routes.items(), key=lambda kv: -len(kv[0])):
+            self._routes.append(
+                (
+                    prefix,
+                    RouteLimiter(
+                        prefix,
+                        limit,
+                        min_limit=settings.ADMISSION_MIN_LIMIT,
+                        max_limit=max(limit, settings.ADMISSION_MAX_LIMIT),
+                        queue_timeout_s=settings.ADMISSION_QUEUE_TIMEOUT_S,
+                        max_queue=settings.ADMISSION_MAX_QUEUE,
+                        target_latency_s=settings.ADMISSION_TARGET_LATENCY_MS / 1000,
+                    ),
+                )
+            )
+
+    def limiter_for(self, path: str) -> Optional[RouteLimiter]:
+        for prefix, limiter in self._routes:
+            if path.startswith(prefix):
+                return limiter
+        return None
+
+    def degraded(self) -> bool:
+        horizon = time.monotonic() - settings.ADMISSION_DEGRADED_WINDOW_S
+        return any(l.last_shed_at and l.last_shed_at >= horizon for _, l in self._routes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {prefix: limiter.snapshot() for prefix, limiter in self._routes}
+
+
+class AdmissionControlMiddleware:
+    """Middleware ASGI: admite, encola o descarta (503 + Retry-After) según la ruta."""
+
+    def __init__(self, app, controller: "AdmissionController"):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limiter = self.controller.limiter_for(scope.get("path", ""))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            logger.warning("🚦 Carga descartada en %s (%s)", limiter.name, limiter.snapshot())
+            await _reject(send, limiter.retry_after_s())
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
+
+
+async def _reject(send, retry_after: int) -> None:
+    body = json.dumps({"detail": "Servicio sobrecargado, reintentar más tarde"}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(settings.ADMISSION_ROUTES)
+    return _admission_controller
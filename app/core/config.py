@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -28,6 +28,133 @@ class Settings(BaseSettings):
     CORE_UNIFIED_URL: str = Field(default="", env="CORE_UNIFIED_URL")  # p.ej. https://core.ngrok-free.app/api/v1/messages/unified
     CORE_API_KEY: str = Field(default="", env="CORE_API_KEY")
     PAGE_ACCESS_TOKEN: str = Field(default="", env=["PAGE_ACCESS_TOKEN"])
+
+    # Búsqueda full-text sobre DMs (índice en memoria)
+    SEARCH_INDEX_MAX_DOCS: int = 1_000_000
+    SEARCH_MAX_SCORED_DOCS: int = 10_000  # ranking sobre las N coincidencias más recientes
+
+    # Auto-respuestas (reglas en JSON, recarga en caliente)
+    AUTO_REPLY_RULES_PATH: str = "data/auto_reply_rules.json"
+    AUTO_REPLY_RELOAD_INTERVAL_S: float = 5.0
+    AUTO_REPLY_COOLDOWN_S: float = 0.0
+
+    # Lecturas a Graph acotadas por deadline + hedging
+    WEBHOOK_EVENT_BUDGET_S: float = 5.0  # todo el evento: usernames, publish a sinks y auto-respuesta
+    WEBHOOK_LOOKUP_BUDGET_S: float = 1.5  # usernames (Graph), dentro del presupuesto del evento
+    HEDGE_ENABLED: bool = True
+    HEDGE_DEFAULT_DELAY_MS: float = 250.0
+    HEDGE_MIN_DELAY_MS: float = 50.0
+    HEDGE_MAX_RATIO: float = 0.1
+    PROFILE_CACHE_TTL_S: float = 3600.0
+
+    # Control de admisión / load shedding (límites iniciales por prefijo de ruta)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_ROUTES: Dict[str, int] = {
+        "/webhooks/instagram": 64,
+        "/webhook/instagram": 64,
+        "/send/": 32,
+        "/messages/send": 32,
+    }
+    ADMISSION_MIN_LIMIT: int = 4
+    ADMISSION_MAX_LIMIT: int = 256
+    ADMISSION_QUEUE_TIMEOUT_S: float = 2.0
+    ADMISSION_MAX_QUEUE: int = 256
+    ADMISSION_TARGET_LATENCY_MS: float = 2500.0
+    ADMISSION_DEGRADED_WINDOW_S: float = 30.0
+
+    # Adjuntos: "local" (blobs en disco), "core" (streaming al Core) o "none"
+    MEDIA_INBOUND_TARGET: str = "none"  # none | local | core
+    MEDIA_BLOB_DIR: str = "data/media"
+    # Retención de blobs locales: se borran los menos usados al pasar cualquiera de los topes
+    MEDIA_BLOB_MAX_FILES: int = 1000
+    MEDIA_BLOB_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    MEDIA_CHUNK_SIZE: int = 64 * 1024
+    MEDIA_MAX_BYTES: int = 100 * 1024 * 1024
+    MEDIA_TIMEOUT_S: float = 120.0
+    MEDIA_URL_MEMO_TTL_S: float = 3600.0
+
+    # Endpoints de diagnóstico (/debug/*): opt-in y siempre con X-Debug-Key = DEBUG_API_KEY
+    DEBUG_ENDPOINTS_ENABLED: bool = False
+    DEBUG_API_KEY: str = ""
+
+    # Trazas por evento (ring buffer en memoria; export OTLP/JSON opcional)
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_RING_SIZE: int = 1000
+    TRACE_EXPORT_PATH: str = ""
+
+    # Profiling por muestreo (opt-in)
+    PROFILE_ENABLED: bool = False
+    PROFILE_ROUTES: List[str] = ["/webhooks/instagram", "/webhook/instagram", "/send/", "/messages/conversations"]
+    PROFILE_SAMPLE_RATE: float = 0.01
+    PROFILE_SLOW_MS: float = 1000.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_WINDOW_S: float = 60.0
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_MAX_FILES: int = 200
+    PROFILE_MAX_SESSION_S: float = 300.0
+
+    # Captura de webhooks para replay (JSONL rotativo, sin tokens ni PII si CAPTURE_SCRUB)
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_PATH: str = "data/captures/webhooks.jsonl"
+    CAPTURE_MAX_BYTES: int = 50 * 1024 * 1024
+    CAPTURE_BACKUPS: int = 5
+    CAPTURE_SCRUB: bool = True
+
+    # Arranque: pre-resolución DNS y pre-conexión a Graph / Core (ver /readyz)
+    STARTUP_WARMUP_ENABLED: bool = True
+    STARTUP_PRECONNECT: int = 2
+    STARTUP_WARMUP_TIMEOUT_S: float = 5.0
+    STARTUP_OPTIONAL_MAX_ATTEMPTS: int = 3  # Core: no bloquea /readyz; se deja de reintentar
+
+    # Snapshot de caches (usernames, conversaciones, estado de tokens) para reinicios en caliente
+    SNAPSHOT_ENABLED: bool = True
+    SNAPSHOT_PATH: str = "data/cache.snapshot"
+    SNAPSHOT_INTERVAL_S: float = 300.0
+    SNAPSHOT_MAX_AGE_S: float = 24 * 3600.0
+
+    # Delta sync: reconcilia webhooks perdidos leyendo solo hilos cambiados desde la marca de agua
+    DELTA_SYNC_ENABLED: bool = False  # opt-in: pagina Graph con el token de página
+    DELTA_SYNC_INTERVAL_S: float = 120.0
+    DELTA_SYNC_MIN_INTERVAL_S: float = 30.0
+    DELTA_SYNC_MAX_INTERVAL_S: float = 900.0
+    DELTA_SYNC_MESSAGES_LIMIT: int = 20
+    DELTA_SYNC_MAX_PAGES: int = 5
+    DELTA_SYNC_OVERLAP_S: float = 60.0  # la marca queda este margen antes del inicio de la pasada
+
+    # Monitor del event loop: histograma de lag y stack del callback que lo bloquea
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: float = 100.0
+    LOOP_BLOCK_THRESHOLD_MS: float = 250.0
+    LOOP_BLOCK_LOG_INTERVAL_S: float = 30.0
+    LOOP_STRICT_MODE: bool = False  # tests: I/O bloqueante en handlers async lanza BlockingCallError
+
+    # Planificación justa (DRR) por cuenta para el procesamiento de webhooks y los envíos
+    FAIR_SCHEDULER_ENABLED: bool = True
+    FAIR_INBOUND_CONCURRENCY: int = 32
+    FAIR_OUTBOUND_CONCURRENCY: int = 16
+    FAIR_ACCOUNT_MAX_IN_FLIGHT: int = 8
+    FAIR_ACCOUNT_WEIGHTS: Dict[str, float] = {}  # page / IG user id -> peso (default 1.0)
+    # El webhook responde al encolar; los eventos esperan turno fuera de la request
+    WEBHOOK_MAX_PENDING_EVENTS: int = 10_000
+    WEBHOOK_ACCOUNT_MAX_PENDING_EVENTS: int = 1_000
+    WEBHOOK_DRAIN_TIMEOUT_S: float = 10.0
+
+    # Fan-out de eventos entrantes a sinks. Cada entrada: {"type": "core_http"|"ndjson"|"queue",
+    # "name", opciones del sink (url, path, ...) y de su cola: max_queue, concurrency, batch_size,
+    # batch_wait_ms, policy ("drop"|"block"), retries}. Vacío = solo el Core (CORE_UNIFIED_URL)
+    SINKS: List[Dict[str, Any]] = []
+    SINK_BLOCK_TIMEOUT_S: float = 1.0
+    SINK_DRAIN_TIMEOUT_S: float = 5.0
+
+    # GET condicionales (ETag / If-None-Match) en endpoints de lectura
+    HTTP_CACHE_CONTROL: str = "private, no-cache"
+    CONVERSATIONS_CACHE_TTL_S: float = 30.0
+    ME_ACCOUNTS_CACHE_TTL_S: float = 300.0
+
+    # Ciclo de vida de tokens: /debug_token periódico, renovación y re-derivación del PAGE token
+    TOKEN_MANAGER_ENABLED: bool = True
+    TOKEN_CHECK_INTERVAL_S: float = 3600.0
+    TOKEN_REFRESH_MARGIN_S: float = 7 * 24 * 3600.0
     
     model_config = SettingsConfigDict(
         env_file=".env",
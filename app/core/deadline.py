@@ -0,0 +1,52 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Instante (time.monotonic) en que vence el presupuesto del evento en curso
+_deadline_at: ContextVar[Optional[float]] = ContextVar("deadline_at", default=None)
+
+
+@contextmanager
+def deadline_scope(budget_s: float) -> Iterator[None]:
+    """
+    Fija un presupuesto de tiempo para todo lo que se ejecute dentro del bloque
+    (incluye tareas creadas dentro, que heredan el contexto; para trabajo de
+    fondo usar `detached`). Los scopes anidados nunca extienden el plazo del
+    scope exterior.
+    """
+    at = time.monotonic() + max(0.0, budget_s)
+    outer = _deadline_at.get()
+    if outer is not None:
+        at = min(at, outer)
+    token = _deadline_at.set(at)
+    try:
+        yield
+    finally:
+        _deadline_at.reset(token)
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """
+    Sin presupuesto dentro del bloque: las tareas de fondo creadas acá no
+    heredan el deadline del evento que las disparó (sobreviven a él).
+    """
+    token = _deadline_at.set(None)
+    try:
+        yield
+    finally:
+        _deadline_at.reset(token)
+
+
+def remaining(default: float) -> float:
+    """Segundos disponibles: `default` acotado por el presupuesto vigente (>= 0)."""
+    at = _deadline_at.get()
+    if at is None:
+        return default
+    return max(0.0, min(default, at - time.monotonic()))
+
+
+def expired() -> bool:
+    at = _deadline_at.get()
+    return at is not None and time.monotonic() >= at
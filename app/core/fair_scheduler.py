@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.tracing import get_tracer
+
+
+class _Account:
+    __slots__ = ("waiters", "deficit", "in_flight", "granted", "wait_s_total")
+
+    def __init__(self):
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.deficit = 0.0
+        self.in_flight = 0
+        self.granted = 0
+        self.wait_s_total = 0.0
+
+
+class FairScheduler:
+    """
+    Reparto justo de `capacity` lugares concurrentes entre cuentas (page / IG
+    user id) con Deficit Round Robin.
+
+    - Cada cuenta con trabajo pendiente tiene su propia cola FIFO.
+    - En cada vuelta, la cuenta suma `quantum * peso` de crédito y recibe
+      lugares mientras le alcance: con pesos iguales, N cuentas activas se
+      reparten la capacidad en partes iguales aunque una tenga 10.000
+      eventos encolados y las otras uno.
+    - `max_in_flight` por cuenta acota cuánto de la capacidad puede ocupar
+      una sola cuenta aunque no haya competencia.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        *,
+        max_in_flight: int,
+        weights: Optional[Dict[str, float]] = None,
+        quantum: float = 1.0,
+    ):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_in_flight = max(1, max_in_flight)
+        self.weights = weights or {}
+        self.quantum = quantum
+        self.in_flight = 0
+        self._accounts: Dict[str, _Account] = {}
+        # Cuentas con trabajo en espera, en orden de ronda
+        self._active: "OrderedDict[str, None]" = OrderedDict()
+
+    def _weight(self, account: str) -> float:
+        return max(0.01, float(self.weights.get(account, 1.0)))
+
+    @asynccontextmanager
+    async def slot(self, account: Optional[str]) -> AsyncIterator[None]:
+        key = account or "_"
+        await self._acquire(key)
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    async def _acquire(self, key: str) -> None:
+        state = self._accounts.get(key)
+        if state is None:
+            state = self._accounts[key] = _Account()
+        # Camino rápido: hay lugar y nadie esperando
+        if not self._active and self.in_flight < self.capacity and state.in_flight < self.max_in_flight:
+            self._grant(state)
+            return
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        state.waiters.append(fut)
+        self._active.setdefault(key, None)
+        started = time.monotonic()
+        try:
+            with get_tracer().span("sched.wait", scheduler=self.name):
+                self._dispatch()
+                await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Se le había concedido el lugar: devolverlo
+                self._release(key)
+            else:
+                fut.cancel()
+                try:
+                    state.waiters.remove(fut)
+                except ValueError:
+                    pass
+                if not state.waiters:
+                    self._active.pop(key, None)
+                    if state.in_flight == 0:
+                        self._accounts.pop(key, None)
+            raise
+        state.wait_s_total += time.monotonic() - started
+
+    def _grant(self, state: _Account) -> None:
+        self.in_flight += 1
+        state.in_flight += 1
+        state.granted += 1
+
+    def _release(self, key: str) -> None:
+        state = self._accounts[key]
+        self.in_flight -= 1
+        state.in_flight -= 1
+        if state.in_flight == 0 and not state.waiters and key not in self._active:
+            # Sin trabajo: no se guarda estado (ni crédito acumulado) de cuentas inactivas
+            self._accounts.pop(key, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Entrega lugares libres recorriendo las cuentas activas en DRR."""
+        capped_in_a_row = 0
+        while self.in_flight < self.capacity and self._active:
+            key = next(iter(self._active))
+            state = self._accounts[key]
+            while state.waiters and state.waiters[0].done():
+                state.waiters.popleft()  # cancelados
+            if not state.waiters:
+                self._active.pop(key)
+                state.deficit = 0.0
+                continue
+            if state.in_flight >= self.max_in_flight:
+                # Tope por cuenta: pasa el turno sin acumular crédito
+                self._active.move_to_end(key)
+                capped_in_a_row += 1
+                if capped_in_a_row >= len(self._active):
+                    return
+                continue
+            capped_in_a_row = 0
+            if state.deficit < 1.0:
+                state.deficit += self.quantum * self._weight(key)
+                self._active.move_to_end(key)
+                continue
+            state.deficit -= 1.0
+            self._grant(state)
+            state.waiters.popleft().set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "accounts": {
+                key: {
+                    "queued": len(s.waiters),
+                    "in_flight": s.in_flight,
+                    "weight": self._weight(key),
+                    "granted": s.granted,
+                    "avg_wait_ms": round(s.wait_s_total / s.granted * 1000, 2) if s.granted else 0.0,
+                }
+                for key, s in self._accounts.items()
+            },
+        }
+
+
+class _Unlimited:
+    """Sin planificador (FAIR_SCHEDULER_ENABLED=false): mismo contrato, sin espera."""
+
+    name = "disabled"
+
+    @asynccontextmanager
+    async def slot(self, account: Optional[str]) -> AsyncIterator[None]:
+        yield
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"enabled": False}
+
+
+_schedulers: Dict[str, Any] = {}
+
+
+def get_scheduler(kind: str) -> Any:
+    """`inbound` (procesamiento de eventos del webhook) u `outbound` (envíos a Graph)."""
+    scheduler = _schedulers.get(kind)
+    if scheduler is None:
+        if not settings.FAIR_SCHEDULER_ENABLED:
+            scheduler = _Unlimited()
+        else:
+            capacity = settings.FAIR_INBOUND_CONCURRENCY if kind == "inbound" else settings.FAIR_OUTBOUND_CONCURRENCY
+            scheduler = FairScheduler(
+                kind,
+                capacity,
+                max_in_flight=settings.FAIR_ACCOUNT_MAX_IN_FLIGHT,
+                weights=settings.FAIR_ACCOUNT_WEIGHTS,
+            )
+        _schedulers[kind] = scheduler
+    return scheduler
@@ -0,0 +1,50 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+
+
+def etag_for(body: bytes) -> str:
+    """ETag fuerte a partir del contenido serializado."""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match usa comparación débil: "W/" se ignora y "*" coincide con todo."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": cache_control or settings.HTTP_CACHE_CONTROL},
+    )
+
+
+def conditional_json(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> Response:
+    """
+    200 con el JSON ya serializado, o 304 sin body si el cliente ya tiene
+    esta versión (If-None-Match).
+    """
+    etag = etag or etag_for(body)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control or settings.HTTP_CACHE_CONTROL},
+    )
@@ -1,9 +1,16 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import os
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
 
 
 def configure_logging() -> None:
+    global _listener
     # Preparar directorio de logs
     os.makedirs("logs", exist_ok=True)
     log_file = os.path.join("logs", "instagram-webhook.log")
@@ -12,6 +19,7 @@ def configure_logging() -> None:
     root = logging.getLogger()
     if root.handlers:
         root.handlers.clear()
+    shutdown_logging()
 
     fmt = "%(asctime)s %(levelname)s %(name)s %(message)s"
     formatter = logging.Formatter(fmt)
@@ -24,8 +32,21 @@ def configure_logging() -> None:
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
 
+    # El event loop solo encola el registro; stdout y el archivo se escriben en un hilo aparte
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown_logging)
+
     root.setLevel(logging.INFO)
-    root.addHandler(console_handler)
-    root.addHandler(file_handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
 
 
+def shutdown_logging() -> None:
+    """Vacía la cola de logs y detiene el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
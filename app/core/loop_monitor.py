@@ -0,0 +1,257 @@
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de lag
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LagHistogram:
+    """Histograma acumulable (estilo Prometheus) de lag del event loop en ms."""
+
+    def __init__(self, bounds=LAG_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # último = +Inf
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.sum_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def quantile(self, q: float) -> float:
+        """Cota superior del bucket donde cae el cuantil q."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return float(bound) if bound != float("inf") else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative, buckets = 0, {}
+        for bound, n in zip([str(b) for b in self.bounds] + ["+Inf"], self.counts):
+            cumulative += n
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets_le_ms": buckets,
+        }
+
+    def to_prometheus(self, name: str) -> str:
+        lines = [f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, n in zip([str(b / 1000) for b in self.bounds] + ["+Inf"], self.counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum {self.sum_ms / 1000}")
+        lines.append(f"{name}_count {self.count}")
+        return "\n".join(lines) + "\n"
+
+
+class LoopMonitor:
+    """
+    - Un task mide cuánto se atrasa cada `sleep(interval)` respecto de lo
+      esperado: ese atraso es el tiempo que el loop estuvo ocupado con otro
+      callback (lag) y va a un histograma.
+    - Un hilo watchdog mira el último latido del task: si el loop lleva más
+      de LOOP_BLOCK_THRESHOLD_MS sin latir, captura el stack del hilo del
+      loop (el callback que lo está bloqueando) y lo loguea con rate limit.
+    """
+
+    def __init__(self, interval_s: float, block_threshold_s: float, log_interval_s: float):
+        self.interval_s = interval_s
+        self.block_threshold_s = block_threshold_s
+        self.log_interval_s = log_interval_s
+        self.histogram = LagHistogram()
+        self.blocked: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self.blocked_total = 0
+        self.suppressed = 0
+        self._last_beat = time.monotonic()
+        self._last_log = 0.0
+        self._reported_beat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            now = time.monotonic()
+            self._last_beat = now
+            self.histogram.observe(max(0.0, now - expected) * 1000)
+
+    # --- Watchdog (hilo aparte: corre aunque el loop esté bloqueado) ---
+
+    def _watch(self) -> None:
+        period = max(0.01, self.block_threshold_s / 2)
+        while not self._stop.wait(period):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval_s
+            if stalled < self.block_threshold_s or beat == self._reported_beat:
+                continue
+            self._reported_beat = beat  # un solo reporte por bloqueo
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._report(stalled, "".join(traceback.format_stack(frame)))
+
+    def _report(self, stalled_s: float, stack: str) -> None:
+        self.blocked_total += 1
+        self.blocked.append({"at": time.time(), "blocked_ms": round(stalled_s * 1000, 1), "stack": stack})
+        now = time.monotonic()
+        if now - self._last_log < self.log_interval_s:
+            self.suppressed += 1
+            return
+        self._last_log = now
+        logger.warning(
+            "🐢 Event loop bloqueado ≥%.0fms (+%d sin loguear). Stack:\n%s",
+            stalled_s * 1000, self.suppressed, stack,
+        )
+        self.suppressed = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval_ms": self.interval_s * 1000,
+            "block_threshold_ms": self.block_threshold_s * 1000,
+            "lag": self.histogram.to_dict(),
+            "blocked_total": self.blocked_total,
+            "strict_violations": _strict_violations,
+            "recent_strict_violations": list(_strict_recent),
+            "recent_blocks": list(self.blocked),
+        }
+
+
+# --------------------------------------------------------------------------------------
+# Modo estricto (tests): I/O bloqueante dentro de un task del event loop -> excepción
+# --------------------------------------------------------------------------------------
+
+class BlockingCallError(RuntimeError):
+    pass
+
+
+# Operaciones de metadata (rename/remove/mkdir) son baratas en disco local y no se vigilan
+_BLOCKING_EVENTS = {"open", "time.sleep", "os.listdir", "os.scandir"}
+# Archivos de Python/stdlib/dependencias (imports diferidos, datos de librerías): no cuentan
+_IGNORED_PREFIXES = tuple({sys.prefix, sys.base_prefix, sys.exec_prefix})
+_IGNORED_SUFFIXES = (".py", ".pyc", ".so", ".pth")
+
+_allow_blocking: ContextVar[bool] = ContextVar("allow_blocking", default=False)
+_strict_installed = False
+_strict_violations = 0
+# Violaciones recientes: la excepción puede terminar tragada por un `except Exception`
+# del código que bloqueó, así que también quedan registradas acá (los tests las revisan)
+_strict_recent: Deque[str] = deque(maxlen=50)
+
+
+@contextmanager
+def allow_blocking() -> Iterator[None]:
+    """Marca un bloque con I/O síncrono deliberado (p.ej. archivos diminutos) en modo estricto."""
+    token = _allow_blocking.set(True)
+    try:
+        yield
+    finally:
+        _allow_blocking.reset(token)
+
+
+def _ignored_path(path: Any) -> bool:
+    if not isinstance(path, (str, bytes, os.PathLike)):
+        return isinstance(path, int)  # fd ya abierto
+    path = os.fsdecode(path)
+    return path.endswith(_IGNORED_SUFFIXES) or path.startswith(_IGNORED_PREFIXES)
+
+
+def _strict_hook(event: str, args: tuple) -> None:
+    global _strict_violations
+    if event not in _BLOCKING_EVENTS:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return  # fuera del loop (hilos de to_thread, scripts)
+    if asyncio.current_task() is None or _allow_blocking.get():
+        return
+    if event == "time.sleep":
+        if args and not args[0]:
+            return  # sleep(0)
+    elif _ignored_path(args[0] if args else "."):
+        return
+    _strict_violations += 1
+    message = f"I/O bloqueante en el event loop: {event}{args[:1]!r}"
+    _strict_recent.append(message)
+    logger.error("🚨 %s\n%s", message, "".join(traceback.format_stack(limit=8)[:-1]))
+    raise BlockingCallError(message)
+
+
+def take_strict_violations() -> List[str]:
+    """Violaciones registradas desde la última llamada (y las descarta)."""
+    taken = list(_strict_recent)
+    _strict_recent.clear()
+    return taken
+
+
+def install_strict_mode() -> None:
+    """Los audit hooks no se pueden quitar: se instala una sola vez por proceso."""
+    global _strict_installed
+    if not _strict_installed:
+        sys.addaudithook(_strict_hook)
+        _strict_installed = True
+        logger.info("🚨 Modo estricto del event loop activo: I/O bloqueante en handlers async falla")
+
+
+_loop_monitor: Optional[LoopMonitor] = None
+
+
+def get_loop_monitor() -> LoopMonitor:
+    global _loop_monitor
+    if _loop_monitor is None:
+        _loop_monitor = LoopMonitor(
+            interval_s=settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+            block_threshold_s=settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+            log_interval_s=settings.LOOP_BLOCK_LOG_INTERVAL_S,
+        )
+    return _loop_monitor
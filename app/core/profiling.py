@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_DEPTH = 128
+
+
+def collapse_stack(frame) -> str:
+    """Stack en formato "collapsed" (raíz;...;hoja), compatible con flamegraph.pl / speedscope."""
+    parts: List[str] = []
+    while frame is not None and len(parts) < _MAX_DEPTH:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+class StackSampler:
+    """
+    Profiler por muestreo: un hilo daemon toma el stack de los hilos
+    indicados (o de todos) cada `interval_s` con sys._current_frames().
+    No instrumenta el código perfilado, por eso se puede usar en producción.
+    """
+
+    def __init__(
+        self,
+        interval_s: float,
+        on_sample: Callable[[float, str], None],
+        thread_ids: Optional[set] = None,
+        duration_s: Optional[float] = None,
+        on_finish: Optional[Callable[[], None]] = None,
+    ):
+        self.interval_s = interval_s
+        self.on_sample = on_sample
+        self.thread_ids = thread_ids
+        self.duration_s = duration_s
+        self.on_finish = on_finish
+        self.started_at = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        deadline = self.started_at + self.duration_s if self.duration_s else None
+        try:
+            while not self._stop.wait(self.interval_s):
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                for tid, frame in sys._current_frames().items():
+                    if tid == own or (self.thread_ids is not None and tid not in self.thread_ids):
+                        continue
+                    self.on_sample(now, collapse_stack(frame))
+        finally:
+            if self.on_finish is not None:
+                self.on_finish()
+
+
+class ProfileStore:
+    """Archivos .collapsed en disco con tope de retención (se borran los más viejos)."""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def write(self, label: str, counts: Counter) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in label).strip("_")[:80]
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe or 'profile'}-{os.urandom(3).hex()}.collapsed"
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in counts.most_common():
+                f.write(f"{stack} {n}\n")
+        self._prune()
+        return name
+
+    def _prune(self) -> None:
+        files = self.list()
+        for entry in files[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, entry["name"]))
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".collapsed")]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for n in names:
+            st = os.stat(os.path.join(self.directory, n))
+            entries.append({"name": n, "size": st.st_size, "mtime": int(st.st_mtime)})
+        entries.sort(key=lambda e: e["name"], reverse=True)
+        return entries
+
+    def path_for(self, name: str) -> Optional[str]:
+        if os.path.basename(name) != name or not name.endswith(".collapsed"):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+class Profiler:
+    """
+    - Muestreo continuo y liviano del hilo del event loop en un ring buffer
+      (últimos PROFILE_WINDOW_S segundos). Al terminar una request lenta o
+      muestreada se extraen las muestras de su ventana de tiempo. Ojo: con
+      requests concurrentes, la ventana incluye trabajo de las demás.
+    - Sesiones a demanda de todo el proceso (todos los hilos) por N segundos.
+    """
+
+    def __init__(self):
+        self.store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+        interval = settings.PROFILE_INTERVAL_MS / 1000
+        self._ring: Deque[Tuple[float, str]] = deque(maxlen=max(1, int(settings.PROFILE_WINDOW_S / interval)))
+        self._continuous: Optional[StackSampler] = None
+        self._session: Optional[StackSampler] = None
+        self._session_counts: Counter = Counter()
+        self._session_label = ""
+        self.last_session_file: Optional[str] = None
+        self._background: set = set()
+
+    def write_in_background(self, label: str, counts: Counter) -> None:
+        task = asyncio.ensure_future(asyncio.to_thread(self.store.write, label, counts))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    # --- Muestreo continuo (por request) ---
+
+    def ensure_continuous(self) -> None:
+        if self._continuous is not None and self._continuous.running:
+            return
+        self._continuous = StackSampler(
+            settings.PROFILE_INTERVAL_MS / 1000,
+            lambda ts, stack: self._ring.append((ts, stack)),
+            thread_ids={threading.get_ident()},  # hilo del event loop
+        )
+        self._continuous.start()
+
+    def window(self, start: float, end: float) -> Counter:
+        counts: Counter = Counter()
+        for ts, stack in list(self._ring):
+            if start <= ts <= end:
+                counts[stack] += 1
+        return counts
+
+    # --- Sesiones de proceso completo ---
+
+    def start_session(self, seconds: float, label: str = "process") -> Dict[str, Any]:
+        if self._session is not None and self._session.running:
+            return self.status()
+        self._session_counts = Counter()
+        self._session_label = label
+        loop = asyncio.get_running_loop()
+
+        def record(_: float, stack: str) -> None:
+            self._session_counts[stack] += 1
+
+        def finish() -> None:
+            # Escribir el archivo fuera del hilo del sampler, sin bloquear el loop
+            loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._write_session()))
+
+        self._session = StackSampler(
+            settings.PROFILE_INTERVAL_MS / 1000,
+            record,
+            duration_s=min(seconds, settings.PROFILE_MAX_SESSION_S),
+            on_finish=finish,
+        )
+        self._session.start()
+        logger.info("🔬 Sesión de profiling iniciada (%ss)", seconds)
+        return self.status()
+
+    def stop_session(self) -> Dict[str, Any]:
+        if self._session is not None:
+            self._session.stop()
+        return self.status()
+
+    async def _write_session(self) -> None:
+        counts, self._session_counts = self._session_counts, Counter()
+        if counts:
+            self.last_session_file = await asyncio.to_thread(self.store.write, self._session_label, counts)
+            logger.info("🔬 Perfil de proceso guardado: %s", self.last_session_file)
+
+    def status(self) -> Dict[str, Any]:
+        running = self._session is not None and self._session.running
+        return {
+            "session_running": running,
+            "session_elapsed_s": round(time.monotonic() - self._session.started_at, 1) if running else None,
+            "session_samples": sum(self._session_counts.values()),
+            "last_session_file": self.last_session_file,
+            "continuous_running": self._continuous is not None and self._continuous.running,
+        }
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI opt-in: guarda el perfil de una fracción de las requests
+    (PROFILE_SAMPLE_RATE) y de toda request que supere PROFILE_SLOW_MS en las
+    rutas de PROFILE_ROUTES.
+    """
+
+    def __init__(self, app, profiler: "Profiler"):
+        self.app = app
+        self.profiler = profiler
+        self.routes = tuple(settings.PROFILE_ROUTES)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if not path.startswith(self.routes):
+            await self.app(scope, receive, send)
+            return
+
+        self.profiler.ensure_continuous()
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ended = time.monotonic()
+            elapsed_ms = (ended - started) * 1000
+            if sampled or elapsed_ms >= settings.PROFILE_SLOW_MS:
+                counts = self.profiler.window(started, ended)
+                if counts:
+                    label = f"{scope.get('method', '')}{path}-{int(elapsed_ms)}ms"
+                    self.profiler.write_in_background(label, counts)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Profiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
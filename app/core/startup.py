@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.services.http_clients import get_core_http, get_graph_http
+
+logger = logging.getLogger(__name__)
+
+GRAPH_ORIGIN = "https://graph.facebook.com"
+
+
+class StartupState:
+    """Tiempos de arranque y estado de pre-calentamiento de los pools HTTP."""
+
+    def __init__(self):
+        self.process_t0 = time.perf_counter()
+        self.timings_ms: Dict[str, float] = {}
+        self.upstreams: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, name: str) -> None:
+        self.timings_ms[name] = round((time.perf_counter() - self.process_t0) * 1000, 1)
+
+    @property
+    def ready(self) -> bool:
+        # El Core es un sink asíncrono: el servicio funciona sin él, no bloquea la readiness
+        return bool(self.upstreams) and all(u["warm"] for u in self.upstreams.values() if u["required"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "timings_ms": self.timings_ms, "upstreams": self.upstreams}
+
+    # --- Pre-calentamiento ---
+
+    def _targets(self) -> List[tuple]:
+        # (nombre, origen, cliente, requerido para /readyz)
+        targets = [("graph", GRAPH_ORIGIN, get_graph_http(), True)]
+        if settings.CORE_UNIFIED_URL:
+            parts = urlsplit(settings.CORE_UNIFIED_URL)
+            targets.append(("core", f"{parts.scheme}://{parts.netloc}", get_core_http(), False))
+        return targets
+
+    def start_warmup(self) -> None:
+        targets = self._targets()
+        for name, origin, _, required in targets:
+            self.upstreams[name] = {"origin": origin, "warm": False, "required": required, "attempts": 0}
+        self._task = asyncio.create_task(self._warm_all(targets))
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _warm_all(self, targets: List[tuple]) -> None:
+        await asyncio.gather(*(self._warm_until_ready(*t) for t in targets))
+        self.mark("warm")
+        logger.info("🔥 Pools HTTP calientes: %s", {k: v.get("ms") for k, v in self.upstreams.items()})
+
+    async def _warm_until_ready(self, name: str, origin: str, client: httpx.AsyncClient, required: bool) -> None:
+        """Los requeridos reintentan hasta lograrlo; los opcionales, STARTUP_OPTIONAL_MAX_ATTEMPTS veces."""
+        backoff = 1.0
+        state = self.upstreams[name]
+        while True:
+            if not required and state["attempts"] >= settings.STARTUP_OPTIONAL_MAX_ATTEMPTS:
+                logger.warning("⚠️ Se deja de pre-conectar a %s (opcional) tras %d intentos", origin, state["attempts"])
+                return
+            state["attempts"] += 1
+            try:
+                state["ms"] = await self._warm_one(origin, client)
+                state["warm"] = True
+                state.pop("error", None)
+                return
+            except Exception as e:
+                state["error"] = f"{type(e).__name__}: {e}"
+                logger.warning("⚠️ No se pudo pre-conectar a %s (%s); reintento en %.0fs", origin, e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def _warm_one(self, origin: str, client: httpx.AsyncClient) -> float:
+        """Resuelve DNS y abre N conexiones (TCP + TLS) que quedan en el pool keep-alive."""
+        started = time.perf_counter()
+        parts = urlsplit(origin)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        await asyncio.wait_for(
+            asyncio.get_running_loop().getaddrinfo(parts.hostname, port),
+            timeout=settings.STARTUP_WARMUP_TIMEOUT_S,
+        )
+        # Cualquier respuesta HTTP (incluso 4xx) deja la conexión establecida en el pool
+        await asyncio.gather(
+            *(
+                client.head(origin + "/", timeout=settings.STARTUP_WARMUP_TIMEOUT_S)
+                for _ in range(max(1, settings.STARTUP_PRECONNECT))
+            )
+        )
+        return round((time.perf_counter() - started) * 1000, 1)
+
+
+_startup_state: Optional[StartupState] = None
+
+
+def get_startup_state() -> StartupState:
+    global _startup_state
+    if _startup_state is None:
+        _startup_state = StartupState()
+    return _startup_state
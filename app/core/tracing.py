@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start", "end", "attrs")
+
+    def __init__(self, span_id: str, parent_id: Optional[str], name: str, attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+
+class Trace:
+    """Línea de tiempo de una entrega de webhook (o request): spans con tiempos monotónicos."""
+
+    __slots__ = ("trace_id", "name", "mids", "wall_start_ns", "start", "end", "spans", "attrs")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.trace_id = os.urandom(16).hex()
+        self.name = name
+        self.mids: List[str] = []
+        self.wall_start_ns = time.time_ns()
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.spans: List[Span] = []
+        self.attrs = attrs
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.monotonic()
+        return (end - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "mids": self.mids,
+            "started_at_ns": self.wall_start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "spans": [
+                {
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "name": s.name,
+                    "offset_ms": round((s.start - self.start) * 1000, 3),
+                    "duration_ms": round(((s.end or s.start) - s.start) * 1000, 3),
+                    "attrs": s.attrs,
+                }
+                for s in self.spans
+            ],
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Representación OTLP/JSON (un resourceSpans por trace)."""
+
+        def ns(mono: float) -> str:
+            return str(self.wall_start_ns + int((mono - self.start) * 1e9))
+
+        def attrs(d: Dict[str, Any]) -> List[Dict[str, Any]]:
+            out = []
+            for k, v in d.items():
+                if isinstance(v, bool):
+                    value = {"boolValue": v}
+                elif isinstance(v, int):
+                    value = {"intValue": str(v)}
+                elif isinstance(v, float):
+                    value = {"doubleValue": v}
+                else:
+                    value = {"stringValue": str(v)}
+                out.append({"key": k, "value": value})
+            return out
+
+        root_id = self.trace_id[:16]
+        spans = [
+            {
+                "traceId": self.trace_id,
+                "spanId": root_id,
+                "name": self.name,
+                "kind": 2,  # SERVER
+                "startTimeUnixNano": ns(self.start),
+                "endTimeUnixNano": ns(self.end or self.start),
+                "attributes": attrs({**self.attrs, "ig.mids": ",".join(self.mids)}),
+            }
+        ]
+        for s in self.spans:
+            spans.append(
+                {
+                    "traceId": self.trace_id,
+                    "spanId": s.span_id,
+                    "parentSpanId": s.parent_id or root_id,
+                    "name": s.name,
+                    "kind": 1,  # INTERNAL
+                    "startTimeUnixNano": ns(s.start),
+                    "endTimeUnixNano": ns(s.end or s.start),
+                    "attributes": attrs(s.attrs),
+                }
+            )
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": attrs({"service.name": settings.PROJECT_NAME})},
+                    "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+                }
+            ]
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Trazas por entrega de webhook en un ring buffer acotado.
+    Sin trace activo (no muestreado), `span()` solo consulta un ContextVar.
+    """
+
+    def __init__(self, ring_size: int, sample_rate: float, export_path: str = ""):
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self._ring: Deque[Trace] = deque(maxlen=ring_size)
+        self._pending_export: List[str] = []
+        self._export_task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def trace(self, name: str, **attrs: Any) -> Iterator[Optional[Trace]]:
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            yield None
+            return
+        t = Trace(name, attrs)
+        token = _current_trace.set(t)
+        try:
+            yield t
+        finally:
+            _current_trace.reset(token)
+            t.end = time.monotonic()
+            self._ring.append(t)
+            if self.export_path:
+                self._export(t)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+        t = _current_trace.get()
+        if t is None:
+            yield None
+            return
+        s = Span(os.urandom(8).hex(), _current_span.get(), name, attrs)
+        t.spans.append(s)
+        token = _current_span.set(s.span_id)
+        try:
+            yield s
+        except BaseException as e:
+            s.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            s.end = time.monotonic()
+
+    def add_mid(self, mid: Optional[str]) -> None:
+        t = _current_trace.get()
+        if t is not None and mid:
+            t.mids.append(mid)
+
+    # --- Consulta ---
+
+    def query(self, *, mid: Optional[str] = None, slowest: bool = False, limit: int = 50) -> List[Trace]:
+        traces = list(self._ring)
+        if mid:
+            traces = [t for t in traces if mid in t.mids]
+        if slowest:
+            traces.sort(key=lambda t: t.duration_ms, reverse=True)
+        else:
+            traces.reverse()  # más recientes primero
+        return traces[:limit]
+
+    # --- Export OTLP (JSON lines) ---
+
+    def _export(self, t: Trace) -> None:
+        self._pending_export.append(json.dumps(t.to_otlp(), ensure_ascii=False))
+        if self._export_task is None or self._export_task.done():
+            try:
+                self._export_task = asyncio.get_running_loop().create_task(self._flush())
+            except RuntimeError:
+                pass  # sin loop (p.ej. scripts): queda pendiente para el próximo flush
+
+    async def _flush(self) -> None:
+        while self._pending_export:
+            batch, self._pending_export = self._pending_export, []
+            try:
+                await asyncio.to_thread(self._write_lines, batch)
+            except Exception as e:
+                logger.warning("⚠️ No se pudieron exportar %d trazas: %s", len(batch), e)
+
+    def _write_lines(self, lines: List[str]) -> None:
+        directory = os.path.dirname(self.export_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.export_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(
+            ring_size=settings.TRACE_RING_SIZE,
+            sample_rate=settings.TRACE_SAMPLE_RATE,
+            export_path=settings.TRACE_EXPORT_PATH,
+        )
+    return _tracer
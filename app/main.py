@@ -1,21 +1,92 @@
+import logging
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.core.admission import AdmissionControlMiddleware, get_admission_controller
 from app.core.config import settings
-from app.core.logging import configure_logging
+from app.core.logging import configure_logging, shutdown_logging
+from app.core.loop_monitor import get_loop_monitor, install_strict_mode
 from app.core.errors import register_exception_handlers
+from app.core.startup import get_startup_state
 from app.api.routes import auth, messages, webhook
+from app.services.delta_sync import get_delta_sync
+from app.services.http_clients import close_http_clients
+from app.services.inbound import get_inbound_dispatcher
+from app.services.sinks import get_event_fanout
+from app.services.snapshot import get_snapshotter
+from app.services.token_manager import get_token_manager
 
-def create_app() -> FastAPI:
+logger = logging.getLogger(__name__)
+
+startup_state = get_startup_state()
+startup_state.process_t0 = _IMPORT_T0
+startup_state.mark("imports")
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Efectos secundarios (archivos de log, conexiones) recién al arrancar el server,
+    # no al importar el módulo
     configure_logging()
+    if settings.LOOP_MONITOR_ENABLED:
+        get_loop_monitor().start()
+    if settings.LOOP_STRICT_MODE:
+        install_strict_mode()
+    if settings.SNAPSHOT_ENABLED:
+        # Carga en segundo plano: no demora el arranque; luego guarda cada SNAPSHOT_INTERVAL_S
+        get_snapshotter().start()
+    if settings.STARTUP_WARMUP_ENABLED:
+        # En segundo plano: el server acepta tráfico ya; /readyz indica cuándo está caliente
+        startup_state.start_warmup()
+    # No-op si TOKEN_MANAGER_ENABLED=false o faltan APP_ID/APP_SECRET
+    get_token_manager().start()
+    get_event_fanout().start()
+    if settings.DELTA_SYNC_ENABLED:
+        get_delta_sync().start()
+    startup_state.mark("lifespan_started")
+    yield
+    # Primero los eventos ya aceptados del webhook (publican a los sinks y usan los pools HTTP)
+    await get_inbound_dispatcher().stop(settings.WEBHOOK_DRAIN_TIMEOUT_S)
+    await get_delta_sync().stop()
+    await get_token_manager().stop()
+    if settings.SNAPSHOT_ENABLED:
+        await get_snapshotter().stop()
+    # Drena las colas de los sinks (hasta SINK_DRAIN_TIMEOUT_S) antes de cerrar los pools HTTP
+    await get_event_fanout().stop()
+    await startup_state.stop()
+    # Cerrar los pools HTTP compartidos (Graph / Core)
+    await close_http_clients()
+    await get_loop_monitor().stop()
+    shutdown_logging()
 
+
+def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.PROJECT_NAME,
         version=settings.VERSION,
         docs_url="/docs",
         redoc_url="/redoc",
+        lifespan=lifespan,
     )
 
+    if settings.PROFILE_ENABLED:
+        # Import diferido: el profiler solo se carga si está activado
+        from app.core.profiling import ProfilingMiddleware, get_profiler
+
+        # Más interno que la admisión: solo perfila requests efectivamente admitidas
+        app.add_middleware(ProfilingMiddleware, profiler=get_profiler())
+
+    if settings.ADMISSION_ENABLED:
+        # Se agrega antes que CORS para que las respuestas 503 también lleven headers CORS
+        app.add_middleware(AdmissionControlMiddleware, controller=get_admission_controller())
+
     app.add_middleware(
         CORSMiddleware,
     allow_origins=[
@@ -40,11 +111,33 @@ def create_app() -> FastAPI:
     # Exponer endpoints del webhook únicamente desde el módulo webhook, sin duplicar
     app.include_router(webhook.router, prefix="/webhook", tags=["webhook"])  # compat
     app.include_router(webhook.router_public, tags=["webhook"])  # expone /webhooks/instagram
+    if settings.DEBUG_ENDPOINTS_ENABLED and not settings.DEBUG_API_KEY:
+        # Exponen ids de mensajes, colas y stacks: nunca sin autenticación
+        logger.warning("⚠️ DEBUG_ENDPOINTS_ENABLED sin DEBUG_API_KEY: /debug/* no se monta")
+    elif settings.DEBUG_ENDPOINTS_ENABLED:
+        from app.api.routes import debug
+
+        app.include_router(debug.router, prefix="/debug", tags=["debug"])
 
     @app.get("/healthz")
     async def healthz() -> dict:
-        return {"status": "ok"}
-
+        if not settings.ADMISSION_ENABLED:
+            return {"status": "ok"}
+        controller = get_admission_controller()
+        return {
+            "status": "degraded" if controller.degraded() else "ok",
+            "admission": controller.snapshot(),
+        }
+
+    @app.get("/readyz")
+    async def readyz():
+        """Listo para tráfico solo cuando los pools a Graph/Core están pre-conectados."""
+        snapshot = startup_state.snapshot()
+        if settings.STARTUP_WARMUP_ENABLED and not snapshot["ready"]:
+            return JSONResponse(status_code=503, content={"status": "warming", **snapshot})
+        return {"status": "ready", **snapshot}
+
+    startup_state.mark("app_created")
     return app
 
 
@@ -30,4 +30,26 @@ class SendMessageRequest(BaseModel):
 class SendMessageResponse(BaseModel):
     success: bool = True
     message_id: str
-    recipient_id: str
\ No newline at end of file
+    recipient_id: str
+    # Adjunto + texto salen como dos mensajes: message_id es el primero (el adjunto)
+    message_ids: List[str] = []
+    error: Optional[str] = None  # el adjunto salió pero el texto no
+
+
+class SearchHit(BaseModel):
+    mid: str
+    sender_id: str
+    recipient_id: str
+    sender_username: Optional[str] = None
+    recipient_username: Optional[str] = None
+    text: str
+    timestamp: int
+    score: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int
+    truncated: bool = False  # total/hits parciales (prefijo muy amplio o demasiadas coincidencias)
+    took_ms: float
+    hits: List[SearchHit]
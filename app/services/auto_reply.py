@@ -0,0 +1,361 @@
+# app/services/auto_reply.py
+import asyncio
+import json
+import logging
+import os
+import re
+import string
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.search_index import fold_text
+
+logger = logging.getLogger(__name__)
+
+# Respuesta histórica del webhook cuando no hay archivo de reglas
+DEFAULT_REPLY = "Recibí: {text}"
+
+# Referencias numéricas (\1, (?(1)...)): en la regex combinada los números de grupo se corren
+_NUMERIC_GROUP_REF = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d")
+
+
+class _SafeFormat(dict):
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+def _template_error(template: Any) -> Optional[str]:
+    """Motivo por el que `reply_for` no podría formatear la plantilla, o None si es válida."""
+    if not isinstance(template, str):
+        return "no es texto"
+    try:
+        for _, field, _, _ in string.Formatter().parse(template):
+            if field is not None and (not field or field[0].isdigit()):
+                return "usa campos posicionales ({} / {0}); solo se admiten {text} y {match}"
+        # Formato de prueba: specs inválidos ({text:d}) o accesos ({text.x}) fallan acá y no al responder
+        template.format_map(_SafeFormat(text="", match=""))
+    except (ValueError, LookupError, AttributeError, TypeError) as e:
+        return str(e)
+    return None
+
+
+class AhoCorasick:
+    """
+    Autómata multi-patrón: encuentra todas las apariciones de N keywords
+    en una sola pasada sobre el texto (O(len(texto) + coincidencias)).
+    """
+
+    def __init__(self, patterns: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self.patterns = patterns
+        for idx, pat in enumerate(patterns):
+            self._insert(pat, idx)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str, idx: int) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(idx)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt].extend(self._out[self._fail[nxt]])
+
+    def iter_matches(self, text: str):
+        """Genera (posición_final, índice_de_patrón) para cada coincidencia."""
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for pos, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                yield pos, idx
+
+
+class Rule:
+    __slots__ = ("id", "type", "reply", "priority", "min_hits", "cooldown_s")
+
+    def __init__(self, data: Dict[str, Any], position: int):
+        self.id = str(data.get("id") or f"rule_{position}")
+        self.type = (data.get("type") or "keyword").lower()
+        self.reply = data.get("reply")
+        self.priority = int(data.get("priority", 0))
+        # Intents: cantidad mínima de keywords distintas para considerarlo disparado
+        self.min_hits = int(data.get("min_hits", 1))
+        self.cooldown_s = data.get("cooldown_seconds")
+
+
+class CompiledRules:
+    """Conjunto de reglas compilado: un autómata para keywords/intents y una regex combinada."""
+
+    def __init__(self, config: Dict[str, Any], mtime: float = 0.0):
+        self.mtime = mtime
+        self.default_reply: Optional[str] = config.get("default_reply", DEFAULT_REPLY)
+        if self.default_reply:
+            error = _template_error(self.default_reply)
+            if error:
+                logger.warning("⚠️ default_reply con plantilla inválida, se ignora: %s", error)
+                self.default_reply = None
+        cooldown = config.get("cooldown_seconds")
+        self.cooldown_s = float(settings.AUTO_REPLY_COOLDOWN_S if cooldown is None else cooldown)
+
+        self.rules: List[Rule] = []
+        keywords: List[str] = []
+        self._keyword_owner: List[int] = []  # índice de keyword -> índice de regla
+        regex_parts: List[Tuple[int, str, str]] = []
+        self._regex_owner: Dict[str, int] = {}  # nombre de grupo -> índice de regla
+
+        for position, raw in enumerate(config.get("rules") or []):
+            rule = Rule(raw, position)
+            if not rule.reply:
+                logger.warning("⚠️ Regla %s sin 'reply', se ignora", rule.id)
+                continue
+            error = _template_error(rule.reply)
+            if error:
+                logger.warning("⚠️ Regla %s con plantilla inválida: %s", rule.id, error)
+                continue
+            rule_idx = len(self.rules)
+
+            if rule.type in ("keyword", "intent"):
+                kws = [fold_text(k).strip() for k in (raw.get("keywords") or []) if k and k.strip()]
+                if not kws:
+                    logger.warning("⚠️ Regla %s sin keywords, se ignora", rule.id)
+                    continue
+                for kw in kws:
+                    keywords.append(kw)
+                    self._keyword_owner.append(rule_idx)
+            elif rule.type == "regex":
+                pattern = raw.get("pattern") or ""
+                group = f"r{rule_idx}"
+                part = f"(?P<{group}>{pattern})"
+                try:
+                    # Se valida ya envuelta: un flag global como (?i) deja de estar al inicio y falla acá
+                    compiled = re.compile(part, re.IGNORECASE)
+                except re.error as e:
+                    logger.warning("⚠️ Regla %s con regex inválida: %s", rule.id, e)
+                    continue
+                if len(compiled.groupindex) > 1:
+                    # Los grupos con nombre chocarían con los de la regex combinada
+                    logger.warning("⚠️ Regla %s usa grupos con nombre (no soportado), se ignora", rule.id)
+                    continue
+                if _NUMERIC_GROUP_REF.search(pattern):
+                    logger.warning("⚠️ Regla %s usa referencias numéricas a grupos (no soportado), se ignora", rule.id)
+                    continue
+                regex_parts.append((rule.priority, group, part))
+                self._regex_owner[group] = rule_idx
+            else:
+                logger.warning("⚠️ Regla %s de tipo desconocido '%s'", rule.id, rule.type)
+                continue
+            self.rules.append(rule)
+
+        self._automaton = AhoCorasick(keywords) if keywords else None
+        # En una alternancia gana la primera alternativa: se ordena por prioridad
+        regex_parts.sort(key=lambda p: -p[0])
+        self._regex = self._combine([(group, part) for _, group, part in regex_parts]) if regex_parts else None
+
+    def _combine(self, parts: List[Tuple[str, str]]) -> "re.Pattern[str]":
+        try:
+            return re.compile("|".join(part for _, part in parts), re.IGNORECASE)
+        except re.error:
+            pass
+        # Algo que pasó la validación individual rompe la combinada: se arma de a una
+        # y se descarta solo la regla culpable, no el archivo entero
+        accepted: List[str] = []
+        for group, part in parts:
+            try:
+                re.compile("|".join(accepted + [part]), re.IGNORECASE)
+            except re.error as e:
+                rule_idx = self._regex_owner.pop(group)
+                logger.warning("⚠️ Regla %s rompe la regex combinada, se ignora: %s", self.rules[rule_idx].id, e)
+                continue
+            accepted.append(part)
+        return re.compile("|".join(accepted), re.IGNORECASE)
+
+    def match(self, text: str) -> Optional[Tuple[Rule, str]]:
+        """Devuelve (regla ganadora, texto coincidente) o None."""
+        if not text or not self.rules:
+            return None
+
+        # rule_idx -> (posición de la primera coincidencia, keywords distintas, texto)
+        hits: Dict[int, Tuple[int, set, str]] = {}
+
+        if self._automaton is not None:
+            folded = fold_text(text)
+            # NFKD puede cambiar longitudes; las posiciones solo se usan para desempatar
+            n = len(folded)
+            for end, kw_idx in self._automaton.iter_matches(folded):
+                kw = self._automaton.patterns[kw_idx]
+                start = end - len(kw) + 1
+                # Respetar límites de palabra ("hola" no debe disparar con "holanda")
+                if start > 0 and folded[start - 1].isalnum():
+                    continue
+                if end + 1 < n and folded[end + 1].isalnum():
+                    continue
+                rule_idx = self._keyword_owner[kw_idx]
+                first, seen, matched = hits.get(rule_idx, (start, set(), kw))
+                seen.add(kw_idx)
+                hits[rule_idx] = (min(first, start), seen, matched)
+
+        if self._regex is not None:
+            for m in self._regex.finditer(text):
+                for group, value in m.groupdict().items():
+                    if value is None:
+                        continue
+                    rule_idx = self._regex_owner[group]
+                    if rule_idx not in hits:
+                        hits[rule_idx] = (m.start(), {group}, value)
+
+        best: Optional[Tuple[Tuple[int, int], int]] = None
+        for rule_idx, (first, seen, _) in hits.items():
+            rule = self.rules[rule_idx]
+            if len(seen) < rule.min_hits:
+                continue
+            key = (-rule.priority, first)
+            if best is None or key < best[0]:
+                best = (key, rule_idx)
+        if best is None:
+            return None
+        rule_idx = best[1]
+        return self.rules[rule_idx], hits[rule_idx][2]
+
+
+class AutoReplyEngine:
+    """
+    Motor de auto-respuestas configurable (keywords, regex, intents).
+
+    - Las reglas se leen de `AUTO_REPLY_RULES_PATH` (JSON) y se compilan una vez,
+      en un hilo: la primera carga la espera la primera `reply_for`.
+    - Recarga en caliente: como mucho cada `AUTO_REPLY_RELOAD_INTERVAL_S` se
+      revisa el mtime; la lectura y compilación corren en un hilo y luego se
+      reemplaza el conjunto compilado de forma atómica (las requests en curso
+      siguen usando el anterior).
+    - Cooldown por usuario para no responder en ráfaga.
+    """
+
+    def __init__(self, path: str, reload_interval_s: float = 5.0):
+        self.path = path
+        self.reload_interval_s = reload_interval_s
+        self._compiled = CompiledRules({})
+        self._last_check = 0.0
+        self._reload_task: Optional[asyncio.Task] = None
+        self._initial_load: Optional[asyncio.Task] = None
+        self._last_reply: Dict[Tuple[str, str], float] = {}
+
+    # --- Carga / recarga ---
+
+    def _load_sync(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self._compiled.mtime:
+                logger.info("ℹ️ Archivo de reglas eliminado; se vuelve a la respuesta por defecto")
+                self._compiled = CompiledRules({})
+            return
+        if mtime == self._compiled.mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            compiled = CompiledRules(config, mtime=mtime)
+        except Exception as e:
+            # Un archivo a medio escribir o inválido no debe tumbar las reglas vigentes
+            logger.warning("⚠️ No se pudieron cargar las reglas de %s: %s", self.path, e)
+            return
+        self._compiled = compiled
+        logger.info("🔁 Reglas de auto-respuesta cargadas: %d", len(compiled.rules))
+
+    async def _ensure_loaded(self) -> None:
+        # Se crea desde el loop (get_auto_reply_engine se llama en handlers async): leer el
+        # archivo ahí lo bloquearía
+        if self._initial_load is None:
+            self._last_check = time.monotonic()
+            self._initial_load = asyncio.create_task(asyncio.to_thread(self._load_sync))
+        if not self._initial_load.done():
+            await asyncio.shield(self._initial_load)
+
+    def _maybe_schedule_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval_s:
+            return
+        self._last_check = now
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+        self._reload_task = asyncio.create_task(asyncio.to_thread(self._load_sync))
+
+    # --- Uso ---
+
+    def _in_cooldown(self, key: Tuple[str, str], cooldown_s: float, now: float) -> bool:
+        if cooldown_s <= 0:
+            return False
+        last = self._last_reply.get(key)
+        return last is not None and now - last < cooldown_s
+
+    def _mark_replied(self, key: Tuple[str, str], now: float) -> None:
+        self._last_reply[key] = now
+        if len(self._last_reply) > 50_000:
+            horizon = now - max(self._compiled.cooldown_s, 1.0)
+            self._last_reply = {k: t for k, t in self._last_reply.items() if t >= horizon}
+
+    async def reply_for(self, sender: str, text: str) -> Optional[str]:
+        """Texto a responder para este mensaje, o None (sin regla / en cooldown)."""
+        await self._ensure_loaded()
+        self._maybe_schedule_reload()
+        compiled = self._compiled
+        now = time.monotonic()
+
+        matched = compiled.match(text)
+        if matched:
+            rule, fragment = matched
+            template = rule.reply
+            cooldown_s = float(compiled.cooldown_s if rule.cooldown_s is None else rule.cooldown_s)
+            key = (sender, rule.id)
+        else:
+            template = compiled.default_reply
+            cooldown_s = compiled.cooldown_s
+            key = (sender, "")
+            fragment = ""
+        if not template:
+            return None
+        # El cooldown global se aplica por usuario, más allá de la regla
+        if self._in_cooldown(key, cooldown_s, now) or self._in_cooldown((sender, "*"), compiled.cooldown_s, now):
+            logger.info("⏳ Auto-respuesta en cooldown para %s", sender)
+            return None
+
+        self._mark_replied(key, now)
+        self._mark_replied((sender, "*"), now)
+        return template.format_map(_SafeFormat(text=text or "(sin texto)", match=fragment))
+
+
+_auto_reply_engine: Optional[AutoReplyEngine] = None
+
+
+def get_auto_reply_engine() -> AutoReplyEngine:
+    global _auto_reply_engine
+    if _auto_reply_engine is None:
+        _auto_reply_engine = AutoReplyEngine(
+            settings.AUTO_REPLY_RULES_PATH,
+            reload_interval_s=settings.AUTO_REPLY_RELOAD_INTERVAL_S,
+        )
+    return _auto_reply_engine
@@ -0,0 +1,136 @@
+# app/services/capture.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Headers que se guardan; firmas y credenciales nunca (el replay vuelve a firmar)
+_KEEP_HEADERS = ("content-type", "user-agent", "x-request-id")
+# Claves que se consideran credenciales dentro del body
+_TOKEN_KEYS = ("access_token", "token", "app_secret", "verify_token")
+# Claves con IDs de usuario/página (se pseudonimizan de forma estable)
+_ID_KEYS = ("id",)
+_TEXT_KEYS = ("text", "title", "username", "name")
+
+
+def _pseudonym(value: str) -> str:
+    # Estable entre líneas: preserva la estructura de conversaciones sin exponer el ID real
+    return "u" + hashlib.sha256(("capture:" + value).encode()).hexdigest()[:15]
+
+
+def scrub(obj: Any, parent_key: str = "") -> Any:
+    """Elimina tokens y PII del payload conservando forma y tamaños aproximados."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            lk = k.lower()
+            if lk in _TOKEN_KEYS:
+                out[k] = "<redacted>"
+            elif lk in _ID_KEYS and isinstance(v, (str, int)) and parent_key in ("sender", "recipient", "from", "to"):
+                out[k] = _pseudonym(str(v))
+            elif lk in _TEXT_KEYS and isinstance(v, str):
+                out[k] = "x" * len(v)
+            elif lk == "url" and isinstance(v, str):
+                out[k] = "https://example.invalid/" + hashlib.sha256(v.encode()).hexdigest()[:16]
+            else:
+                out[k] = scrub(v, lk)
+        return out
+    if isinstance(obj, list):
+        return [scrub(v, parent_key) for v in obj]
+    return obj
+
+
+class WebhookCapture:
+    """
+    Captura de entregas de webhook en JSONL con rotación por tamaño.
+
+    Cada línea: {"t": epoch_s, "path", "headers", "body", "signature_valid"}.
+    El body se guarda como texto (scrubbed si CAPTURE_SCRUB); las escrituras
+    se agrupan y se hacen en un hilo para no bloquear el event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int, scrub_pii: bool):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.scrub_pii = scrub_pii
+        self._pending: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record(self, path: str, headers: Dict[str, str], body: bytes, signature_valid: bool) -> None:
+        try:
+            if self.scrub_pii:
+                try:
+                    text = json.dumps(scrub(json.loads(body)), ensure_ascii=False, separators=(",", ":"))
+                except ValueError:
+                    text = "<non-json body redacted>"
+            else:
+                text = body.decode("utf-8", errors="replace")
+            line = json.dumps(
+                {
+                    "t": time.time(),
+                    "path": path,
+                    "headers": {k: v for k, v in headers.items() if k.lower() in _KEEP_HEADERS},
+                    "body": text,
+                    "signature_valid": signature_valid,
+                },
+                ensure_ascii=False,
+            )
+        except Exception as e:  # la captura nunca debe romper el ingest
+            logger.warning("⚠️ No se pudo capturar el webhook: %s", e)
+            return
+        self._pending.append(line)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.warning("⚠️ No se pudieron escribir %d capturas: %s", len(batch), e)
+
+    def _write(self, lines: List[str]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def _rotate(self) -> None:
+        # webhooks.jsonl -> webhooks.jsonl.1 -> ... -> webhooks.jsonl.N (se descarta el último)
+        for i in range(self.backups, 0, -1):
+            src = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i}")
+
+
+_webhook_capture: Optional[WebhookCapture] = None
+
+
+def get_webhook_capture() -> Optional[WebhookCapture]:
+    """None si la captura está desactivada."""
+    global _webhook_capture
+    if not settings.CAPTURE_ENABLED:
+        return None
+    if _webhook_capture is None:
+        _webhook_capture = WebhookCapture(
+            settings.CAPTURE_PATH,
+            max_bytes=settings.CAPTURE_MAX_BYTES,
+            backups=settings.CAPTURE_BACKUPS,
+            scrub_pii=settings.CAPTURE_SCRUB,
+        )
+    return _webhook_capture
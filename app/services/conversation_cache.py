@@ -0,0 +1,116 @@
+# app/services/conversation_cache.py
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.schemas.messages import Conversation
+
+_conversations_adapter = TypeAdapter(List[Conversation])
+
+
+class CachedConversations:
+    __slots__ = ("version", "digest", "body", "etag", "fetched_at", "stale")
+
+    def __init__(self, version: int, digest: str, body: bytes, fetched_at: float):
+        self.version = version
+        self.digest = digest
+        self.body = body  # JSON ya serializado: un poll sin cambios no vuelve a serializar
+        self.etag = f'"c{version}-{digest[:16]}"'
+        self.fetched_at = fetched_at
+        self.stale = False
+
+
+class ConversationCache:
+    """
+    Listado de conversaciones por cuenta (IG user id / page id), ya serializado.
+
+    - Los webhooks y los envíos marcan como stale la cuenta afectada; el TTL
+      fuerza una re-lectura periódica de Graph igualmente.
+    - Al re-leer, la versión (y con ella el ETag) solo avanza si el contenido
+      cambió: un refresh sin cambios no invalida los ETags de los clientes.
+    """
+
+    def __init__(self, ttl_s: float, max_accounts: int = 1000):
+        self.ttl_s = ttl_s
+        self.max_accounts = max_accounts
+        self._entries: Dict[str, CachedConversations] = {}
+
+    def fresh(self, account: str) -> Optional[CachedConversations]:
+        entry = self._entries.get(account)
+        if entry is None or entry.stale or time.monotonic() - entry.fetched_at > self.ttl_s:
+            return None
+        return entry
+
+    async def get_or_refresh(
+        self, account: str, fetch: Callable[[], Awaitable[List[Conversation]]]
+    ) -> CachedConversations:
+        entry = self.fresh(account)
+        if entry is not None:
+            return entry
+        return self.store(account, await fetch())
+
+    def store(self, account: str, conversations: List[Conversation]) -> CachedConversations:
+        body = _conversations_adapter.dump_json(conversations)
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        now = time.monotonic()
+        previous = self._entries.get(account)
+        if previous is not None and previous.digest == digest:
+            previous.fetched_at = now
+            previous.stale = False
+            return previous
+        entry = CachedConversations((previous.version + 1) if previous else 1, digest, body, now)
+        self._entries.pop(account, None)
+        self._entries[account] = entry
+        while len(self._entries) > self.max_accounts:
+            self._entries.pop(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, *accounts: Optional[str]) -> None:
+        """Marca las cuentas como modificadas (IDs desconocidos se ignoran)."""
+        for account in accounts:
+            entry = self._entries.get(account) if account else None
+            if entry is not None:
+                entry.stale = True
+
+    # --- Snapshot (reinicios en caliente) ---
+
+    def export_state(self) -> List[Tuple[str, int, str, bytes, float, bool]]:
+        # fetched_at es monotónico: se guarda como hora de pared para sobrevivir al reinicio
+        offset = time.time() - time.monotonic()
+        return [
+            (account, e.version, e.digest, e.body, e.fetched_at + offset, e.stale)
+            for account, e in self._entries.items()
+        ]
+
+    def import_state(self, entries: List[Tuple[str, int, str, bytes, float, bool]]) -> int:
+        """
+        Restaura listados y versiones, siempre como stale: la carga corre en segundo
+        plano y un webhook que llegó antes no pudo invalidar una cuenta que aún no
+        estaba en memoria. Se vuelven a leer de Graph, pero si no cambiaron
+        conservan su ETag (los clientes siguen recibiendo 304).
+        """
+        offset = time.time() - time.monotonic()
+        loaded = 0
+        for account, version, digest, body, fetched_wall, _stale in entries:
+            if account in self._entries:
+                continue
+            entry = CachedConversations(version, digest, body, fetched_wall - offset)
+            entry.stale = True
+            self._entries[account] = entry
+            loaded += 1
+        while len(self._entries) > self.max_accounts:
+            self._entries.pop(next(iter(self._entries)))
+        return loaded
+
+
+_conversation_cache: Optional[ConversationCache] = None
+
+
+def get_conversation_cache() -> ConversationCache:
+    global _conversation_cache
+    if _conversation_cache is None:
+        _conversation_cache = ConversationCache(ttl_s=settings.CONVERSATIONS_CACHE_TTL_S)
+    return _conversation_cache
@@ -0,0 +1,278 @@
+# app/services/delta_sync.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.conversation_cache import get_conversation_cache
+from app.services.events import IgEvent
+from app.services.hedging import get_hedged_reader
+from app.services.http_clients import get_graph_http
+from app.services.media import get_media_relay
+from app.services.search_index import index_message_safely
+from app.services.sinks import get_event_fanout
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_ms(iso: Optional[str]) -> Optional[int]:
+    """ISO 8601 de Graph ("2024-05-01T12:00:00+0000") -> epoch ms."""
+    if not iso:
+        return None
+    try:
+        return int(datetime.strptime(iso, "%Y-%m-%dT%H:%M:%S%z").timestamp() * 1000)
+    except ValueError:
+        try:
+            return int(datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp() * 1000)
+        except ValueError:
+            return None
+
+
+class DeltaSyncEngine:
+    """
+    Reconciliación incremental de webhooks perdidos (túnel caído, deploys).
+
+    - Por cuenta guarda una marca de agua: el inicio de la última pasada completa
+      menos DELTA_SYNC_OVERLAP_S (un mensaje que entra en un hilo ya recorrido
+      mientras la pasada sigue paginando queda por encima de la próxima marca).
+    - Cada pasada pide /conversations (más recientes primero) y corta la
+      paginación al llegar a un hilo no modificado desde la marca; de cada
+      hilo cambiado toma solo los mensajes posteriores a la marca.
+    - Los mensajes que no llegaron por webhook (mid no visto) se procesan como
+      si hubieran llegado: índice, sinks y adjuntos.
+    - El intervalo se adapta a la deriva: si faltaban mensajes se acorta a la
+      mitad; si no, se alarga ×1.5 (entre DELTA_SYNC_MIN/MAX_INTERVAL_S).
+
+    La primera pasada de una cuenta sin marca solo la fija (no rellena historia).
+    """
+
+    def __init__(self, interval_s: float, min_interval_s: float, max_interval_s: float, max_seen: int = 50_000):
+        self.interval_s = interval_s
+        self.min_interval_s = min_interval_s
+        self.max_interval_s = max_interval_s
+        self.max_seen = max_seen
+        self.watermarks: Dict[str, int] = {}
+        # mid -> ts_ms de mensajes ya procesados (por webhook o por sync)
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        self.last_run: Dict[str, Any] = {}
+        self.last_started_at = 0.0  # epoch s; también cuenta pasadas fallidas (límite de /debug/sync/run)
+        self.backfilled_total = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def note_seen(self, mid: Optional[str], ts_ms: Optional[int]) -> None:
+        if not mid:
+            return
+        self._seen[mid] = ts_ms or int(time.time() * 1000)
+        self._seen.move_to_end(mid)
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+
+    # --- Pasada de sincronización ---
+
+    async def sync_once(self) -> Dict[str, Any]:
+        self.last_started_at = time.time()
+        async with self._lock:
+            return await self._sync_once()
+
+    async def _sync_once(self) -> Dict[str, Any]:
+        from app.services.instagram_client import get_instagram_client
+        from app.services.token_store import get_token_store
+
+        tokens = await get_token_store().get_tokens()
+        if not tokens or not (tokens.ig_user_id or tokens.page_id):
+            return {"skipped": "sin tokens"}
+        ig = get_instagram_client()
+        account = tokens.ig_user_id or tokens.page_id
+        own_ids = {i for i in (tokens.ig_user_id, tokens.page_id) if i}
+        watermark = self.watermarks.get(account)
+        started = time.monotonic()
+        next_watermark = int((time.time() - settings.DELTA_SYNC_OVERLAP_S) * 1000)
+        calls = changed = 0
+        missing: List[Tuple[int, Dict[str, Any]]] = []
+        oldest_scanned: Optional[int] = None
+
+        next_url: Optional[str] = None
+        for _ in range(settings.DELTA_SYNC_MAX_PAGES):
+            data = await ig.conversations_page(tokens, next_url, settings.DELTA_SYNC_MESSAGES_LIMIT)
+            calls += 1
+            reached = False
+            for conv in data.get("data", []):
+                updated = _parse_ms(conv.get("updated_time"))
+                if updated is None:
+                    continue
+                # Estricto: hilos con el mismo segundo que la marca se revisan (los duplicados se filtran por mid)
+                if watermark is not None and updated < watermark:
+                    reached = True
+                    break
+                oldest_scanned = updated
+                if watermark is None:
+                    # Lo ya presente en Graph al fijar la marca cuenta como procesado
+                    for msg in (conv.get("messages") or {}).get("data", []):
+                        self.note_seen(msg.get("id"), _parse_ms(msg.get("created_time")))
+                    continue
+                changed += 1
+                calls += await self._collect_thread(conv, watermark, missing)
+            if watermark is None:
+                break  # primera pasada: la primera página alcanza para fijar la marca
+            next_url = (data.get("paging") or {}).get("next")
+            if reached or not next_url:
+                break
+        else:
+            if watermark is not None and oldest_scanned is not None:
+                # Cortó por DELTA_SYNC_MAX_PAGES antes de llegar a la marca: solo se avanza
+                # hasta el hilo más viejo recorrido, lo de más abajo queda para la próxima pasada
+                next_watermark = min(next_watermark, oldest_scanned)
+
+        # Cronológico, como habrían llegado por webhook
+        missing.sort(key=lambda item: item[0])
+        for ts_ms, msg in missing:
+            await self._backfill(msg, ts_ms, own_ids)
+        if missing:
+            get_conversation_cache().invalidate(*own_ids)
+
+        self.watermarks[account] = max(watermark or 0, next_watermark)
+        self._adapt(len(missing))
+        self.backfilled_total += len(missing)
+        self.last_run = {
+            "account": account,
+            "at": time.time(),
+            "took_ms": round((time.monotonic() - started) * 1000, 1),
+            "graph_calls": calls,
+            "threads_changed": changed,
+            "backfilled": len(missing),
+            "watermark_ms": self.watermarks[account],
+            "next_interval_s": round(self.interval_s, 1),
+        }
+        if missing:
+            logger.warning("🔁 Delta sync: %d mensajes no llegaron por webhook (%d hilos)", len(missing), changed)
+        return self.last_run
+
+    async def _collect_thread(
+        self, conv: Dict[str, Any], watermark: int, missing: List[Tuple[int, Dict[str, Any]]]
+    ) -> int:
+        """Junta los mensajes del hilo posteriores a la marca y no vistos. Devuelve llamadas extra a Graph."""
+        calls = 0
+        messages = conv.get("messages") or {}
+        for _ in range(settings.DELTA_SYNC_MAX_PAGES):
+            older_found = False
+            for msg in messages.get("data", []):
+                ts_ms = _parse_ms(msg.get("created_time"))
+                if ts_ms is None:
+                    continue
+                if ts_ms < watermark:
+                    older_found = True
+                    break
+                if msg.get("id") and msg["id"] not in self._seen:
+                    missing.append((ts_ms, msg))
+            next_url = (messages.get("paging") or {}).get("next")
+            if older_found or not next_url:
+                break
+            # Todo el lote es posterior a la marca: puede haber más en la página siguiente
+            resp = await get_hedged_reader().get(get_graph_http(), next_url, {}, timeout=20, key="graph:messages")
+            resp.raise_for_status()
+            messages = resp.json()
+            calls += 1
+        return calls
+
+    async def _backfill(self, msg: Dict[str, Any], ts_ms: int, own_ids: set) -> None:
+        event = IgEvent.from_graph_message(msg, ts_ms)
+        self.note_seen(event.mid, ts_ms)
+        sender_name = (msg.get("from") or {}).get("username")
+        recipient_name = (((msg.get("to") or {}).get("data") or [{}])[0]).get("username")
+        index_message_safely(
+            mid=event.mid,
+            text=event.text,
+            sender_id=event.sender,
+            recipient_id=event.recipient,
+            sender_username=sender_name,
+            recipient_username=recipient_name,
+            timestamp=event.ts_s,
+        )
+        if event.sender in own_ids:
+            return  # saliente: igual que un eco del webhook, solo se indexa
+        await get_event_fanout().publish(event.unified_payload(sender_name, recipient_name))
+        if event.attachments:
+            get_media_relay().relay_inbound(
+                event.attachments,
+                {"channel": "instagram", "message_id": event.mid, "sender": event.sender},
+            )
+
+    def _adapt(self, drift: int) -> None:
+        if drift:
+            self.interval_s = max(self.min_interval_s, self.interval_s / 2)
+        else:
+            self.interval_s = min(self.max_interval_s, self.interval_s * 1.5)
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.sync_once()
+            except Exception as e:
+                self.interval_s = min(self.max_interval_s, self.interval_s * 2)
+                logger.warning("⚠️ Delta sync falló (%s); próximo intento en %.0fs", e, self.interval_s)
+
+    # --- Snapshot (reinicios en caliente) ---
+
+    def export_state(self) -> List[Tuple[str, Any]]:
+        # Los mids vistos desde la marca más vieja evitan re-publicar tras un reinicio
+        floor = min(self.watermarks.values(), default=0)
+        seen = [(mid, ts) for mid, ts in self._seen.items() if ts >= floor]
+        return [("watermarks", list(self.watermarks.items())), ("seen", seen)]
+
+    def import_state(self, entries: List[Tuple[str, Any]]) -> int:
+        state = dict(entries)
+        loaded = 0
+        for account, watermark in state.get("watermarks", []):
+            if account not in self.watermarks:
+                self.watermarks[account] = watermark
+                loaded += 1
+        for mid, ts_ms in state.get("seen", []):
+            if mid not in self._seen:
+                self._seen[mid] = ts_ms
+                self._seen.move_to_end(mid, last=False)
+        # Los restaurados quedaron al frente: son los primeros en salir si se pasa del tope
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        return loaded
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval_s": round(self.interval_s, 1),
+            "watermarks_ms": self.watermarks,
+            "seen_mids": len(self._seen),
+            "backfilled_total": self.backfilled_total,
+            "last_run": self.last_run,
+        }
+
+
+_delta_sync: Optional[DeltaSyncEngine] = None
+
+
+def get_delta_sync() -> DeltaSyncEngine:
+    global _delta_sync
+    if _delta_sync is None:
+        _delta_sync = DeltaSyncEngine(
+            interval_s=settings.DELTA_SYNC_INTERVAL_S,
+            min_interval_s=settings.DELTA_SYNC_MIN_INTERVAL_S,
+            max_interval_s=settings.DELTA_SYNC_MAX_INTERVAL_S,
+        )
+    return _delta_sync
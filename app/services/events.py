@@ -0,0 +1,145 @@
+# app/services/events.py
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (type, url) de cada adjunto; tupla para no cargar un dict por adjunto
+Attachment = Tuple[str, Optional[str]]
+
+KIND_MESSAGE = "message"
+KIND_READ = "read"
+KIND_DELIVERY = "delivery"
+KIND_OTHER = "other"
+
+
+def _intern(value: Any) -> Optional[str]:
+    # Los IDs de página/usuario se repiten en casi todos los eventos: una sola copia en memoria
+    return sys.intern(str(value)) if value is not None else None
+
+
+class IgEvent:
+    """
+    Evento de webhook normalizado: solo los campos que usa el ingest.
+
+    Se construye una vez al parsear la entrega y es lo que circula por el
+    índice, el push al Core, los adjuntos y la auto-respuesta. Con __slots__
+    y sin referencias al payload original (`entry`, dicts anidados), un
+    backlog de eventos en cola ocupa una fracción de la memoria.
+    """
+
+    __slots__ = ("kind", "sender", "recipient", "ts_ms", "mid", "text", "is_echo", "attachments", "extra")
+
+    def __init__(
+        self,
+        kind: str,
+        sender: Optional[str],
+        recipient: Optional[str],
+        ts_ms: Optional[int],
+        mid: Optional[str] = None,
+        text: str = "",
+        is_echo: bool = False,
+        attachments: Tuple[Attachment, ...] = (),
+        extra: Any = None,
+    ):
+        self.kind = kind
+        self.sender = sender
+        self.recipient = recipient
+        self.ts_ms = ts_ms
+        self.mid = mid
+        self.text = text
+        self.is_echo = is_echo
+        self.attachments = attachments
+        self.extra = extra  # watermark (read), mids (delivery) o claves del evento (other)
+
+    @property
+    def ts_s(self) -> Optional[int]:
+        return self.ts_ms // 1000 if self.ts_ms else None
+
+    @property
+    def message_type(self) -> str:
+        return "text" if self.text or not self.attachments else self.attachments[0][0]
+
+    def attachments_payload(self) -> List[Dict[str, Any]]:
+        return [{"type": t, "url": u} for t, u in self.attachments]
+
+    def unified_payload(self, sender_name: Optional[str], recipient_name: Optional[str]) -> Dict[str, Any]:
+        """Evento en el formato del Core unificado (lo que reciben los sinks)."""
+        ts = datetime.fromtimestamp(self.ts_ms / 1000, tz=timezone.utc) if self.ts_ms else datetime.now(tz=timezone.utc)
+        return {
+            "channel": "instagram",
+            "sender": self.sender or "",
+            "message": self.text or "",
+            "timestamp": ts.isoformat(),
+            "message_id": self.mid or "",
+            "message_type": self.message_type,
+            "sender_name": sender_name,
+            "recipient_name": recipient_name,
+            "attachments": self.attachments_payload(),
+        }
+
+    @classmethod
+    def from_raw(cls, event: Dict[str, Any]) -> "IgEvent":
+        sender = _intern((event.get("sender") or {}).get("id"))
+        recipient = _intern((event.get("recipient") or {}).get("id"))
+        ts_ms = event.get("timestamp")
+
+        if "message" in event:
+            msg = event.get("message") or {}
+            attachments = tuple(
+                (sys.intern(a.get("type") or "file"), (a.get("payload") or {}).get("url"))
+                for a in (msg.get("attachments") or [])
+                if isinstance(a, dict)
+            )
+            return cls(
+                KIND_MESSAGE, sender, recipient, ts_ms,
+                mid=msg.get("mid"),
+                text=msg.get("text") or "",
+                is_echo=bool(msg.get("is_echo", False)),
+                attachments=attachments,
+            )
+        if "read" in event:
+            return cls(KIND_READ, sender, recipient, ts_ms, extra=(event["read"] or {}).get("watermark"))
+        if "delivery" in event:
+            mids = (event["delivery"] or {}).get("mids")
+            return cls(KIND_DELIVERY, sender, recipient, ts_ms, extra=tuple(mids or ()))
+        return cls(KIND_OTHER, sender, recipient, ts_ms, extra=tuple(event.keys()))
+
+    @classmethod
+    def from_graph_message(cls, msg: Dict[str, Any], ts_ms: Optional[int]) -> "IgEvent":
+        """Mensaje leído de /conversations (delta sync): mismo evento que si llegara por webhook."""
+        to = ((msg.get("to") or {}).get("data") or [{}])[0]
+        attachments = tuple(
+            (sys.intern("image" if a.get("image_data") else "video" if a.get("video_data") else "file"),
+             (a.get("image_data") or a.get("video_data") or {}).get("url") or a.get("file_url"))
+            for a in ((msg.get("attachments") or {}).get("data") or [])
+            if isinstance(a, dict)
+        )
+        return cls(
+            KIND_MESSAGE,
+            _intern((msg.get("from") or {}).get("id")),
+            _intern(to.get("id")),
+            ts_ms,
+            mid=msg.get("id"),
+            text=msg.get("message") or "",
+            attachments=attachments,
+        )
+
+
+def iter_raw_events(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Eventos crudos de una entrega. Meta puede enviar tanto
+    entry[].messaging[] como entry[].changes[].value.messaging[].
+    """
+    for entry in payload.get("entry", []):
+        events = entry.get("messaging")
+        if not events:
+            events = []
+            for change in entry.get("changes", []):
+                value = change.get("value", {})
+                events.extend(value.get("messaging", []))
+        yield from events or []
+
+
+def parse_events(payload: Dict[str, Any]) -> List[IgEvent]:
+    """Normaliza todos los eventos de una entrega de webhook."""
+    return [IgEvent.from_raw(e) for e in iter_raw_events(payload) if isinstance(e, dict)]
@@ -0,0 +1,154 @@
+# app/services/hedging.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core import deadline
+from app.core.tracing import Span, get_tracer
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias (s) por tipo de request; p95 recalculado cada tanto."""
+
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._p95: Dict[str, float] = {}
+        self._since_recalc: Dict[str, int] = {}
+
+    def observe(self, key: str, latency_s: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(latency_s)
+        n = self._since_recalc.get(key, 0) + 1
+        if n >= 16 and len(samples) >= self.min_samples:
+            ordered = sorted(samples)
+            self._p95[key] = ordered[int(0.95 * (len(ordered) - 1))]
+            n = 0
+        self._since_recalc[key] = n
+
+    def p95(self, key: str) -> Optional[float]:
+        return self._p95.get(key)
+
+
+class HedgedReader:
+    """
+    GETs idempotentes con hedging: si la primera request no respondió tras
+    ~p95 de latencia observada, se lanza un duplicado y gana la primera que
+    responda (la otra se cancela). Todo acotado por el deadline vigente.
+
+    Para no duplicar carga sobre Graph, los hedges están limitados a
+    `HEDGE_MAX_RATIO` de las requests recientes.
+    """
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self._requests = 0
+        self._hedges = 0
+
+    def _hedge_delay(self, key: str) -> float:
+        p95 = self.latency.p95(key)
+        if p95 is None:
+            return settings.HEDGE_DEFAULT_DELAY_MS / 1000
+        return max(settings.HEDGE_MIN_DELAY_MS / 1000, p95)
+
+    def _may_hedge(self) -> bool:
+        if not settings.HEDGE_ENABLED:
+            return False
+        # Ventana aproximada: se reinicia cada 1000 requests
+        if self._requests > 1000:
+            self._requests, self._hedges = 0, 0
+        return self._hedges < max(1, int(self._requests * settings.HEDGE_MAX_RATIO))
+
+    async def get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: Dict[str, Any],
+        *,
+        timeout: float,
+        key: str,
+    ) -> httpx.Response:
+        """
+        Devuelve la primera respuesta obtenida. Lanza asyncio.TimeoutError si
+        se agota el presupuesto, o la excepción de transporte si fallan todos
+        los intentos.
+        """
+        budget = deadline.remaining(timeout)
+        if budget <= 0:
+            raise asyncio.TimeoutError(f"Sin presupuesto para GET {key}")
+
+        self._requests += 1
+        started = time.monotonic()
+        with get_tracer().span("http.get", key=key) as span:
+            return await self._get(client, url, params, budget=budget, key=key, started=started, span=span)
+
+    async def _get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: Dict[str, Any],
+        *,
+        budget: float,
+        key: str,
+        started: float,
+        span: Optional[Span],
+    ) -> httpx.Response:
+        async def attempt() -> httpx.Response:
+            return await client.get(url, params=params, timeout=budget)
+
+        def launch() -> asyncio.Task:
+            task = asyncio.create_task(attempt())
+            # Consumir la excepción del perdedor para no ensuciar el log del loop
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return task
+
+        tasks = [launch()]
+        try:
+            delay = self._hedge_delay(key)
+            done, _ = await asyncio.wait(tasks, timeout=min(delay, budget))
+            if not done and self._may_hedge():
+                self._hedges += 1
+                if span is not None:
+                    span.attrs["hedged"] = True
+                logger.info("🔀 Hedge GET %s tras %.0f ms", key, delay * 1000)
+                tasks.append(launch())
+
+            last_exc: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                left = budget - (time.monotonic() - started)
+                if left <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        self.latency.observe(key, time.monotonic() - started)
+                        return t.result()
+                    last_exc = t.exception()
+            if last_exc is not None and not pending:
+                raise last_exc
+            raise asyncio.TimeoutError(f"GET {key} excedió {budget:.2f}s")
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+
+_hedged_reader: Optional[HedgedReader] = None
+
+
+def get_hedged_reader() -> HedgedReader:
+    global _hedged_reader
+    if _hedged_reader is None:
+        _hedged_reader = HedgedReader()
+    return _hedged_reader
@@ -0,0 +1,47 @@
+# app/services/http_clients.py
+from typing import Optional
+
+import httpx
+
+# Clientes compartidos: reutilizan conexiones (keep-alive, TLS) entre requests
+# en lugar de abrir un AsyncClient por llamada.
+_graph_client: Optional[httpx.AsyncClient] = None
+_core_client: Optional[httpx.AsyncClient] = None
+_media_client: Optional[httpx.AsyncClient] = None
+
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+
+def get_graph_http() -> httpx.AsyncClient:
+    global _graph_client
+    if _graph_client is None or _graph_client.is_closed:
+        _graph_client = httpx.AsyncClient(timeout=20, limits=_LIMITS)
+    return _graph_client
+
+
+def get_core_http() -> httpx.AsyncClient:
+    global _core_client
+    if _core_client is None or _core_client.is_closed:
+        _core_client = httpx.AsyncClient(timeout=10, limits=_LIMITS)
+    return _core_client
+
+
+def get_media_http() -> httpx.AsyncClient:
+    # Descargas de adjuntos (CDN de Meta): toleran archivos grandes; los redirects los sigue
+    # MediaRelay a mano, validando cada destino
+    global _media_client
+    if _media_client is None or _media_client.is_closed:
+        _media_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120, connect=10), limits=_LIMITS, follow_redirects=False
+        )
+    return _media_client
+
+
+async def close_http_clients() -> None:
+    global _graph_client, _core_client, _media_client
+    for client in (_graph_client, _core_client, _media_client):
+        if client is not None and not client.is_closed:
+            await client.aclose()
+    _graph_client = None
+    _core_client = None
+    _media_client = None
@@ -0,0 +1,107 @@
+# app/services/inbound.py
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (cuenta, función que procesa el evento)
+Job = Tuple[Optional[str], Callable[[], Awaitable[None]]]
+
+
+class InboundDispatcher:
+    """
+    Procesamiento de eventos del webhook fuera de la request.
+
+    El webhook valida, normaliza, encola y responde 200; cada evento corre en su
+    propia tarea, que espera turno en el planificador por cuenta. Esa espera ya
+    no retiene lugares del control de admisión (FIFO, no distingue cuentas): una
+    cuenta con ráfaga no llena la puerta de entrada para las demás.
+
+    - Eventos pendientes (en espera o en curso) acotados por cuenta y en total.
+      Una entrega que no entra se rechaza entera (503, Meta la reintenta) y solo
+      la recibe la cuenta saturada.
+    - Las tareas arrancan con un contexto limpio: no heredan la traza ni el
+      deadline de la request que ya respondió.
+    - Al apagar se drenan los pendientes hasta WEBHOOK_DRAIN_TIMEOUT_S.
+    """
+
+    def __init__(self, max_pending: int, max_pending_per_account: int):
+        self.max_pending = max_pending
+        self.max_pending_per_account = max_pending_per_account
+        self._pending: Dict[str, int] = {}
+        self._total = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def try_submit(self, jobs: List[Job]) -> bool:
+        """Encola todos los eventos de una entrega, o ninguno si no hay lugar."""
+        wanted: Dict[str, int] = {}
+        for account, _ in jobs:
+            key = account or "_"
+            wanted[key] = wanted.get(key, 0) + 1
+        if self._total + len(jobs) > self.max_pending or any(
+            self._pending.get(key, 0) + n > self.max_pending_per_account for key, n in wanted.items()
+        ):
+            self.rejected += 1
+            return False
+        for account, job in jobs:
+            key = account or "_"
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self._total += 1
+            task = contextvars.Context().run(asyncio.create_task, self._run(key, job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self.accepted += len(jobs)
+        return True
+
+    async def _run(self, key: str, job: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await job()
+        except Exception as e:
+            self.failed += 1
+            logger.exception("❌ Error procesando evento de %s: %s", key, e)
+        finally:
+            self._total -= 1
+            left = self._pending[key] - 1
+            if left:
+                self._pending[key] = left
+            else:
+                del self._pending[key]
+
+    async def stop(self, timeout_s: float) -> None:
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout_s)
+        if pending:
+            logger.warning("⚠️ %d eventos del webhook sin procesar al apagar", len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pending": self._total,
+            "accounts": dict(self._pending),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+_dispatcher: Optional[InboundDispatcher] = None
+
+
+def get_inbound_dispatcher() -> InboundDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = InboundDispatcher(
+            max_pending=settings.WEBHOOK_MAX_PENDING_EVENTS,
+            max_pending_per_account=settings.WEBHOOK_ACCOUNT_MAX_PENDING_EVENTS,
+        )
+    return _dispatcher
@@ -1,16 +1,27 @@
 # app/services/instagram_client.py
+import asyncio
+import json
 import logging
-from typing import Any, Dict, List, Optional
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timezone
 
 import httpx
 
 from app.core.config import settings
 from app.core.errors import AppError
+from app.core.fair_scheduler import get_scheduler
+from app.core.tracing import get_tracer
 from app.schemas.messages import (
     Conversation, ConversationMessage,
     SendMessageRequest, SendMessageResponse
 )
+from app.services.hedging import get_hedged_reader
+from app.services.http_clients import get_graph_http
+from app.services.media import MEDIA_TYPES, SpooledMedia, get_media_relay
+from app.services.search_index import index_message_safely
+from app.services.token_manager import get_token_manager
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +34,14 @@ class OAuthTokens:
         ig_user_id: Optional[str] = None,
         scopes: Optional[List[str]] = None,
         user_access_token: Optional[str] = None,  # útil para debug
+        user_token_expires_at: Optional[int] = None,  # epoch s; None = desconocido
     ):
         self.access_token = access_token          # PAGE ACCESS TOKEN
         self.page_id = page_id
         self.ig_user_id = ig_user_id
         self.scopes = scopes or []
         self.user_access_token = user_access_token
+        self.user_token_expires_at = user_token_expires_at
 
     def model_dump(self) -> Dict[str, Any]:
         return {
@@ -37,6 +50,7 @@ class OAuthTokens:
             "ig_user_id": self.ig_user_id,
             "scopes": self.scopes,
             "user_access_token": self.user_access_token,
+            "user_token_expires_at": self.user_token_expires_at,
         }
 
     @staticmethod
@@ -47,6 +61,7 @@ class OAuthTokens:
             ig_user_id=data.get("ig_user_id"),
             scopes=data.get("scopes", []),
             user_access_token=data.get("user_access_token"),
+            user_token_expires_at=data.get("user_token_expires_at"),
         )
 
 
@@ -60,11 +75,13 @@ class InstagramClient:
         self.base_graph_url = f"https://graph.facebook.com/{self.version}"
 
     async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        async with httpx.AsyncClient(timeout=20) as client:
-            url = f"{self.base_graph_url}{path}"
-            r = await client.get(url, params=params)
-            r.raise_for_status()
-            return r.json()
+        # GET idempotente: hedged y acotado por el deadline vigente (si lo hay)
+        url = f"{self.base_graph_url}{path}"
+        # Clave de latencias sin IDs (p.ej. "/123/conversations" -> "graph:conversations")
+        key = "graph:" + "/".join(seg for seg in path.split("/") if seg and not seg.isdigit())
+        r = await get_hedged_reader().get(get_graph_http(), url, params, timeout=20, key=key)
+        r.raise_for_status()
+        return r.json()
 
     async def exchange_code_for_tokens(self, code: str) -> OAuthTokens:
         # 1) Intercambio de code -> USER ACCESS TOKEN
@@ -84,6 +101,14 @@ class InstagramClient:
         if not user_access_token:
             raise AppError("Respuesta inválida de OAuth", 400)
 
+        # 1.b) Short-lived (~1h) -> long-lived (~60 días). Los PAGE tokens obtenidos
+        # con un user token long-lived no vencen.
+        user_token_expires_at = None
+        try:
+            user_access_token, user_token_expires_at = await self.exchange_long_lived_token(user_access_token)
+        except AppError as e:
+            logger.warning("⚠️ No se pudo obtener token long-lived, se usa el short-lived: %s", e.message)
+
         # 2) Listar páginas del usuario (obtengo PAGE_ID + PAGE_ACCESS_TOKEN)
         me_accounts = await self._get(
             "/me/accounts",
@@ -167,8 +192,51 @@ class InstagramClient:
                 "pages_manage_metadata",
             ],
             user_access_token=user_access_token,
+            user_token_expires_at=user_token_expires_at,
         )
 
+    # --- Ciclo de vida de tokens ---
+
+    async def exchange_long_lived_token(self, token: str) -> Tuple[str, Optional[int]]:
+        """fb_exchange_token: devuelve (token long-lived, expires_at epoch s o None)."""
+        resp = await get_graph_http().get(
+            f"{self.base_graph_url}/oauth/access_token",
+            params={
+                "grant_type": "fb_exchange_token",
+                "client_id": settings.APP_ID,
+                "client_secret": settings.APP_SECRET,
+                "fb_exchange_token": token,
+            },
+            timeout=20,
+        )
+        if resp.status_code != 200:
+            raise AppError(f"fb_exchange_token falló ({resp.status_code})", 400)
+        data = resp.json()
+        long_lived = data.get("access_token")
+        if not long_lived:
+            raise AppError("fb_exchange_token sin access_token", 400)
+        expires_in = data.get("expires_in")
+        return long_lived, (int(time.time()) + int(expires_in)) if expires_in else None
+
+    async def debug_token(self, token: str) -> Dict[str, Any]:
+        """/debug_token con el app token: is_valid, expires_at (0 = no vence), scopes..."""
+        data = await self._get(
+            "/debug_token",
+            {"input_token": token, "access_token": f"{settings.APP_ID}|{settings.APP_SECRET}"},
+        )
+        return data.get("data") or {}
+
+    async def page_token_for(self, user_access_token: str, page_id: str) -> Optional[str]:
+        """Vuelve a obtener el PAGE token de `page_id` a partir del user token."""
+        me_accounts = await self._get(
+            "/me/accounts",
+            {"fields": "id,access_token", "access_token": user_access_token},
+        )
+        for p in me_accounts.get("data", []):
+            if p.get("id") == page_id:
+                return p.get("access_token")
+        return None
+
     # --- Opcional: endpoint de diagnóstico usa estos ---
     async def debug_probe(self, user_access_token: str) -> Dict[str, Any]:
         me_accounts = await self._get(
@@ -247,37 +315,130 @@ class InstagramClient:
             items.append(Conversation(id=conv.get("id", ""), participants=participants, last_message=last))
         return items
 
+    async def conversations_page(
+        self, tokens: OAuthTokens, next_url: Optional[str] = None, messages_limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Una página de conversaciones (más recientes primero) con `updated_time`
+        y sus últimos mensajes. Con `next_url` sigue el cursor de paginación.
+        """
+        if next_url:
+            resp = await get_hedged_reader().get(get_graph_http(), next_url, {}, timeout=20, key="graph:conversations")
+            resp.raise_for_status()
+            return resp.json()
+        return await self._get(
+            f"/{tokens.ig_user_id or tokens.page_id}/conversations",
+            {
+                "platform": "instagram",
+                "fields": (
+                    "updated_time,participants,"
+                    f"messages.limit({messages_limit}){{id,message,from,to,created_time,attachments}}"
+                ),
+                "limit": 25,
+                "access_token": tokens.access_token,
+            },
+        )
+
+    async def upload_attachment(self, tokens: OAuthTokens, media: SpooledMedia, media_type: str) -> str:
+        """Sube un archivo (streaming desde disco) a la Attachment Upload API y devuelve su attachment_id."""
+        url = f"{self.base_graph_url}/{tokens.page_id or 'me'}/message_attachments"
+        params = {"access_token": tokens.access_token, "platform": "instagram"}
+        message = {"attachment": {"type": media_type, "payload": {"is_reusable": True}}}
+        fh = await asyncio.to_thread(open, media.path, "rb")
+        with fh:
+            resp = await get_graph_http().post(
+                url,
+                params=params,
+                data={"message": json.dumps(message)},
+                files={"filedata": (os.path.basename(media.path), fh, media.content_type)},
+                timeout=settings.MEDIA_TIMEOUT_S,
+            )
+        if resp.status_code != 200:
+            logger.error("upload_attachment error (%s): %s", resp.status_code, resp.text[:500])
+            raise AppError("Error subiendo el adjunto a Graph", 400)
+        attachment_id = resp.json().get("attachment_id")
+        if not attachment_id:
+            raise AppError("Graph no devolvió attachment_id", 400)
+        return attachment_id
+
     async def send_message(self, tokens: OAuthTokens, payload: SendMessageRequest) -> SendMessageResponse:
         if not tokens.access_token:
             raise AppError("No hay PAGE ACCESS TOKEN configurado", 401)
+        # Falla rápido si ya se sabe que el token es inválido o venció
+        get_token_manager().ensure_sendable(tokens.access_token)
+        # Turno justo por cuenta: una cuenta con ráfaga de envíos no acapara el cliente
+        async with get_scheduler("outbound").slot(tokens.ig_user_id or tokens.page_id):
+            return await self._send(tokens, payload)
 
+    async def _send(self, tokens: OAuthTokens, payload: SendMessageRequest) -> SendMessageResponse:
+        media_type = (payload.message_type or "text").lower()
+        if media_type != "text" and payload.media_url:
+            if media_type not in MEDIA_TYPES:
+                raise AppError(f"message_type no soportado: {payload.message_type}", 422)
+            attachment_id = await get_media_relay().attachment_id_for(
+                payload.media_url,
+                media_type,
+                lambda media: self.upload_attachment(tokens, media, media_type),
+            )
+            result = await self._post_message(
+                tokens,
+                payload,
+                {"attachment": {"type": media_type, "payload": {"attachment_id": attachment_id}}},
+            )
+            # IG no admite texto + adjunto en un mismo mensaje: el texto va aparte
+            if payload.text:
+                try:
+                    text_result = await self._post_message(tokens, payload, {"text": payload.text})
+                except AppError as e:
+                    # El adjunto ya se entregó: se devuelve su id en vez de perderlo con el error
+                    result.success = False
+                    result.error = e.message
+                    return result
+                result.message_ids.append(text_result.message_id)
+            return result
+
+        return await self._post_message(tokens, payload, {"text": payload.text})
+
+    async def _post_message(
+        self, tokens: OAuthTokens, payload: SendMessageRequest, message: Dict[str, Any]
+    ) -> SendMessageResponse:
         url = f"{self.base_graph_url}/me/messages"
         params = {"access_token": tokens.access_token}
         body = {
             "recipient": {"id": payload.recipient_id},
-            "message": {"text": payload.text},
+            "message": message,
             "messaging_type": "RESPONSE",
         }
-        async with httpx.AsyncClient(timeout=20) as client:
-            resp = await client.post(url, params=params, json=body)
-            if resp.status_code != 200:
-                try:
-                    err = resp.json()
-                except Exception:
-                    err = resp.text
-                logger.error("send_message error (%s): %s", resp.status_code, err)
-                # Mensaje específico cuando el recipient es inválido
-                if isinstance(err, dict):
-                    gmsg = (err.get("error") or {}).get("message")
-                else:
-                    gmsg = str(err)
-                raise AppError(f"Error enviando mensaje: {gmsg}", 400)
-            data = resp.json()
-            return SendMessageResponse(
-                success=True,
-                message_id=data.get("message_id", ""),
-                recipient_id=data.get("recipient_id", payload.recipient_id),
-            )
+        with get_tracer().span("graph.send", kind=next(iter(message))):
+            resp = await get_graph_http().post(url, params=params, json=body, timeout=20)
+        if resp.status_code != 200:
+            try:
+                err = resp.json()
+            except Exception:
+                err = resp.text
+            logger.error("send_message error (%s): %s", resp.status_code, err)
+            get_token_manager().report_graph_error(tokens.access_token, err)
+            # Mensaje específico cuando el recipient es inválido
+            if isinstance(err, dict):
+                gmsg = (err.get("error") or {}).get("message")
+            else:
+                gmsg = str(err)
+            raise AppError(f"Error enviando mensaje: {gmsg}", 400)
+        data = resp.json()
+        message_id = data.get("message_id", "")
+        result = SendMessageResponse(
+            success=True,
+            message_id=message_id,
+            recipient_id=data.get("recipient_id", payload.recipient_id),
+            message_ids=[message_id],
+        )
+        index_message_safely(
+            mid=result.message_id,
+            text=message.get("text"),
+            sender_id=tokens.ig_user_id or tokens.page_id,
+            recipient_id=result.recipient_id,
+        )
+        return result
 
 
 _instagram_client: Optional[InstagramClient] = None
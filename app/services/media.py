@@ -0,0 +1,305 @@
+# app/services/media.py
+import asyncio
+import hashlib
+import ipaddress
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.errors import AppError
+from app.core.loop_monitor import allow_blocking
+from app.services.http_clients import get_core_http, get_media_http
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = ("image", "video", "audio", "file")
+_MAX_REDIRECTS = 5
+
+
+def _is_public_ip(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (
+        ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+        or ip.is_multicast or ip.is_unspecified
+    )
+
+
+async def check_public_url(url: str) -> None:
+    """
+    Lanza AppError(400) si `url` no es http(s) o su host resuelve a una IP no pública
+    (privada, loopback, link-local como 169.254.169.254, ...). Evita usar el servicio
+    para llegar a hosts internos con URLs de adjuntos que manda el cliente.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise AppError("URL de adjunto inválida: solo http(s)", 400)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port)
+    except OSError:
+        raise AppError(f"No se pudo resolver el host del adjunto ({parts.hostname})", 400)
+    if not infos or not all(_is_public_ip(info[4][0]) for info in infos):
+        raise AppError(f"Host de adjunto no permitido ({parts.hostname})", 400)
+
+
+class SpooledMedia:
+    """Archivo temporal en disco con su hash calculado mientras se descargaba."""
+
+    __slots__ = ("path", "sha256", "size", "content_type")
+
+    def __init__(self, path: str, sha256: str, size: int, content_type: str):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.content_type = content_type
+
+    def discard(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class MediaRelay:
+    """
+    Relay de adjuntos sin cargar archivos completos en memoria.
+
+    - Entrantes: la URL del adjunto se descarga por chunks y se guarda en el
+      directorio de blobs con nombre = sha256 (o se reenvía en streaming al Core).
+    - Salientes: el asset se descarga por chunks a un temporal calculando su
+      sha256; si ese contenido ya se subió a Graph se reutiliza el
+      `attachment_id`, si no se sube una vez y se recuerda.
+    """
+
+    def __init__(self, blob_dir: str, max_files: int = 1000, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.blob_dir = blob_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(blob_dir, "attachments.json")
+        os.makedirs(os.path.join(blob_dir, "tmp"), exist_ok=True)
+        # sha256 -> {"attachment_id", "type", "created"}
+        self._attachments: Dict[str, Dict[str, Any]] = self._load_index()
+        # url -> (sha256, visto_en): evita volver a descargar la misma URL al rato
+        self._url_hashes: Dict[str, tuple] = {}
+        self._uploads: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    # --- Índice de attachments subidos ---
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            # Una sola lectura, chica, al crear el singleton
+            with allow_blocking(), open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index_sync(self, snapshot: Dict[str, Dict[str, Any]]) -> None:
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.index_path)
+
+    # --- Descarga en streaming ---
+
+    @asynccontextmanager
+    async def _open(self, url: str) -> AsyncIterator[httpx.Response]:
+        """GET en streaming que valida el destino en cada salto de redirección."""
+        for _ in range(_MAX_REDIRECTS + 1):
+            await check_public_url(url)
+            async with get_media_http().stream("GET", url, follow_redirects=False) as resp:
+                location = resp.headers.get("location")
+                if not (resp.is_redirect and location):
+                    yield resp
+                    return
+            url = urljoin(url, location)
+        raise AppError("Demasiadas redirecciones al descargar el adjunto", 400)
+
+    async def spool(self, url: str) -> SpooledMedia:
+        """Descarga `url` a un temporal por chunks, calculando sha256 y tamaño."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, path = await asyncio.to_thread(tempfile.mkstemp, dir=os.path.join(self.blob_dir, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async with self._open(url) as resp:
+                    if resp.status_code != 200:
+                        raise AppError(f"No se pudo descargar el adjunto ({resp.status_code})", 400)
+                    content_type = resp.headers.get("content-type", "application/octet-stream").split(";")[0]
+                    async for chunk in resp.aiter_bytes(settings.MEDIA_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > settings.MEDIA_MAX_BYTES:
+                            raise AppError("El adjunto supera el tamaño máximo permitido", 413)
+                        digest.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return SpooledMedia(path, digest.hexdigest(), size, content_type)
+
+    async def store_blob(self, url: str) -> Dict[str, Any]:
+        """Guarda el adjunto en el directorio de blobs (direccionado por contenido)."""
+        media = await self.spool(url)
+        final = await asyncio.to_thread(self._commit_blob_sync, media)
+        return {"sha256": media.sha256, "size": media.size, "content_type": media.content_type, "path": final}
+
+    def _commit_blob_sync(self, media: SpooledMedia) -> str:
+        # mimetypes lee /etc/mime.types la primera vez: también va en el hilo
+        ext = mimetypes.guess_extension(media.content_type) or ""
+        final = os.path.join(self.blob_dir, media.sha256 + ext)
+        if os.path.exists(final):
+            media.discard()
+            os.utime(final)  # contenido repetido: cuenta como uso reciente para la retención
+        else:
+            os.replace(media.path, final)
+        self._prune_blobs()
+        return final
+
+    def _prune_blobs(self) -> None:
+        """Borra los blobs usados hace más tiempo hasta quedar dentro de MEDIA_BLOB_MAX_FILES/BYTES."""
+        blobs = []
+        with os.scandir(self.blob_dir) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("attachments.json"):
+                    st = entry.stat()
+                    blobs.append((st.st_mtime, st.st_size, entry.path))
+        blobs.sort(reverse=True)
+        total = 0
+        for kept, (_, size, path) in enumerate(blobs):
+            total += size
+            if kept < self.max_files and total <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def stream_to_core(self, url: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """Reenvía el adjunto al Core en streaming (chunk a chunk, sin tocar disco)."""
+        core_url = settings.CORE_UNIFIED_URL.rstrip("/") + "/api/v1/messages/media"
+        async with self._open(url) as src:
+            if src.status_code != 200:
+                raise AppError(f"No se pudo descargar el adjunto ({src.status_code})", 400)
+            headers = {"content-type": src.headers.get("content-type", "application/octet-stream")}
+            if src.headers.get("content-length"):
+                headers["content-length"] = src.headers["content-length"]
+            r = await get_core_http().post(
+                core_url,
+                params={k: v for k, v in meta.items() if v is not None},
+                content=src.aiter_bytes(settings.MEDIA_CHUNK_SIZE),
+                headers=headers,
+                timeout=settings.MEDIA_TIMEOUT_S,
+            )
+        logger.info("➡️  Media Core %s %s", r.status_code, r.text[:200])
+        r.raise_for_status()
+        try:
+            return r.json()
+        except ValueError:
+            return {}
+
+    # --- Entrantes ---
+
+    def relay_inbound(self, attachments: Iterable[Tuple[str, Optional[str]]], meta: Dict[str, Any]) -> None:
+        """
+        Procesa los adjuntos de un mensaje entrante en segundo plano, para que
+        un video grande no retrase la respuesta al webhook ni el push al Core.
+        """
+        target = (settings.MEDIA_INBOUND_TARGET or "none").lower()
+        if target == "none":
+            return
+        for media_type, url in attachments:
+            if not url:
+                continue
+            # Descargas largas: no heredan el presupuesto del evento del webhook
+            with deadline.detached():
+                task = asyncio.create_task(self._relay_one(target, url, {**meta, "type": media_type}))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _relay_one(self, target: str, url: str, meta: Dict[str, Any]) -> None:
+        try:
+            if target == "core" and settings.CORE_UNIFIED_URL:
+                await self.stream_to_core(url, meta)
+            else:
+                stored = await self.store_blob(url)
+                logger.info("📎 Adjunto %s guardado en %s (%d bytes)", meta.get("message_id"), stored["path"], stored["size"])
+        except Exception as e:
+            logger.warning("⚠️ No se pudo relayar el adjunto de %s: %s", meta.get("message_id"), e)
+
+    # --- Salientes ---
+
+    async def attachment_id_for(
+        self,
+        url: str,
+        media_type: str,
+        upload: Callable[[SpooledMedia], Awaitable[str]],
+    ) -> str:
+        """
+        Devuelve el attachment_id de Graph para el asset en `url`, subiéndolo
+        solo si ese contenido (sha256) no se subió antes.
+        """
+        known = self._url_hashes.get(url)
+        if known and time.time() - known[1] < settings.MEDIA_URL_MEMO_TTL_S:
+            cached = self._attachments.get(known[0])
+            if cached and cached.get("type") == media_type:
+                return cached["attachment_id"]
+
+        media = await self.spool(url)
+        try:
+            if len(self._url_hashes) > 10_000:
+                self._url_hashes.clear()
+            self._url_hashes[url] = (media.sha256, time.time())
+            key = media.sha256
+            cached = self._attachments.get(key)
+            if cached and cached.get("type") == media_type:
+                logger.info("♻️ Reutilizando attachment_id para %s", key[:12])
+                return cached["attachment_id"]
+
+            # Si otra request ya está subiendo el mismo contenido, se espera a esa
+            pending = self._uploads.get(key)
+            if pending is not None:
+                return await asyncio.shield(pending)
+
+            fut: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._uploads[key] = fut
+            try:
+                attachment_id = await upload(media)
+                fut.set_result(attachment_id)
+            except BaseException as e:
+                fut.set_exception(e)
+                fut.exception()  # marcado como consultado si nadie más esperaba
+                raise
+            finally:
+                self._uploads.pop(key, None)
+
+            self._attachments[key] = {"attachment_id": attachment_id, "type": media_type, "created": int(time.time())}
+            await asyncio.to_thread(self._save_index_sync, dict(self._attachments))
+            return attachment_id
+        finally:
+            media.discard()
+
+
+_media_relay: Optional[MediaRelay] = None
+
+
+def get_media_relay() -> MediaRelay:
+    global _media_relay
+    if _media_relay is None:
+        _media_relay = MediaRelay(
+            settings.MEDIA_BLOB_DIR,
+            max_files=settings.MEDIA_BLOB_MAX_FILES,
+            max_bytes=settings.MEDIA_BLOB_MAX_BYTES,
+        )
+    return _media_relay
@@ -1,6 +1,10 @@
 import logging
-import httpx
+from app.core import deadline
 from app.core.config import settings
+from app.core.fair_scheduler import get_scheduler
+from app.core.tracing import get_tracer
+from app.services.http_clients import get_graph_http
+from app.services.token_manager import get_token_manager
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +15,7 @@ async def send_ig_message(psid: str, text: str):
     Envía un DM por Messenger API for Instagram usando el Page Access Token.
     psid: page-scoped ID (viene en el webhook).
     """
+    get_token_manager().ensure_sendable(settings.PAGE_ACCESS_TOKEN)
     url = f"{GRAPH_BASE}/me/messages"
     params = {"access_token": settings.PAGE_ACCESS_TOKEN}
     payload = {
@@ -19,18 +24,21 @@ async def send_ig_message(psid: str, text: str):
         "messaging_type": "RESPONSE",  # libre dentro de 24h desde el último msg del usuario
     }
 
-    async with httpx.AsyncClient(timeout=15) as client:
-        resp = await client.post(url, params=params, json=payload)
+    async with get_scheduler("outbound").slot(settings.INSTAGRAM_PAGE_ID):
+        with get_tracer().span("graph.send", kind="text"):
+            # Acotado por el presupuesto del evento de webhook que la dispara (si lo hay)
+            resp = await get_graph_http().post(url, params=params, json=payload, timeout=deadline.remaining(15))
 
-        if resp.status_code != 200:
-            # Log detallado para depurar permisos / token
-            try:
-                data = resp.json()
-            except Exception:
-                data = resp.text
-            logger.error("❌ Graph error (%s): %s", resp.status_code, data)
-            resp.raise_for_status()
+    if resp.status_code != 200:
+        # Log detallado para depurar permisos / token
+        try:
+            data = resp.json()
+        except Exception:
+            data = resp.text
+        logger.error("❌ Graph error (%s): %s", resp.status_code, data)
+        get_token_manager().report_graph_error(settings.PAGE_ACCESS_TOKEN, data)
+        resp.raise_for_status()
 
-        data = resp.json()
-        logger.info("📤 Enviado a %s | respuesta: %s", psid, data)
-        return data
+    data = resp.json()
+    logger.info("📤 Enviado a %s | respuesta: %s", psid, data)
+    return data
@@ -0,0 +1,67 @@
+# app/services/profile_cache.py
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class ProfileCache:
+    """
+    Cache LRU con TTL de usernames de IG (user_id -> username).
+    También recuerda fallos ("negative caching") por menos tiempo, para no
+    reintentar contra Graph en cada mensaje de un perfil que no resuelve.
+    """
+
+    def __init__(self, max_entries: int = 50_000, ttl_s: float = 3600.0, negative_ttl_s: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.negative_ttl_s = negative_ttl_s
+        self._data: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+
+    def get(self, user_id: str) -> Tuple[bool, Optional[str]]:
+        """Devuelve (hit, username)."""
+        item = self._data.get(user_id)
+        if item is None:
+            return False, None
+        expires_at, username = item
+        if expires_at < time.time():
+            del self._data[user_id]
+            return False, None
+        self._data.move_to_end(user_id)
+        return True, username
+
+    def set(self, user_id: str, username: Optional[str]) -> None:
+        ttl = self.ttl_s if username else self.negative_ttl_s
+        self._data[user_id] = (time.time() + ttl, username)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    # --- Snapshot (reinicios en caliente) ---
+
+    def export_state(self) -> List[Tuple[str, float, Optional[str]]]:
+        return [(user_id, expires_at, username) for user_id, (expires_at, username) in self._data.items()]
+
+    def import_state(self, entries: List[Tuple[str, float, Optional[str]]]) -> int:
+        """Carga entradas no vencidas sin pisar las que ya se resolvieron desde el arranque."""
+        now = time.time()
+        loaded = 0
+        for user_id, expires_at, username in entries:
+            if expires_at > now and user_id not in self._data:
+                self._data[user_id] = (expires_at, username)
+                self._data.move_to_end(user_id, last=False)  # más viejas que lo ya visto
+                loaded += 1
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return loaded
+
+
+_profile_cache: Optional[ProfileCache] = None
+
+
+def get_profile_cache() -> ProfileCache:
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = ProfileCache(ttl_s=settings.PROFILE_CACHE_TTL_S)
+    return _profile_cache
@@ -0,0 +1,318 @@
+# app/services/search_index.py
+import bisect
+import heapq
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import deque
+from typing import AbstractSet, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+# Parámetros BM25 estándar
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+# Máximo de términos en que se expande un prefijo (evita consultas "a*" que recorren todo);
+# se eligen los de mayor frecuencia de documento
+_MAX_PREFIX_EXPANSION = 64
+
+# Cota superior de los caracteres de un token ([a-z0-9_]): fin del rango de un prefijo
+_TERM_UPPER = "~"
+
+
+def fold_text(text: str) -> str:
+    """Minúsculas y sin tildes/diacríticos: 'Canción Ñandú' -> 'cancion nandu'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold_text(text))
+
+
+class IndexedMessage:
+    __slots__ = (
+        "doc_id", "mid", "sender_id", "recipient_id",
+        "sender_username", "recipient_username", "text", "timestamp", "length",
+    )
+
+    def __init__(
+        self,
+        doc_id: int,
+        mid: str,
+        sender_id: str,
+        recipient_id: str,
+        sender_username: Optional[str],
+        recipient_username: Optional[str],
+        text: str,
+        timestamp: int,
+        length: int,
+    ):
+        self.doc_id = doc_id
+        self.mid = mid
+        self.sender_id = sender_id
+        self.recipient_id = recipient_id
+        self.sender_username = sender_username
+        self.recipient_username = recipient_username
+        self.text = text
+        self.timestamp = timestamp
+        self.length = length
+
+    def indexed_tokens(self) -> List[str]:
+        return tokenize(
+            " ".join(filter(None, (self.text, self.sender_username, self.recipient_username)))
+        )
+
+
+class SearchResult(NamedTuple):
+    total: int
+    hits: List[Tuple[IndexedMessage, float]]
+    # Resultado parcial: prefijo recortado a los términos más frecuentes o
+    # ranking limitado a las coincidencias más recientes
+    truncated: bool = False
+
+
+class SearchIndex:
+    """
+    Índice invertido incremental sobre el texto de los DMs y los usernames
+    de los participantes.
+
+    - postings: término -> {doc_id: frecuencia}
+    - _terms: vocabulario ordenado, para resolver prefijos con bisect
+    - Ranking BM25; las consultas son AND entre términos (cada término con
+      '*' final, o todos si prefix=True, se expande por prefijo).
+    - Acotado a `max_docs`: al superarlo se desalojan los mensajes más antiguos.
+    - Solo se puntúan las `max_scored` coincidencias más recientes (recorriendo
+      `_order` desde el final con corte temprano); el total sigue siendo exacto.
+    """
+
+    def __init__(self, max_docs: int = 1_000_000, max_scored: int = 10_000):
+        self.max_docs = max_docs
+        self.max_scored = max_scored
+        self._docs: Dict[int, IndexedMessage] = {}
+        self._by_mid: Dict[str, int] = {}
+        self._order: Deque[int] = deque()
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._terms: List[str] = []
+        self._next_id = 1
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # --- Escritura ---
+
+    def add_message(
+        self,
+        *,
+        mid: Optional[str],
+        text: Optional[str],
+        sender_id: Optional[str] = None,
+        recipient_id: Optional[str] = None,
+        sender_username: Optional[str] = None,
+        recipient_username: Optional[str] = None,
+        timestamp: Optional[int] = None,
+    ) -> None:
+        """Indexa (o reindexa si el mid ya existe) un mensaje. timestamp en segundos."""
+        if not mid or not (text or sender_username or recipient_username):
+            return
+
+        existing = self._by_mid.get(mid)
+        if existing is not None:
+            old = self._docs[existing]
+            # Reindexar solo si llega información nueva (p.ej. usernames tras el eco)
+            sender_username = sender_username or old.sender_username
+            recipient_username = recipient_username or old.recipient_username
+            if (
+                (text or old.text) == old.text
+                and sender_username == old.sender_username
+                and recipient_username == old.recipient_username
+            ):
+                return
+            text = text or old.text
+            timestamp = timestamp or old.timestamp
+            self._remove(existing)
+
+        doc = IndexedMessage(
+            doc_id=self._next_id,
+            mid=mid,
+            sender_id=sender_id or "",
+            recipient_id=recipient_id or "",
+            sender_username=sender_username,
+            recipient_username=recipient_username,
+            text=text or "",
+            timestamp=int(timestamp or time.time()),
+            length=0,
+        )
+        self._next_id += 1
+
+        tokens = doc.indexed_tokens()
+        doc.length = len(tokens)
+        freqs: Dict[str, int] = {}
+        for tok in tokens:
+            freqs[tok] = freqs.get(tok, 0) + 1
+        for tok, tf in freqs.items():
+            postings = self._postings.get(tok)
+            if postings is None:
+                postings = self._postings[tok] = {}
+                bisect.insort(self._terms, tok)
+            postings[doc.doc_id] = tf
+
+        self._docs[doc.doc_id] = doc
+        self._by_mid[mid] = doc.doc_id
+        self._order.append(doc.doc_id)
+        self._total_length += doc.length
+
+        while len(self._docs) > self.max_docs and self._order:
+            self._remove(self._order.popleft())
+
+    def _remove(self, doc_id: int) -> None:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        # El doc_id queda huérfano en _order; se descarta al desalojar
+        self._by_mid.pop(doc.mid, None)
+        self._total_length -= doc.length
+        for tok in set(doc.indexed_tokens()):
+            postings = self._postings.get(tok)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[tok]
+                i = bisect.bisect_left(self._terms, tok)
+                if i < len(self._terms) and self._terms[i] == tok:
+                    del self._terms[i]
+
+    # --- Lectura ---
+
+    def _expand_prefix(self, prefix: str) -> Tuple[List[str], bool]:
+        """Términos con ese prefijo; si son demasiados, los de mayor frecuencia (y True)."""
+        lo = bisect.bisect_left(self._terms, prefix)
+        hi = bisect.bisect_left(self._terms, prefix + _TERM_UPPER, lo)
+        if hi - lo <= _MAX_PREFIX_EXPANSION:
+            return self._terms[lo:hi], False
+        top = heapq.nlargest(_MAX_PREFIX_EXPANSION, self._terms[lo:hi], key=lambda t: len(self._postings[t]))
+        return top, True
+
+    def _most_recent(self, candidates: AbstractSet[int]) -> List[int]:
+        """Las `max_scored` coincidencias más recientes (los doc_id crecen con la inserción)."""
+        out: List[int] = []
+        for doc_id in reversed(self._order):
+            if doc_id in candidates:
+                out.append(doc_id)
+                if len(out) >= self.max_scored:
+                    break
+        return out
+
+    def _parse_query(self, query: str, prefix: bool) -> List[Tuple[str, bool]]:
+        groups: List[Tuple[str, bool]] = []
+        for raw in (query or "").split():
+            is_prefix = prefix or raw.endswith("*")
+            for tok in tokenize(raw):
+                groups.append((tok, is_prefix))
+        return groups
+
+    def search(self, query: str, limit: int = 20, prefix: bool = False) -> SearchResult:
+        """Devuelve (total de coincidencias, [(mensaje, score)] por score y fecha, truncated)."""
+        groups = self._parse_query(query, prefix)
+        if not groups or not self._docs:
+            return SearchResult(0, [])
+
+        n_docs = len(self._docs)
+        avgdl = (self._total_length / n_docs) or 1.0
+
+        # Cada grupo de la consulta -> lista de (término, postings)
+        resolved: List[List[Tuple[str, Dict[int, int]]]] = []
+        truncated = False
+        for tok, is_prefix in groups:
+            if is_prefix:
+                terms, cut = self._expand_prefix(tok)
+                truncated = truncated or cut
+            else:
+                terms = [tok] if tok in self._postings else []
+            if not terms:
+                return SearchResult(0, [])
+            resolved.append([(t, self._postings[t]) for t in terms])
+
+        # Intersección (AND) empezando por el grupo más selectivo
+        def group_size(g: List[Tuple[str, Dict[int, int]]]) -> int:
+            return sum(len(p) for _, p in g)
+
+        resolved.sort(key=group_size)
+        candidates: Optional[AbstractSet[int]] = None
+        for g in resolved:
+            if candidates is None and len(g) == 1:
+                # Grupo de un solo término: sus postings ya son el conjunto (sin copiarlo)
+                candidates = g[0][1].keys()
+                continue
+            ids: set = set()
+            for _, postings in g:
+                if candidates is None:
+                    ids.update(postings.keys())
+                elif len(candidates) < len(postings):
+                    ids.update(d for d in candidates if d in postings)
+                else:
+                    ids.update(d for d in postings if d in candidates)
+            candidates = ids
+            if not candidates:
+                return SearchResult(0, [])
+
+        total = len(candidates)
+        if total > self.max_scored:
+            scored = self._most_recent(candidates)
+            truncated = True
+        else:
+            scored = list(candidates)
+
+        # Parte del denominador BM25 que depende solo del documento, una vez por doc
+        doc_norm = {
+            d: _BM25_K1 * (1 - _BM25_B + _BM25_B * self._docs[d].length / avgdl) for d in scored
+        }
+        scores: Dict[int, float] = dict.fromkeys(scored, 0.0)
+        for g in resolved:
+            for _, postings in g:
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                # Se recorre el lado más chico: postings de un término raro o los docs a puntuar
+                if len(postings) < len(scores):
+                    pairs = ((d, tf) for d, tf in postings.items() if d in scores)
+                else:
+                    pairs = ((d, postings[d]) for d in scored if d in postings)
+                for doc_id, tf in pairs:
+                    scores[doc_id] += idf * tf * (_BM25_K1 + 1) / (tf + doc_norm[doc_id])
+
+        ranked = heapq.nlargest(
+            max(1, limit),
+            scores.items(),
+            key=lambda kv: (kv[1], self._docs[kv[0]].timestamp),
+        )
+        return SearchResult(total, [(self._docs[d], s) for d, s in ranked], truncated)
+
+
+_search_index: Optional[SearchIndex] = None
+
+
+def get_search_index() -> SearchIndex:
+    global _search_index
+    if _search_index is None:
+        _search_index = SearchIndex(
+            max_docs=settings.SEARCH_INDEX_MAX_DOCS,
+            max_scored=settings.SEARCH_MAX_SCORED_DOCS,
+        )
+    return _search_index
+
+
+def index_message_safely(**kwargs) -> None:
+    """Indexa sin propagar errores: la búsqueda nunca debe romper ingest ni envíos."""
+    try:
+        get_search_index().add_message(**kwargs)
+    except Exception as e:  # pragma: no cover
+        logger.warning("⚠️ No se pudo indexar el mensaje %s: %s", kwargs.get("mid"), e)
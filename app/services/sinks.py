@@ -0,0 +1,306 @@
+# app/services/sinks.py
+import abc
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+
+from app.core import deadline
+from app.core.config import settings
+from app.services.http_clients import get_core_http
+
+logger = logging.getLogger(__name__)
+
+POLICY_DROP = "drop"    # cola llena: se descarta el evento nuevo (el webhook no espera)
+POLICY_BLOCK = "block"  # cola llena: el publicador espera hasta SINK_BLOCK_TIMEOUT_S y luego descarta
+
+
+class Sink(abc.ABC):
+    """Destino de eventos entrantes. Recibe lotes; los eventos son compartidos y no deben mutarse."""
+
+    name = "sink"
+
+    @abc.abstractmethod
+    async def write_batch(self, events: List[Mapping[str, Any]]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class CoreHttpSink(Sink):
+    """Core unificado: POST /api/v1/messages/unified por evento (la API no acepta lotes)."""
+
+    def __init__(self, name: str, url: str = "", timeout_s: float = 10.0):
+        self.name = name
+        base = url or settings.CORE_UNIFIED_URL
+        self.url = base.rstrip("/") + "/api/v1/messages/unified"
+        self.timeout_s = timeout_s
+
+    async def write_batch(self, events: List[Mapping[str, Any]]) -> None:
+        for event in events:
+            # Escritura (no idempotente): sin hedging, con su propio timeout
+            r = await get_core_http().post(self.url, json=event, timeout=self.timeout_s)
+            logger.info(f"➡️  Push Core {r.status_code} {r.text[:200]}")
+            r.raise_for_status()
+
+
+class NdjsonFileSink(Sink):
+    """Archivo NDJSON local (archivo histórico / analytics offline). Un write por lote, en un hilo."""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+
+    async def write_batch(self, events: List[Mapping[str, Any]]) -> None:
+        lines = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in events)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, data: str) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+
+class QueueSink(Sink):
+    """
+    Cola en memoria acotada: reemplazo local de un broker (Kafka/Redis) para
+    desarrollo y pruebas. `drain()` devuelve y vacía lo acumulado.
+    """
+
+    def __init__(self, name: str, max_items: int = 10_000):
+        self.name = name
+        self.items: Deque[Mapping[str, Any]] = deque(maxlen=max_items)
+
+    async def write_batch(self, events: List[Mapping[str, Any]]) -> None:
+        self.items.extend(events)
+
+    def drain(self) -> List[Mapping[str, Any]]:
+        out = list(self.items)
+        self.items.clear()
+        return out
+
+
+SINK_TYPES = {"core_http": CoreHttpSink, "ndjson": NdjsonFileSink, "queue": QueueSink}
+
+
+class SinkWorker:
+    """
+    Cola acotada propia + N workers que entregan en lotes a un sink.
+    Un sink lento solo llena su cola: los demás siguen a su ritmo.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        max_queue: int = 10_000,
+        concurrency: int = 1,
+        batch_size: int = 1,
+        batch_wait_ms: float = 0,
+        policy: str = POLICY_DROP,
+        retries: int = 2,
+    ):
+        self.sink = sink
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait_s = batch_wait_ms / 1000
+        self.policy = policy
+        self.retries = retries
+        self.queue: "asyncio.Queue[Tuple[float, Mapping[str, Any]]]" = asyncio.Queue(maxsize=max_queue)
+        # Instante de encolado de cada evento en cola, en el mismo orden (lag sin mirar adentro de la Queue)
+        self._enqueued_at: Deque[float] = deque()
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    # --- Publicación ---
+
+    async def put(self, event: Mapping[str, Any]) -> bool:
+        item = (time.monotonic(), event)
+        try:
+            self.queue.put_nowait(item)
+            self._enqueued_at.append(item[0])
+        except asyncio.QueueFull:
+            if self.policy != POLICY_BLOCK:
+                return self._drop()
+            try:
+                # Nunca más allá del presupuesto del evento que publica (webhook)
+                timeout = deadline.remaining(settings.SINK_BLOCK_TIMEOUT_S)
+                await asyncio.wait_for(self._put_waiting(item), timeout=timeout)
+            except asyncio.TimeoutError:
+                return self._drop()
+        self.enqueued += 1
+        return True
+
+    async def _put_waiting(self, item: Tuple[float, Mapping[str, Any]]) -> None:
+        await self.queue.put(item)
+        # Sin await entre el put efectivo y el registro: el orden coincide con el de la cola
+        self._enqueued_at.append(item[0])
+
+    def _drop(self) -> bool:
+        self.dropped += 1
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.warning("⚠️ Sink %s saturado: %d eventos descartados", self.sink.name, self.dropped)
+        return False
+
+    # --- Entrega ---
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def _get(self) -> Tuple[float, Mapping[str, Any]]:
+        item = await self.queue.get()
+        self._enqueued_at.popleft()
+        return item
+
+    async def _next_batch(self) -> List[Tuple[float, Mapping[str, Any]]]:
+        batch = [await self._get()]
+        batch_until = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                self._enqueued_at.popleft()
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = batch_until - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._deliver([event for _, event in batch])
+                self.delivered += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error("❌ Sink %s: se pierden %d eventos: %s", self.sink.name, len(batch), e)
+            finally:
+                lag_ms = (time.monotonic() - batch[0][0]) * 1000
+                self.last_lag_ms = lag_ms
+                self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _deliver(self, events: List[Mapping[str, Any]]) -> None:
+        backoff = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                await self.sink.write_batch(events)
+                return
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning("⚠️ Sink %s falló (%s); reintento en %.1fs", self.sink.name, e, backoff)
+                await asyncio.sleep(backoff)
+                backoff *= 2
+
+    async def stop(self, drain_timeout_s: float) -> None:
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout_s)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Sink %s: %d eventos sin entregar al apagar", self.sink.name, self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.sink.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        head_age_ms = 0.0
+        if self._enqueued_at:
+            head_age_ms = (time.monotonic() - self._enqueued_at[0]) * 1000  # evento más viejo en cola
+        return {
+            "type": type(self.sink).__name__,
+            "policy": self.policy,
+            "queue_depth": self.queue.qsize(),
+            "queue_max": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "lag_ms": round(max(head_age_ms, 0.0), 1),
+            "last_batch_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+
+def build_worker(spec: Dict[str, Any]) -> SinkWorker:
+    """Construye un worker desde una entrada de SINKS ({"type", "name", ...opciones})."""
+    spec = dict(spec)
+    kind = spec.pop("type")
+    if kind not in SINK_TYPES:
+        raise ValueError(f"Tipo de sink desconocido: {kind}")
+    name = spec.pop("name", kind)
+    worker_opts = {
+        k: spec.pop(k)
+        for k in ("max_queue", "concurrency", "batch_size", "batch_wait_ms", "policy", "retries")
+        if k in spec
+    }
+    return SinkWorker(SINK_TYPES[kind](name, **spec), **worker_opts)
+
+
+class EventFanOut:
+    """
+    Reparte cada evento (un solo dict, sin copias) a todos los sinks configurados.
+    Sin SINKS explícitos, se usa el Core unificado si CORE_UNIFIED_URL está definido.
+    """
+
+    def __init__(self, specs: List[Dict[str, Any]]):
+        self.workers: Dict[str, SinkWorker] = {}
+        for spec in specs:
+            worker = build_worker(spec)
+            self.workers[worker.sink.name] = worker
+
+    def start(self) -> None:
+        for worker in self.workers.values():
+            worker.start()
+
+    async def publish(self, event: Mapping[str, Any]) -> None:
+        if not self.workers:
+            return
+        if len(self.workers) == 1:
+            await next(iter(self.workers.values())).put(event)
+            return
+        await asyncio.gather(*(w.put(event) for w in self.workers.values()))
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(w.stop(settings.SINK_DRAIN_TIMEOUT_S) for w in self.workers.values()))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: w.metrics() for name, w in self.workers.items()}
+
+
+def default_sink_specs() -> List[Dict[str, Any]]:
+    if settings.SINKS:
+        return settings.SINKS
+    if settings.CORE_UNIFIED_URL:
+        # Sin reintentos: el POST al Core no es idempotente (igual que el push directo anterior)
+        return [{"type": "core_http", "name": "core", "concurrency": 4, "policy": POLICY_BLOCK, "retries": 0}]
+    return []
+
+
+_fanout: Optional[EventFanOut] = None
+
+
+def get_event_fanout() -> EventFanOut:
+    global _fanout
+    if _fanout is None:
+        _fanout = EventFanOut(default_sink_specs())
+    return _fanout
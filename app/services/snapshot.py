@@ -0,0 +1,176 @@
+# app/services/snapshot.py
+import asyncio
+import logging
+import marshal
+import os
+import struct
+import sys
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.conversation_cache import get_conversation_cache
+from app.services.delta_sync import get_delta_sync
+from app.services.profile_cache import get_profile_cache
+from app.services.token_manager import get_token_manager
+
+logger = logging.getLogger(__name__)
+
+# Encabezado: magic, versión del formato, versión de marshal, creado (epoch s), largo del cuerpo
+_MAGIC = b"IGCS"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHdI")
+
+
+def _caches() -> Dict[str, Any]:
+    return {
+        "profiles": get_profile_cache(),
+        "conversations": get_conversation_cache(),
+        "tokens": get_token_manager(),
+        "delta_sync": get_delta_sync(),
+    }
+
+
+def encode_snapshot(state: Dict[str, Any], created_at: float) -> bytes:
+    body = zlib.compress(marshal.dumps(state), 6)
+    return _HEADER.pack(_MAGIC, FORMAT_VERSION, marshal.version, created_at, len(body)) + body
+
+
+def decode_snapshot(data: bytes) -> Optional[tuple]:
+    """(created_at, state) o None si el archivo no es de este formato/versión o está truncado."""
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, marshal_version, created_at, size = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != FORMAT_VERSION or marshal_version != marshal.version:
+        return None
+    body = data[_HEADER.size:]
+    if len(body) != size:
+        return None
+    return created_at, marshal.loads(zlib.decompress(body))
+
+
+class CacheSnapshotter:
+    """
+    Persiste los caches en memoria (usernames, listados de conversaciones,
+    estado de tokens, marcas del delta sync) para que un reinicio arranque en caliente.
+
+    - Binario compacto y versionado (marshal + zlib); ante otro formato o
+      versión de Python el snapshot se ignora.
+    - Escritura atómica (tmp + fsync + rename) en un hilo; en el loop solo
+      se copia el estado.
+    - Al arrancar se carga en segundo plano; cada cache valida TTLs y no pisa
+      lo que ya se resolvió mientras tanto.
+    """
+
+    def __init__(self, path: str, interval_s: float, max_age_s: float):
+        self.path = path
+        self.interval_s = interval_s
+        self.max_age_s = max_age_s
+        self.loaded: Dict[str, int] = {}
+        self.last_saved_at: Optional[float] = None
+        self.load_done = False
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Guardar ---
+
+    async def save(self) -> None:
+        state = {name: cache.export_state() for name, cache in _caches().items()}
+        created_at = time.time()
+        size = await asyncio.to_thread(self._write, state, created_at)
+        self.last_saved_at = created_at
+        logger.info("💾 Snapshot de caches guardado (%d bytes, %s)", size, {k: len(v) for k, v in state.items()})
+
+    def _write(self, state: Dict[str, Any], created_at: float) -> int:
+        data = encode_snapshot(state, created_at)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        return len(data)
+
+    # --- Cargar ---
+
+    async def load(self) -> None:
+        started = time.perf_counter()
+        try:
+            decoded = await asyncio.to_thread(self._read)
+        except Exception as e:
+            logger.warning("⚠️ Snapshot de caches ilegible, se ignora: %s", e)
+            return
+        if decoded is None:
+            return
+        created_at, state = decoded
+        age_s = time.time() - created_at
+        if age_s > self.max_age_s:
+            logger.info("💾 Snapshot de caches descartado por viejo (%.0fs)", age_s)
+            return
+        for name, cache in _caches().items():
+            try:
+                self.loaded[name] = cache.import_state(state.get(name) or [])
+            except Exception as e:
+                logger.warning("⚠️ No se pudo restaurar el cache %s: %s", name, e)
+        logger.info(
+            "💾 Caches restaurados en %.1fms (snapshot de hace %.0fs): %s",
+            (time.perf_counter() - started) * 1000, age_s, self.loaded,
+        )
+
+    def _read(self) -> Optional[tuple]:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        decoded = decode_snapshot(data)
+        if decoded is None:
+            logger.info("💾 Snapshot de caches con otro formato/versión (%s), se ignora", sys.version.split()[0])
+        return decoded
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        await self.load()
+        self.load_done = True
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.warning("⚠️ No se pudo guardar el snapshot de caches: %s", e)
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if not self.load_done:
+            return  # no pisar un snapshot que todavía no se terminó de cargar
+        try:
+            await self.save()
+        except Exception as e:
+            logger.warning("⚠️ No se pudo guardar el snapshot de caches al apagar: %s", e)
+
+
+_snapshotter: Optional[CacheSnapshotter] = None
+
+
+def get_snapshotter() -> CacheSnapshotter:
+    global _snapshotter
+    if _snapshotter is None:
+        _snapshotter = CacheSnapshotter(
+            settings.SNAPSHOT_PATH,
+            interval_s=settings.SNAPSHOT_INTERVAL_S,
+            max_age_s=settings.SNAPSHOT_MAX_AGE_S,
+        )
+    return _snapshotter
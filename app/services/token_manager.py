@@ -0,0 +1,240 @@
+# app/services/token_manager.py
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.errors import AppError
+
+logger = logging.getLogger(__name__)
+
+# Códigos de Graph que indican token inválido/vencido/revocado
+_INVALID_TOKEN_CODES = {102, 190}
+
+
+def _fingerprint(token: str) -> str:
+    # Nunca se guarda el token en claro como clave del cache
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class TokenStatus:
+    __slots__ = ("is_valid", "expires_at", "scopes", "checked_at", "error")
+
+    def __init__(
+        self,
+        is_valid: bool,
+        expires_at: int = 0,
+        scopes: Optional[List[str]] = None,
+        checked_at: Optional[float] = None,
+        error: Optional[str] = None,
+    ):
+        self.is_valid = is_valid
+        self.expires_at = expires_at  # epoch s; 0 = no vence
+        self.scopes = scopes or []
+        self.checked_at = checked_at or time.time()
+        self.error = error
+
+    def usable(self, now: float) -> bool:
+        return self.is_valid and (not self.expires_at or self.expires_at > now)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "is_valid": self.is_valid,
+            "expires_at": self.expires_at or None,
+            "scopes": self.scopes,
+            "checked_at": int(self.checked_at),
+            "error": self.error,
+        }
+
+
+class TokenManager:
+    """
+    Ciclo de vida de tokens en segundo plano:
+
+    - Cachea el resultado de /debug_token (validez, vencimiento, scopes) por token.
+    - Periódicamente revisa el PAGE token guardado (y PAGE_ACCESS_TOKEN de env);
+      si el user token está por vencer lo renueva (fb_exchange_token) y si el
+      PAGE token dejó de ser válido lo vuelve a derivar del user token.
+    - Los envíos consultan el estado cacheado: con un token que se sabe
+      inválido o vencido fallan al instante, sin ida y vuelta a Graph.
+    """
+
+    def __init__(self):
+        self._status: Dict[str, TokenStatus] = {}
+        self._checking: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        # /debug_token requiere el app token (APP_ID|APP_SECRET)
+        return settings.TOKEN_MANAGER_ENABLED and bool(settings.APP_ID and settings.APP_SECRET)
+
+    # --- Consulta rápida (camino de envío) ---
+
+    def status_for(self, token: Optional[str]) -> Optional[TokenStatus]:
+        return self._status.get(_fingerprint(token)) if token else None
+
+    def ensure_sendable(self, token: Optional[str]) -> None:
+        """Lanza AppError(401) si el token se sabe inválido o vencido. Sin estado, no bloquea."""
+        if not token or not self.enabled:
+            return
+        status = self.status_for(token)
+        if status is None:
+            self._schedule_check(token)
+            return
+        # Antes de decidir: un estado viejo (también uno inválido) se re-verifica en segundo plano
+        if time.time() - status.checked_at > settings.TOKEN_CHECK_INTERVAL_S:
+            self._schedule_check(token)
+        if not status.usable(time.time()):
+            raise AppError(
+                "El token de página es inválido o venció; volvé a autenticar en /auth/login", 401
+            )
+
+    def report_graph_error(self, token: Optional[str], err: Any) -> None:
+        """Marca el token como inválido si Graph respondió con un error de autenticación."""
+        if not token or not isinstance(err, dict):
+            return
+        code = (err.get("error") or {}).get("code")
+        if code in _INVALID_TOKEN_CODES:
+            msg = (err.get("error") or {}).get("message")
+            self._status[_fingerprint(token)] = TokenStatus(False, error=msg)
+            logger.warning("🔑 Token marcado como inválido por Graph: %s", msg)
+
+    # --- Snapshot (reinicios en caliente) ---
+
+    def export_state(self) -> List[Tuple[str, bool, int, List[str], float, Optional[str]]]:
+        # Solo fingerprints: el snapshot nunca contiene tokens
+        return [
+            (fp, st.is_valid, st.expires_at, list(st.scopes), st.checked_at, st.error)
+            for fp, st in self._status.items()
+        ]
+
+    def import_state(self, entries: List[Tuple[str, bool, int, List[str], float, Optional[str]]]) -> int:
+        """
+        Los estados viejos se cargan igual: ensure_sendable los re-verifica pasado el
+        intervalo. Los inválidos no se restauran: un error 102/190 puntual no debe
+        seguir bloqueando envíos después de un reinicio.
+        """
+        loaded = 0
+        for fp, is_valid, expires_at, scopes, checked_at, error in entries:
+            if is_valid and fp not in self._status:
+                self._status[fp] = TokenStatus(is_valid, expires_at, scopes, checked_at, error)
+                loaded += 1
+        return loaded
+
+    # --- Verificación ---
+
+    def _schedule_check(self, token: str) -> None:
+        fp = _fingerprint(token)
+        if fp in self._checking:
+            return
+        # La verificación es compartida: no se acota al presupuesto del envío que la disparó
+        with deadline.detached():
+            task = asyncio.create_task(self.check(token))
+        self._checking[fp] = task
+        task.add_done_callback(lambda _: self._checking.pop(fp, None))
+
+    async def check(self, token: str) -> TokenStatus:
+        from app.services.instagram_client import get_instagram_client
+
+        try:
+            data = await get_instagram_client().debug_token(token)
+            status = TokenStatus(
+                is_valid=bool(data.get("is_valid")),
+                expires_at=int(data.get("expires_at") or 0),
+                scopes=data.get("scopes") or [],
+                error=(data.get("error") or {}).get("message"),
+            )
+        except Exception as e:
+            # No se pudo verificar: se conserva el estado anterior (no se bloquean envíos)
+            logger.warning("⚠️ debug_token falló: %s", e)
+            previous = self.status_for(token)
+            return previous or TokenStatus(True, error=f"sin verificar: {e}")
+        self._status[_fingerprint(token)] = status
+        return status
+
+    # --- Mantenimiento periódico ---
+
+    def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.warning("⚠️ Revisión de tokens falló: %s", e)
+            await asyncio.sleep(settings.TOKEN_CHECK_INTERVAL_S)
+
+    async def refresh_once(self) -> None:
+        from app.services.instagram_client import get_instagram_client
+        from app.services.token_store import get_token_store
+
+        if settings.PAGE_ACCESS_TOKEN:
+            status = await self.check(settings.PAGE_ACCESS_TOKEN)
+            if not status.usable(time.time()):
+                logger.error("🔑 PAGE_ACCESS_TOKEN (env) inválido o vencido: %s", status.error)
+
+        store = get_token_store()
+        tokens = await store.get_tokens()
+        if not tokens:
+            return
+        ig = get_instagram_client()
+        now = time.time()
+        changed = False
+
+        # 1) User token por vencer -> renovar
+        if tokens.user_access_token:
+            user_status = await self.check(tokens.user_access_token)
+            expires_at = user_status.expires_at or tokens.user_token_expires_at or 0
+            if user_status.is_valid and expires_at and expires_at - now < settings.TOKEN_REFRESH_MARGIN_S:
+                try:
+                    new_token, new_exp = await ig.exchange_long_lived_token(tokens.user_access_token)
+                    tokens.user_access_token = new_token
+                    tokens.user_token_expires_at = new_exp
+                    changed = True
+                    logger.info("🔑 User token renovado (vence %s)", new_exp)
+                except AppError as e:
+                    logger.warning("⚠️ No se pudo renovar el user token: %s", e.message)
+
+        # 2) PAGE token inválido o por vencer -> volver a derivarlo del user token
+        page_status = await self.check(tokens.access_token)
+        page_expiring = page_status.expires_at and page_status.expires_at - now < settings.TOKEN_REFRESH_MARGIN_S
+        if (not page_status.is_valid or page_expiring) and tokens.user_access_token and tokens.page_id:
+            try:
+                page_token = await ig.page_token_for(tokens.user_access_token, tokens.page_id)
+            except Exception as e:
+                page_token = None
+                logger.warning("⚠️ No se pudo re-derivar el PAGE token: %s", e)
+            if page_token and page_token != tokens.access_token:
+                tokens.access_token = page_token
+                changed = True
+                await self.check(page_token)
+                logger.info("🔑 PAGE token renovado para la página %s", tokens.page_id)
+        if not page_status.usable(now) and not changed:
+            logger.error("🔑 PAGE token inválido o vencido; se requiere re-autenticación (/auth/login)")
+
+        if changed:
+            await store.save_tokens(tokens)
+
+
+_token_manager: Optional[TokenManager] = None
+
+
+def get_token_manager() -> TokenManager:
+    global _token_manager
+    if _token_manager is None:
+        _token_manager = TokenManager()
+    return _token_manager
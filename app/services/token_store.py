@@ -1,6 +1,7 @@
+import asyncio
 import json
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
 from app.core.config import settings
 from app.services.instagram_client import OAuthTokens
@@ -10,22 +11,45 @@ class TokenStore:
     def __init__(self, path: str):
         self.path = path
         os.makedirs(os.path.dirname(path), exist_ok=True)
+        # ((mtime_ns, size), contenido): se relee el archivo solo si cambió
+        self._cached: Optional[Tuple[Tuple[int, int], Optional[dict]]] = None
+
+    # Las lecturas/escrituras de archivo van a un hilo: no bloquean el event loop
 
     async def save_tokens(self, tokens: OAuthTokens) -> None:
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(tokens.model_dump(), f)
+        await asyncio.to_thread(self._write, tokens.model_dump())
+        self._cached = None
 
     async def get_tokens(self) -> Optional[OAuthTokens]:
-        if not os.path.exists(self.path):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if self._cached is None or self._cached[0] != (st.st_mtime_ns, st.st_size):
+            self._cached = await asyncio.to_thread(self._read)
+        data = self._cached[1]
+        if not data or not data.get("access_token"):
             return None
+        return OAuthTokens.from_dict(data)
+
+    def _write(self, data: dict) -> None:
+        # Escritura atómica: un lector concurrente nunca ve el archivo a medio escribir
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def _read(self) -> Tuple[Tuple[int, int], Optional[dict]]:
         try:
             with open(self.path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if not data.get("access_token"):
-                return None
-            return OAuthTokens.from_dict(data)
-        except Exception:
-            return None
+                st = os.fstat(f.fileno())
+                key = (st.st_mtime_ns, st.st_size)
+                try:
+                    return key, json.load(f)
+                except ValueError:
+                    return key, None
+        except OSError:
+            return (0, 0), None
 
 
 _token_store: Optional[TokenStore] = None
@@ -0,0 +1,107 @@
+"""
+Compara la memoria de un backlog de eventos de webhook en dos representaciones:
+
+- dict: el evento crudo de request.json(), con la entrega completa (`entry`)
+  retenida como hasta ahora mientras el evento espera en cola.
+- IgEvent: el evento normalizado con __slots__ (app.services.events).
+
+    python -m app.tools.bench_event_memory --sizes 1000 10000 100000
+
+Mide con tracemalloc (bytes asignados por Python al construir el backlog).
+"""
+import argparse
+import gc
+import json
+import random
+import string
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from app.services.events import parse_events
+
+PAGE_ID = "17841400000000000"
+
+
+def _delivery(i: int, rnd: random.Random) -> bytes:
+    """Entrega realista: un evento `message` por entrega, ~1 de cada 10 con adjunto."""
+    message: Dict[str, Any] = {
+        "mid": "aWdfZAG1faXRlbToxOklHTWVzc2FnZAUlEOjE3ODQx" + "".join(rnd.choices(string.ascii_letters, k=40)),
+        "text": " ".join("".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(2, 9))) for _ in range(rnd.randint(3, 25))),
+    }
+    if i % 10 == 0:
+        message["attachments"] = [
+            {"type": "image", "payload": {"url": "https://lookaside.fbsbx.com/ig_messaging_cdn/?asset_id=" + str(10**17 + i)}}
+        ]
+    payload = {
+        "object": "instagram",
+        "entry": [
+            {
+                "time": 1700000000000 + i,
+                "id": PAGE_ID,
+                "messaging": [
+                    {
+                        "sender": {"id": str(10**16 + rnd.randint(0, 5000))},
+                        "recipient": {"id": PAGE_ID},
+                        "timestamp": 1700000000000 + i,
+                        "message": message,
+                    }
+                ],
+            }
+        ],
+    }
+    return json.dumps(payload).encode()
+
+
+def _as_dicts(bodies: List[bytes]) -> List[Any]:
+    backlog = []
+    for body in bodies:
+        payload = json.loads(body)
+        for entry in payload["entry"]:
+            for event in entry["messaging"]:
+                backlog.append((event, entry))  # el evento y su `entry` quedan vivos en la cola
+    return backlog
+
+
+def _as_events(bodies: List[bytes]) -> List[Any]:
+    backlog = []
+    for body in bodies:
+        backlog.extend(parse_events(json.loads(body)))
+    return backlog
+
+
+def measure(build: Callable[[List[bytes]], List[Any]], bodies: List[bytes]) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    backlog = build(bodies)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n = len(backlog)
+    del backlog
+    return {"events": n, "bytes": current, "per_event": current / max(1, n), "build_s": elapsed}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"{'eventos':>9} {'dict MiB':>10} {'B/evento':>9} {'IgEvent MiB':>12} {'B/evento':>9} {'ahorro':>7}")
+    for size in args.sizes:
+        rnd = random.Random(args.seed)
+        bodies = [_delivery(i, rnd) for i in range(size)]
+        d = measure(_as_dicts, bodies)
+        e = measure(_as_events, bodies)
+        saving = 1 - e["bytes"] / d["bytes"] if d["bytes"] else 0.0
+        print(
+            f"{size:>9} {d['bytes'] / 2**20:>10.1f} {d['per_event']:>9.0f} "
+            f"{e['bytes'] / 2**20:>12.1f} {e['per_event']:>9.0f} {saving:>7.0%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
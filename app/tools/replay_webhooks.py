@@ -0,0 +1,141 @@
+"""
+Reproduce capturas de webhooks (JSONL de WebhookCapture) contra una instancia local.
+
+    python -m app.tools.replay_webhooks data/captures/webhooks.jsonl \\
+        --url http://localhost:8000/webhooks/instagram --secret test_secret --speed 1
+
+--speed 1   respeta los intervalos originales entre llegadas
+--speed 10  10× más rápido (intervalos / 10)
+--speed max sin esperas (solo limitado por --concurrency)
+
+Cada body se vuelve a firmar (X-Hub-Signature-256) con --secret, que debe
+coincidir con el APP_SECRET de la instancia bajo prueba.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+def load_captures(paths: List[str]) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    print(f"[replay] {path}:{n} línea inválida, se omite", file=sys.stderr)
+                    continue
+                if "body" in rec and "t" in rec:
+                    records.append(rec)
+    records.sort(key=lambda r: r["t"])
+    return records
+
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * (len(ordered) - 1)))]
+
+
+async def replay(
+    records: List[Dict[str, Any]],
+    url: str,
+    secret: str,
+    speed: Optional[float],
+    concurrency: int,
+    timeout: float,
+) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lag: List[float] = []
+    t0_capture = records[0]["t"] if records else 0.0
+
+    async with httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=concurrency)) as client:
+        start = time.monotonic()
+
+        async def fire(rec: Dict[str, Any]) -> None:
+            if speed is not None:
+                target = start + (rec["t"] - t0_capture) / speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag.append(max(0.0, time.monotonic() - target))
+            body = rec["body"].encode("utf-8")
+            headers = dict(rec.get("headers") or {})
+            headers.setdefault("content-type", "application/json")
+            headers["X-Hub-Signature-256"] = sign(secret, body)
+            async with sem:
+                sent = time.monotonic()
+                try:
+                    r = await client.post(url, content=body, headers=headers)
+                    key = str(r.status_code)
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                latencies.append(time.monotonic() - sent)
+                statuses[key] = statuses.get(key, 0) + 1
+
+        await asyncio.gather(*(fire(r) for r in records))
+        elapsed = time.monotonic() - start
+
+    return {
+        "requests": len(records),
+        "elapsed_s": round(elapsed, 3),
+        "rate_rps": round(len(records) / elapsed, 1) if elapsed else None,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "max": round(max(latencies, default=0.0) * 1000, 1),
+        },
+        "schedule_lag_ms_p99": round(percentile(lag, 0.99) * 1000, 1) if lag else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay de capturas de webhooks de Instagram")
+    parser.add_argument("captures", nargs="+", help="Archivos JSONL de captura (se combinan y ordenan por llegada)")
+    parser.add_argument("--url", default="http://localhost:8000/webhooks/instagram")
+    parser.add_argument("--secret", required=True, help="APP_SECRET de la instancia bajo prueba")
+    parser.add_argument("--speed", default="1", help="Factor de velocidad (1, 10, ...) o 'max'")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests simultáneas como máximo")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    speed: Optional[float] = None
+    if args.speed != "max":
+        speed = float(args.speed)
+        if speed <= 0:
+            parser.error("--speed debe ser > 0 o 'max'")
+
+    records = load_captures(args.captures)
+    if not records:
+        print("[replay] no hay capturas para reproducir", file=sys.stderr)
+        return 1
+    span = records[-1]["t"] - records[0]["t"]
+    print(f"[replay] {len(records)} requests capturadas en {span:.1f}s → {args.url} (speed={args.speed})", file=sys.stderr)
+
+    report = asyncio.run(replay(records, args.url, args.secret, speed, args.concurrency, args.timeout))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+import pytest
+
+from app.core import loop_monitor
+
+
+@pytest.fixture(autouse=True)
+def no_blocking_calls_in_the_loop():
+    """Toda la suite en modo estricto: falla el test que haga I/O bloqueante en el loop."""
+    loop_monitor.install_strict_mode()
+    loop_monitor.take_strict_violations()
+    yield
+    violations = loop_monitor.take_strict_violations()
+    assert not violations, "I/O bloqueante en el event loop:\n" + "\n".join(violations)
@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.admission import AdmissionControlMiddleware, AdmissionController, RouteLimiter
+from app.core.config import settings
+
+FAST, SLOW = 0.1, 1.0  # latencias por debajo / por encima del objetivo (0.5 s)
+
+
+def _limiter(limit: int = 1, **kwargs) -> RouteLimiter:
+    params = dict(min_limit=1, max_limit=10, queue_timeout_s=1.0, max_queue=10, target_latency_s=0.5)
+    params.update(kwargs)
+    return RouteLimiter("t", limit, **params)
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_aimd_grows_additively_and_shrinks_multiplicatively_once_per_interval():
+    limiter = _limiter(4)
+
+    async def scenario():
+        assert await limiter.acquire()
+        limiter.release(FAST)
+        assert limiter.limit == pytest.approx(4.25)  # +1/limit
+        for _ in range(2):
+            assert await limiter.acquire()
+            limiter.release(SLOW)
+        # Dos requests lentas seguidas: una sola reducción por intervalo
+        assert limiter.limit == pytest.approx(4.25 * 0.9)
+
+    asyncio.run(scenario())
+
+
+def test_limit_is_clamped_between_min_and_max():
+    limiter = _limiter(3, min_limit=3, max_limit=4)
+
+    limiter._decrease()
+    assert limiter.limit == 3.0
+    limiter.limit = 3.9
+    limiter.in_flight = 1
+    limiter.release(FAST)
+    assert limiter.limit == 4.0
+
+
+def test_freed_slots_are_handed_to_waiters_in_fifo_order():
+    limiter = _limiter(1)
+    order = []
+
+    async def waiter(name: str):
+        assert await limiter.acquire()
+        order.append(name)
+
+    async def scenario():
+        assert await limiter.acquire()
+        a = asyncio.create_task(waiter("a"))
+        await _settle()
+        b = asyncio.create_task(waiter("b"))
+        await _settle()
+        assert limiter.snapshot()["queued"] == 2
+
+        limiter.release(SLOW)
+        await _settle()
+        # El lugar pasa directo al primero de la cola: nunca queda libre para otro
+        assert order == ["a"] and limiter.in_flight == 1
+        # Quien llega ahora no se adelanta a "b" aunque vea la cola
+        c = asyncio.create_task(waiter("c"))
+        await _settle()
+        limiter.release(SLOW)
+        await _settle()
+        limiter.release(SLOW)
+        await asyncio.gather(a, b, c)
+
+    asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+
+
+def test_cancelled_waiter_leaves_the_queue_without_taking_a_slot():
+    limiter = _limiter(1)
+
+    async def scenario():
+        assert await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await _settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.snapshot()["queued"] == 0
+        limiter.release(SLOW)
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_sheds_and_lowers_the_limit():
+    limiter = _limiter(2, min_limit=1, queue_timeout_s=0.01)
+
+    async def scenario():
+        assert await limiter.acquire() and await limiter.acquire()
+        return await limiter.acquire()
+
+    assert asyncio.run(scenario()) is False
+    assert limiter.shed == 1
+    assert limiter.limit == pytest.approx(1.8)
+
+
+def _guarded_app(monkeypatch, *, max_queue: int, queue_timeout_s: float):
+    monkeypatch.setattr(settings, "ADMISSION_MIN_LIMIT", 1)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", max_queue)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_S", queue_timeout_s)
+    gate = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/slow/hold":
+            await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    controller = AdmissionController({"/slow": 1})
+    transport = httpx.ASGITransport(app=AdmissionControlMiddleware(app, controller))
+    return httpx.AsyncClient(transport=transport, base_url="http://test"), gate, controller
+
+
+@pytest.mark.parametrize("max_queue", [0, 1])
+def test_middleware_rejects_with_503_and_retry_after(monkeypatch, max_queue):
+    async def scenario():
+        client, gate, controller = _guarded_app(monkeypatch, max_queue=max_queue, queue_timeout_s=0.05)
+        async with client:
+            held = asyncio.create_task(client.get("/slow/hold"))
+            await _settle()
+            # Sin lugar: se descarta enseguida (cola llena) o tras esperar queue_timeout_s
+            rejected = await client.get("/slow/other")
+            unguarded = await client.get("/health")
+            gate.set()
+            ok = await held
+        return rejected, unguarded, ok, controller
+
+    rejected, unguarded, ok, controller = asyncio.run(scenario())
+
+    assert rejected.status_code == 503
+    assert rejected.headers["retry-after"] == "1"
+    assert rejected.json() == {"detail": "Servicio sobrecargado, reintentar más tarde"}
+    assert unguarded.status_code == 200 and ok.status_code == 200
+    assert controller.degraded()
+    assert controller.snapshot()["/slow"]["shed"] == 1
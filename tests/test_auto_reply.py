@@ -0,0 +1,115 @@
+import asyncio
+
+from app.services.auto_reply import AhoCorasick, AutoReplyEngine, CompiledRules
+
+
+def _matches(automaton: AhoCorasick, text: str) -> set:
+    return {(end, automaton.patterns[idx]) for end, idx in automaton.iter_matches(text)}
+
+
+def test_aho_corasick_reports_overlapping_and_nested_keywords():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+    assert _matches(automaton, "ushers") == {(3, "she"), (3, "he"), (5, "hers")}
+
+
+def test_aho_corasick_follows_failure_links_across_shared_prefixes():
+    automaton = AhoCorasick(["precio", "precios", "cio", "io"])
+
+    found = _matches(automaton, "los precios")
+    assert found == {(9, "precio"), (10, "precios"), (9, "cio"), (9, "io")}
+
+
+def test_aho_corasick_finds_repeated_occurrences():
+    automaton = AhoCorasick(["aa"])
+
+    assert [end for end, _ in automaton.iter_matches("aaaa")] == [1, 2, 3]
+
+
+def _rules(*rules, **config):
+    return CompiledRules({"rules": list(rules), **config})
+
+
+def test_keywords_match_whole_words_without_accents():
+    compiled = _rules({"id": "saludo", "type": "keyword", "keywords": ["hola", "buen día"], "reply": "hi"})
+
+    assert compiled.match("¡Buen dia!")[0].id == "saludo"
+    assert compiled.match("Hola!")[0].id == "saludo"
+    # Subcadena de otra palabra: no dispara
+    assert compiled.match("vivo en holanda") is None
+
+
+def test_overlapping_keywords_of_different_rules_respect_priority():
+    compiled = _rules(
+        {"id": "precio", "type": "keyword", "keywords": ["precio"], "reply": "lista"},
+        {"id": "envio", "type": "keyword", "keywords": ["precio de envio"], "reply": "envio", "priority": 5},
+    )
+
+    rule, fragment = compiled.match("cual es el precio de envío?")
+    assert rule.id == "envio"
+    assert fragment == "precio de envio"
+
+
+def test_intent_requires_min_distinct_keywords():
+    compiled = _rules(
+        {"id": "queja", "type": "intent", "keywords": ["roto", "reclamo", "devolver"], "min_hits": 2, "reply": "x"}
+    )
+
+    assert compiled.match("llegó roto, roto!") is None
+    assert compiled.match("llegó roto y quiero devolver")[0].id == "queja"
+
+
+def test_regex_rules_that_cannot_be_combined_are_dropped_alone():
+    compiled = _rules(
+        {"id": "backref", "type": "regex", "pattern": r"(a)\1", "reply": "x"},
+        {"id": "flag", "type": "regex", "pattern": r"(?i)precio", "reply": "x"},
+        {"id": "grupo", "type": "regex", "pattern": r"(?P<n>\d+)", "reply": "x"},
+        {"id": "orden", "type": "regex", "pattern": r"orden\s*#?(\d+)", "reply": "orden {match}"},
+    )
+
+    assert [rule.id for rule in compiled.rules] == ["orden"]
+    rule, fragment = compiled.match("mi ORDEN #123")
+    assert rule.id == "orden" and fragment == "ORDEN #123"
+
+
+def test_engine_applies_template_default_and_cooldown(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        '{"cooldown_seconds": 60, "default_reply": null,'
+        ' "rules": [{"id": "orden", "type": "regex", "pattern": "orden\\\\s*\\\\d+", "reply": "Revisamos tu {match}"}]}',
+        encoding="utf-8",
+    )
+    engine = AutoReplyEngine(str(path), reload_interval_s=3600)
+
+    async def scenario():
+        assert await engine.reply_for("u1", "hola") is None
+        assert await engine.reply_for("u1", "mi orden 42") == "Revisamos tu orden 42"
+        assert await engine.reply_for("u1", "mi orden 42") is None  # cooldown
+        assert await engine.reply_for("u2", "orden 7") == "Revisamos tu orden 7"
+
+    asyncio.run(scenario())
+
+
+def test_rules_with_unformattable_templates_are_dropped_at_compile_time():
+    compiled = _rules(
+        {"id": "posicional", "type": "keyword", "keywords": ["hola"], "reply": "hola {0}"},
+        {"id": "anonimo", "type": "keyword", "keywords": ["hola"], "reply": "hola {}"},
+        {"id": "abierta", "type": "keyword", "keywords": ["precio"], "reply": "precio: {"},
+        {"id": "spec", "type": "keyword", "keywords": ["precio"], "reply": "{text:d}"},
+        {"id": "ok", "type": "keyword", "keywords": ["precio"], "reply": "Sobre {match}: {{lista}} {otro}"},
+        default_reply="Recibí {}",
+    )
+
+    assert [rule.id for rule in compiled.rules] == ["ok"]
+    assert compiled.default_reply is None
+
+
+def test_valid_templates_format_escaped_and_unknown_fields_literally(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        '{"rules": [{"id": "ok", "type": "keyword", "keywords": ["precio"], "reply": "Sobre {match}: {{lista}} {otro}"}]}',
+        encoding="utf-8",
+    )
+    engine = AutoReplyEngine(str(path), reload_interval_s=3600)
+
+    assert asyncio.run(engine.reply_for("u1", "el PRECIO")) == "Sobre precio: {lista} {otro}"
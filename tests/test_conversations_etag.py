@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.routes import messages
+from app.schemas.messages import Conversation
+from app.services.conversation_cache import ConversationCache, get_conversation_cache
+from app.services.instagram_client import OAuthTokens, get_instagram_client
+from app.services.token_store import get_token_store
+
+
+class FakeGraph:
+    def __init__(self):
+        self.calls = 0
+        self.conversations = [Conversation(id="t1", participants=["ig", "u1"])]
+
+    async def list_conversations(self, tokens):
+        self.calls += 1
+        return list(self.conversations)
+
+
+class FakeTokenStore:
+    async def get_tokens(self):
+        return OAuthTokens("page-token", page_id="page", ig_user_id="ig")
+
+
+def _scenario(steps):
+    graph = FakeGraph()
+    cache = ConversationCache(ttl_s=60)
+    app = FastAPI()
+    app.include_router(messages.router, prefix="/messages")
+    app.dependency_overrides[get_instagram_client] = lambda: graph
+    app.dependency_overrides[get_token_store] = lambda: FakeTokenStore()
+    app.dependency_overrides[get_conversation_cache] = lambda: cache
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await steps(client, graph, cache)
+
+    return asyncio.run(run())
+
+
+def _get(client, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/messages/conversations", headers=headers)
+
+
+def test_unchanged_listing_answers_304_without_calling_graph():
+    async def steps(client, graph, cache):
+        first = await _get(client)
+        again = await _get(client, first.headers["etag"])
+        weak = await _get(client, "W/" + first.headers["etag"])
+        return first, again, weak, graph.calls
+
+    first, again, weak, calls = _scenario(steps)
+
+    assert first.status_code == 200 and first.json()[0]["id"] == "t1"
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+    assert weak.status_code == 304
+    assert calls == 1
+
+
+def test_etag_survives_invalidation_when_graph_returns_the_same_data():
+    async def steps(client, graph, cache):
+        first = await _get(client)
+        cache.invalidate("ig")
+        after = await _get(client, first.headers["etag"])
+        return first, after, graph.calls
+
+    first, after, calls = _scenario(steps)
+
+    # Se volvió a leer Graph, pero el contenido es el mismo: el cliente sigue con su copia
+    assert calls == 2
+    assert after.status_code == 304
+    assert after.headers["etag"] == first.headers["etag"]
+
+
+def test_etag_changes_after_a_real_change():
+    async def steps(client, graph, cache):
+        first = await _get(client)
+        graph.conversations.append(Conversation(id="t2", participants=["ig", "u2"]))
+        cache.invalidate("ig")
+        changed = await _get(client, first.headers["etag"])
+        return first, changed
+
+    first, changed = _scenario(steps)
+
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert [c["id"] for c in changed.json()] == ["t1", "t2"]
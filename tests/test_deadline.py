@@ -0,0 +1,48 @@
+import asyncio
+
+from app.core import deadline
+from app.core.deadline import deadline_scope
+from app.services.token_manager import TokenManager
+
+
+def test_nested_scopes_never_extend_the_outer_deadline():
+    with deadline_scope(1.0):
+        with deadline_scope(60.0):
+            assert deadline.remaining(30) <= 1.0
+        assert not deadline.expired()
+    assert deadline.remaining(30) == 30
+
+
+def test_tasks_spawned_while_detached_do_not_inherit_the_deadline():
+    async def budget() -> float:
+        return deadline.remaining(30)
+
+    async def scenario():
+        with deadline_scope(0.5):
+            inherited = asyncio.create_task(budget())
+            with deadline.detached():
+                detached = asyncio.create_task(budget())
+            assert deadline.remaining(30) <= 0.5  # el scope sigue vigente afuera del bloque
+        return await inherited, await detached
+
+    inherited, detached = asyncio.run(scenario())
+    assert inherited <= 0.5
+    assert detached == 30
+
+
+def test_token_check_scheduled_inside_an_event_runs_without_its_budget(monkeypatch):
+    seen = []
+
+    async def fake_check(self, token):
+        seen.append(deadline.remaining(30))
+
+    monkeypatch.setattr(TokenManager, "check", fake_check)
+
+    async def scenario():
+        manager = TokenManager()
+        with deadline_scope(0.1):
+            manager._schedule_check("tok")
+        await asyncio.gather(*manager._checking.values())
+
+    asyncio.run(scenario())
+    assert seen == [30]
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import app.services.delta_sync as delta_sync_module
+import app.services.instagram_client as instagram_client_module
+import app.services.token_store as token_store_module
+from app.core.config import settings
+from app.services.delta_sync import DeltaSyncEngine
+from app.services.instagram_client import OAuthTokens
+
+NOW = time.time()
+
+
+def _iso(epoch_s: float) -> str:
+    return datetime.fromtimestamp(epoch_s, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+def _msg(mid: str, epoch_s: float, sender: str = "user") -> dict:
+    return {
+        "id": mid,
+        "message": f"texto {mid}",
+        "from": {"id": sender, "username": sender},
+        "to": {"data": [{"id": "ig" if sender != "ig" else "user"}]},
+        "created_time": _iso(epoch_s),
+    }
+
+
+def _thread(updated_s: float, *messages: dict) -> dict:
+    return {"updated_time": _iso(updated_s), "messages": {"data": list(messages)}}
+
+
+class FakeGraph:
+    """Páginas de /conversations indexadas por next_url (None = primera)."""
+
+    def __init__(self):
+        self.pages = {}
+        self.requested = []
+
+    async def conversations_page(self, tokens, next_url=None, messages_limit=20):
+        self.requested.append(next_url)
+        return self.pages[next_url]
+
+
+class FakeFanOut:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, event):
+        self.published.append(event["message_id"])
+
+
+class FakeStore:
+    async def get_tokens(self):
+        return OAuthTokens(access_token="t", page_id="page", ig_user_id="ig")
+
+
+@pytest.fixture
+def env(monkeypatch):
+    graph, fanout, indexed = FakeGraph(), FakeFanOut(), []
+    monkeypatch.setattr(instagram_client_module, "get_instagram_client", lambda: graph)
+    monkeypatch.setattr(token_store_module, "get_token_store", lambda: FakeStore())
+    monkeypatch.setattr(delta_sync_module, "get_event_fanout", lambda: fanout)
+    monkeypatch.setattr(delta_sync_module, "index_message_safely", lambda **kw: indexed.append(kw["mid"]))
+    monkeypatch.setattr(settings, "DELTA_SYNC_MAX_PAGES", 5)
+    monkeypatch.setattr(settings, "DELTA_SYNC_OVERLAP_S", 60.0)
+    engine = DeltaSyncEngine(interval_s=120, min_interval_s=30, max_interval_s=900)
+    return engine, graph, fanout, indexed
+
+
+def test_first_pass_only_sets_the_watermark(env):
+    engine, graph, fanout, indexed = env
+    graph.pages[None] = {
+        "data": [_thread(NOW - 10, _msg("m1", NOW - 10)), _thread(NOW - 20, _msg("m0", NOW - 20))],
+        "paging": {"next": "p2"},
+    }
+
+    result = asyncio.run(engine.sync_once())
+
+    assert result["backfilled"] == 0
+    assert fanout.published == [] and indexed == []
+    # Una sola página: no rellena historia
+    assert graph.requested == [None]
+    assert engine.watermarks["ig"] <= int((time.time() - 60) * 1000)
+    # Lo presente al fijar la marca cuenta como visto
+    assert {"m0", "m1"} <= set(engine._seen)
+
+
+def test_second_pass_stops_paging_at_the_watermark(env):
+    engine, graph, fanout, indexed = env
+    engine.watermarks["ig"] = int((NOW - 300) * 1000)
+    engine.note_seen("via-webhook", int((NOW - 50) * 1000))
+    graph.pages[None] = {
+        "data": [
+            _thread(
+                NOW - 10,
+                _msg("reply", NOW - 10, sender="ig"),
+                _msg("missed", NOW - 40),
+                _msg("via-webhook", NOW - 50),
+                _msg("old", NOW - 600),
+            ),
+            _thread(NOW - 900, _msg("untouched", NOW - 900)),
+        ],
+        "paging": {"next": "p2"},
+    }
+    graph.pages["p2"] = {"data": [_thread(NOW - 1000, _msg("older", NOW - 1000))]}
+
+    result = asyncio.run(engine.sync_once())
+
+    # Corta en el primer hilo sin cambios: la página 2 no se pide
+    assert graph.requested == [None]
+    assert result["threads_changed"] == 1
+    assert result["backfilled"] == 2
+    # En orden cronológico; los salientes solo se indexan
+    assert indexed == ["missed", "reply"]
+    assert fanout.published == ["missed"]
+    assert engine.watermarks["ig"] > int((NOW - 300) * 1000)
+
+
+def test_watermark_trails_the_pass_start_to_catch_late_messages(env):
+    engine, graph, fanout, _ = env
+    started = time.time()
+    graph.pages[None] = {"data": [_thread(NOW + 5, _msg("m1", NOW + 5))]}
+    asyncio.run(engine.sync_once())
+
+    watermark = engine.watermarks["ig"]
+    assert watermark <= int((started - 60) * 1000) + 1000
+    # Un mensaje que entró en un hilo ya recorrido durante la pasada queda por encima de la marca
+    graph.pages[None] = {"data": [_thread(NOW + 5, _msg("late", started - 1), _msg("m1", NOW + 5))]}
+    asyncio.run(engine.sync_once())
+    assert fanout.published == ["late"]
+
+
+def test_truncated_pass_only_advances_to_the_oldest_scanned_thread(env, monkeypatch):
+    engine, graph, _, _ = env
+    monkeypatch.setattr(settings, "DELTA_SYNC_MAX_PAGES", 1)
+    old_watermark = int((NOW - 3600) * 1000)
+    engine.watermarks["ig"] = old_watermark
+    graph.pages[None] = {"data": [_thread(NOW - 10), _thread(NOW - 1800)], "paging": {"next": "p2"}}
+
+    asyncio.run(engine.sync_once())
+
+    # Lo de la página 2 (entre la marca vieja y este hilo) queda para la próxima pasada
+    assert engine.watermarks["ig"] == delta_sync_module._parse_ms(_iso(NOW - 1800))
+
+
+def test_adaptive_interval_reacts_to_drift():
+    engine = DeltaSyncEngine(interval_s=120, min_interval_s=30, max_interval_s=900)
+    engine._adapt(3)
+    assert engine.interval_s == 60
+    engine._adapt(0)
+    assert engine.interval_s == 90
+    for _ in range(3):
+        engine._adapt(5)
+    assert engine.interval_s == 30
+
+
+def test_import_state_respects_the_seen_bound():
+    engine = DeltaSyncEngine(interval_s=120, min_interval_s=30, max_interval_s=900, max_seen=3)
+    engine.note_seen("recent-1", 10)
+    engine.note_seen("recent-2", 20)
+
+    engine.import_state([("watermarks", [("ig", 5)]), ("seen", [("a", 6), ("b", 7), ("c", 8)])])
+
+    assert len(engine._seen) == 3
+    assert {"recent-1", "recent-2"} <= set(engine._seen)
+    assert engine.watermarks == {"ig": 5}
@@ -0,0 +1,111 @@
+import asyncio
+
+from app.core.fair_scheduler import FairScheduler
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _run_queued(sched: FairScheduler, backlog: dict) -> list:
+    """Ocupa el único lugar, encola `backlog` (cuenta -> cantidad) y devuelve el orden de concesión."""
+    order = []
+    gate = asyncio.Event()
+
+    async def hold():
+        async with sched.slot("holder"):
+            await gate.wait()
+
+    async def job(account: str):
+        async with sched.slot(account):
+            order.append(account)
+            await asyncio.sleep(0)
+
+    holder = asyncio.create_task(hold())
+    await _settle()
+    jobs = [asyncio.create_task(job(acc)) for acc, n in backlog.items() for _ in range(n)]
+    await _settle()
+    gate.set()
+    await asyncio.gather(holder, *jobs)
+    return order
+
+
+def test_drr_interleaves_a_burst_with_a_quiet_account():
+    sched = FairScheduler("t", 1, max_in_flight=1)
+    order = asyncio.run(_run_queued(sched, {"busy": 10, "quiet": 2}))
+
+    assert len(order) == 12
+    # La cuenta con 2 eventos no espera detrás de las 10 de la otra
+    assert order[:4].count("quiet") == 2
+
+
+def test_drr_weights_share_capacity_proportionally():
+    sched = FairScheduler("t", 1, max_in_flight=1, weights={"heavy": 2.0})
+    order = asyncio.run(_run_queued(sched, {"heavy": 20, "light": 20}))
+
+    first = order[:18]
+    assert first.count("heavy") == 12
+    assert first.count("light") == 6
+
+
+def test_per_account_cap_leaves_room_for_other_accounts():
+    async def scenario():
+        sched = FairScheduler("t", 4, max_in_flight=2)
+        gate = asyncio.Event()
+        entered = []
+
+        async def job(account: str):
+            async with sched.slot(account):
+                entered.append(account)
+                await gate.wait()
+
+        busy = [asyncio.create_task(job("busy")) for _ in range(5)]
+        await _settle()
+        snapshot = sched.snapshot()
+        assert entered.count("busy") == 2
+        assert snapshot["accounts"]["busy"]["queued"] == 3
+        assert sched.in_flight == 2
+
+        other = asyncio.create_task(job("other"))
+        await _settle()
+        assert "other" in entered
+        assert sched.in_flight == 3
+
+        gate.set()
+        await asyncio.gather(*busy, other)
+        assert sched.in_flight == 0
+        assert sched.snapshot()["accounts"] == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    async def scenario():
+        sched = FairScheduler("t", 1, max_in_flight=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with sched.slot("a"):
+                await gate.wait()
+
+        async def wait_only():
+            async with sched.slot("b"):
+                pass
+
+        holder = asyncio.create_task(hold())
+        await _settle()
+        waiter = asyncio.create_task(wait_only())
+        await _settle()
+        waiter.cancel()
+        await _settle()
+        gate.set()
+        await holder
+        assert waiter.cancelled()
+        assert sched.in_flight == 0
+
+        # El lugar sigue disponible
+        async with sched.slot("c"):
+            assert sched.in_flight == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.routes import webhook
+from app.core import fair_scheduler
+from app.core.admission import AdmissionControlMiddleware, AdmissionController
+from app.core.config import settings
+from app.core.fair_scheduler import FairScheduler
+from app.services import inbound
+from app.services.inbound import InboundDispatcher
+
+
+def _delivery(account: str, n: int) -> dict:
+    return {
+        "object": "instagram",
+        "entry": [
+            {
+                "id": account,
+                "messaging": [
+                    {
+                        "sender": {"id": "user"},
+                        "recipient": {"id": account},
+                        "timestamp": 1_700_000_000_000,
+                        "message": {"mid": f"{account}-{n}", "text": "hola"},
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def _setup(monkeypatch, per_account: int) -> list:
+    """App mínima (webhook detrás de la admisión) con un único lugar por cuenta y en total."""
+    monkeypatch.setattr(settings, "APP_SECRET", "")
+    monkeypatch.setattr(settings, "ADMISSION_MIN_LIMIT", 1)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE", 2)
+    monkeypatch.setitem(fair_scheduler._schedulers, "inbound", FairScheduler("inbound", 1, max_in_flight=1))
+    monkeypatch.setattr(inbound, "_dispatcher", InboundDispatcher(100, per_account))
+
+    processed = []
+
+    async def fake_process(event):
+        await asyncio.sleep(0.01)
+        processed.append(event.recipient)
+
+    monkeypatch.setattr(webhook, "_process_message_event", fake_process)
+    return processed
+
+
+def _client() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(webhook.router_public)
+    guarded = AdmissionControlMiddleware(app, AdmissionController({"/webhooks": 2}))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=guarded), base_url="http://test")
+
+
+def test_quiet_account_is_admitted_and_served_during_a_burst(monkeypatch):
+    processed = _setup(monkeypatch, per_account=50)
+
+    async def run():
+        async with _client() as client:
+            noisy = [client.post("/webhooks/instagram", json=_delivery("noisy", i)) for i in range(20)]
+            responses = await asyncio.gather(*noisy)
+            quiet = await client.post("/webhooks/instagram", json=_delivery("quiet", 0))
+            await inbound.get_inbound_dispatcher().stop(5)
+        return responses + [quiet]
+
+    responses = asyncio.run(run())
+
+    # La espera por cuenta ya no ocupa la admisión: nadie recibe 503
+    assert [r.status_code for r in responses] == [200] * 21
+    assert len(processed) == 21
+    # El evento de la cuenta tranquila no espera detrás de la ráfaga
+    assert processed.index("quiet") <= 2
+
+
+def test_pending_cap_rejects_only_the_saturated_account(monkeypatch):
+    _setup(monkeypatch, per_account=5)
+
+    async def run():
+        async with _client() as client:
+            for i in range(5):
+                assert (await client.post("/webhooks/instagram", json=_delivery("noisy", i))).status_code == 200
+            over = await client.post("/webhooks/instagram", json=_delivery("noisy", 5))
+            quiet = await client.post("/webhooks/instagram", json=_delivery("quiet", 0))
+            snapshot = inbound.get_inbound_dispatcher().snapshot()
+            await inbound.get_inbound_dispatcher().stop(5)
+        return over, quiet, snapshot
+
+    over, quiet, snapshot = asyncio.run(run())
+
+    assert over.status_code == 503
+    assert quiet.status_code == 200
+    assert snapshot["rejected"] == 1
+    assert snapshot["accounts"]["noisy"] == 5
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from app.core import loop_monitor
+from app.core.loop_monitor import BlockingCallError, allow_blocking
+from app.services.auto_reply import AutoReplyEngine
+
+
+def test_blocking_io_in_a_task_is_recorded_even_if_swallowed(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("x", encoding="utf-8")
+
+    async def handler():
+        try:
+            with open(path, encoding="utf-8") as f:
+                f.read()
+        except Exception:
+            pass  # lo que hacía _load_sync: la excepción no llega al test
+
+    asyncio.run(handler())
+
+    violations = loop_monitor.take_strict_violations()
+    assert len(violations) == 1 and "open" in violations[0]
+
+
+def test_listdir_is_checked_but_python_installation_paths_are_ignored(tmp_path):
+    async def handler():
+        os.listdir(sys.prefix)  # imports diferidos recorren site-packages
+        with pytest.raises(BlockingCallError):
+            os.listdir(tmp_path)
+
+    asyncio.run(handler())
+
+    assert len(loop_monitor.take_strict_violations()) == 1
+
+
+def test_threads_and_allow_blocking_are_not_violations(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("x", encoding="utf-8")
+
+    async def handler():
+        await asyncio.to_thread(path.read_text, encoding="utf-8")
+        with allow_blocking():
+            path.read_text(encoding="utf-8")
+
+    asyncio.run(handler())
+
+
+def test_auto_reply_engine_created_in_the_loop_loads_rules_off_the_loop(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        '{"default_reply": null, "rules": [{"id": "hola", "type": "keyword", "keywords": ["hola"], "reply": "¡Hola!"}]}',
+        encoding="utf-8",
+    )
+
+    async def scenario():
+        engine = AutoReplyEngine(str(path), reload_interval_s=3600)
+        return await engine.reply_for("u1", "hola")
+
+    # Antes la carga abría el archivo en el loop y caía al eco por defecto
+    assert asyncio.run(scenario()) == "¡Hola!"
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import socket
+
+import httpx
+import pytest
+
+from app.core.errors import AppError
+from app.services import media
+from app.services.media import MediaRelay, check_public_url
+
+
+def _check(url: str) -> None:
+    asyncio.run(check_public_url(url))
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "http://10.0.0.5/a.jpg",
+        "http://192.168.1.10/a.jpg",
+        "http://127.0.0.1:8000/a.jpg",
+        "http://[::1]/a.jpg",
+        "http://169.254.169.254/latest/meta-data",  # metadata de la nube (link-local)
+        "http://[fe80::1]/a.jpg",
+        "http://[::ffff:127.0.0.1]/a.jpg",  # IPv4 mapeada en IPv6
+        "http://[::ffff:10.0.0.5]/a.jpg",
+        "http://0.0.0.0/a.jpg",
+    ],
+)
+def test_non_public_addresses_are_rejected(url):
+    with pytest.raises(AppError) as exc:
+        _check(url)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://93.184.216.34/a.jpg", "gopher://x/", "http:///a.jpg"])
+def test_only_http_urls_with_a_host_are_accepted(url):
+    with pytest.raises(AppError):
+        _check(url)
+
+
+def test_public_addresses_are_accepted():
+    _check("https://93.184.216.34/a.jpg")
+    _check("http://[2606:2800:220:1::]/a.jpg")
+
+
+def _fake_dns(monkeypatch, table: dict) -> None:
+    async def getaddrinfo(self, host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (ip, port)) for ip in table[host]]
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, "getaddrinfo", getaddrinfo)
+
+
+def test_hostnames_are_rejected_if_any_resolved_address_is_internal(monkeypatch):
+    _fake_dns(monkeypatch, {"cdn.example": ["93.184.216.34"], "mixed.example": ["93.184.216.34", "10.0.0.5"]})
+
+    _check("https://cdn.example/a.jpg")
+    with pytest.raises(AppError):
+        _check("https://mixed.example/a.jpg")
+
+
+def _relay(monkeypatch, tmp_path, handler, **limits) -> tuple:
+    requested = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        return handler(request)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+    monkeypatch.setattr(media, "get_media_http", lambda: client)
+    return MediaRelay(str(tmp_path), **limits), requested
+
+
+def test_redirects_are_rechecked_on_every_hop(monkeypatch, tmp_path):
+    def handler(request):
+        if request.url.host == "93.184.216.34":
+            return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data"})
+        return httpx.Response(200, content=b"secreto")
+
+    relay, requested = _relay(monkeypatch, tmp_path, handler)
+
+    with pytest.raises(AppError):
+        asyncio.run(relay.store_blob("http://93.184.216.34/a.jpg"))
+    # El destino interno nunca se pidió
+    assert requested == ["http://93.184.216.34/a.jpg"]
+
+
+def test_local_blobs_are_pruned_least_recently_used_first(monkeypatch, tmp_path):
+    def handler(request):
+        return httpx.Response(200, content=request.url.path.encode(), headers={"content-type": "image/png"})
+
+    relay, _ = _relay(monkeypatch, tmp_path, handler, max_files=2)
+
+    async def store(name: str, mtime: int) -> str:
+        path = (await relay.store_blob(f"http://93.184.216.34/{name}"))["path"]
+        os.utime(path, (mtime, mtime))
+        return path
+
+    async def scenario():
+        a = await store("a", 1)
+        b = await store("b", 2)
+        await store("a", 3)  # mismo contenido: se reutiliza y pasa a ser el más reciente
+        c = await store("c", 4)
+        return a, b, c
+
+    a, b, c = asyncio.run(scenario())
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
@@ -0,0 +1,105 @@
+from app.services.search_index import _MAX_PREFIX_EXPANSION, SearchIndex
+
+
+def _index(*messages, max_docs: int = 100) -> SearchIndex:
+    index = SearchIndex(max_docs=max_docs)
+    for i, (mid, text) in enumerate(messages):
+        index.add_message(mid=mid, text=text, sender_id="u", recipient_id="ig", timestamp=1000 + i)
+    return index
+
+
+def _mids(result) -> list:
+    return [doc.mid for doc, _ in result[1]]
+
+
+def test_terms_are_anded():
+    index = _index(
+        ("m1", "envío rápido a domicilio"),
+        ("m2", "envío estándar"),
+        ("m3", "retiro rápido en tienda"),
+    )
+
+    total, _, _ = index.search("envio rapido")
+    assert total == 1
+    assert _mids(index.search("envio rapido")) == ["m1"]
+    assert index.search("envio inexistente") == (0, [], False)
+
+
+def test_prefix_terms_expand_over_the_vocabulary():
+    index = _index(("m1", "precio del producto"), ("m2", "los precios subieron"), ("m3", "presupuesto"))
+
+    assert sorted(_mids(index.search("precio*"))) == ["m1", "m2"]
+    assert sorted(_mids(index.search("pre", prefix=True))) == ["m1", "m2", "m3"]
+    # Sin '*' ni prefix=True el término es exacto
+    assert _mids(index.search("precio")) == ["m1"]
+
+
+def test_prefix_and_exact_terms_combine_with_and():
+    index = _index(("m1", "precio del envío"), ("m2", "precios de tienda"), ("m3", "envío gratis"))
+
+    assert _mids(index.search("prec* envio")) == ["m1"]
+
+
+def test_matching_ignores_case_and_accents_and_covers_usernames():
+    index = SearchIndex()
+    index.add_message(mid="m1", text="Canción Ñandú", sender_id="u", sender_username="Juan_Perez", timestamp=1)
+
+    assert _mids(index.search("CANCION nandu")) == ["m1"]
+    assert _mids(index.search("juan_perez")) == ["m1"]
+
+
+def test_bm25_ranks_the_more_specific_message_first():
+    index = _index(
+        ("long", "pedido " + " ".join(f"relleno{i}" for i in range(30))),
+        ("short", "pedido pedido urgente"),
+        ("other", "nada que ver"),
+    )
+
+    assert _mids(index.search("pedido")) == ["short", "long"]
+
+
+def test_eviction_drops_oldest_messages_and_their_terms():
+    index = _index(("m1", "zanahoria"), ("m2", "tomate"), ("m3", "lechuga"), max_docs=2)
+
+    assert len(index) == 2
+    assert index.search("zanahoria") == (0, [], False)
+    assert index.search("zan*") == (0, [], False)
+    assert "zanahoria" not in index._terms
+    assert _mids(index.search("lechuga")) == ["m3"]
+
+
+def test_reindexing_the_same_mid_replaces_it():
+    index = SearchIndex()
+    index.add_message(mid="m1", text="hola", sender_id="u", timestamp=1)
+    index.add_message(mid="m1", text=None, sender_id="u", sender_username="maria", timestamp=1)
+
+    assert len(index) == 1
+    assert _mids(index.search("hola maria")) == ["m1"]
+
+
+def test_wide_prefix_keeps_the_most_frequent_terms_and_flags_truncation():
+    index = SearchIndex()
+    # "a00".."a99" una vez cada uno; "azul" (al final del orden alfabético) en muchos mensajes
+    for i in range(100):
+        index.add_message(mid=f"r{i}", text=f"a{i:02d}", sender_id="u", timestamp=i + 1)
+    for i in range(5):
+        index.add_message(mid=f"z{i}", text="azul", sender_id="u", timestamp=1000 + i)
+
+    result = index.search("a*", limit=200)
+    assert result.truncated
+    # Por orden alfabético "azul" quedaba fuera de los primeros 64 términos
+    assert {f"z{i}" for i in range(5)} <= {doc.mid for doc, _ in result.hits}
+    assert result.total == 5 + _MAX_PREFIX_EXPANSION - 1
+    assert not index.search("azu*").truncated
+
+
+def test_scoring_is_capped_to_the_most_recent_matches_with_exact_total():
+    index = SearchIndex(max_scored=3)
+    for i in range(10):
+        index.add_message(mid=f"m{i}", text="pedido", sender_id="u", timestamp=i + 1)
+
+    result = index.search("pedido", limit=10)
+    assert result.total == 10
+    assert result.truncated
+    assert [doc.mid for doc, _ in result.hits] == ["m9", "m8", "m7"]
+    assert not SearchIndex().search("pedido").truncated
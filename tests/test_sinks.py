@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.sinks import POLICY_BLOCK, POLICY_DROP, QueueSink, Sink, SinkWorker
+
+
+class SlowSink(Sink):
+    """Sink que entrega solo cuando se abre `gate`."""
+
+    def __init__(self):
+        self.name = "slow"
+        self.gate = asyncio.Event()
+        self.items = []
+
+    async def write_batch(self, events):
+        await self.gate.wait()
+        self.items.extend(events)
+
+
+def test_sink_without_write_batch_cannot_be_instantiated():
+    class Incomplete(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_drop_policy_discards_new_events_when_the_queue_is_full():
+    async def scenario():
+        worker = SinkWorker(QueueSink("q"), max_queue=2, policy=POLICY_DROP)
+        results = [await worker.put({"n": i}) for i in range(3)]
+        return results, worker.metrics()
+
+    results, metrics = asyncio.run(scenario())
+
+    assert results == [True, True, False]
+    assert metrics["queue_depth"] == 2 and metrics["dropped"] == 1 and metrics["enqueued"] == 2
+    assert metrics["lag_ms"] >= 0.0
+
+
+def test_block_policy_waits_for_room_then_gives_up(monkeypatch):
+    monkeypatch.setattr(settings, "SINK_BLOCK_TIMEOUT_S", 0.05)
+
+    async def scenario():
+        sink = SlowSink()
+        worker = SinkWorker(sink, max_queue=1, policy=POLICY_BLOCK)
+        assert await worker.put({"n": 0})
+        # Sin consumidor: espera SINK_BLOCK_TIMEOUT_S y descarta
+        assert await worker.put({"n": 1}) is False
+
+        worker.start()
+        sink.gate.set()
+        # Con consumidor: el publicador espera y entra cuando se libera lugar
+        assert await worker.put({"n": 2})
+        await worker.stop(1.0)
+        return sink.items, worker.metrics()
+
+    items, metrics = asyncio.run(scenario())
+
+    assert [e["n"] for e in items] == [0, 2]
+    assert metrics["dropped"] == 1 and metrics["delivered"] == 2 and metrics["queue_depth"] == 0
+
+
+def test_stop_drains_queued_events_in_batches():
+    async def scenario():
+        sink = QueueSink("q")
+        worker = SinkWorker(sink, batch_size=3, batch_wait_ms=10)
+        for i in range(7):
+            await worker.put({"n": i})
+        worker.start()
+        await worker.stop(1.0)
+        return sink.drain(), worker.metrics()
+
+    items, metrics = asyncio.run(scenario())
+
+    assert [e["n"] for e in items] == list(range(7))
+    assert metrics["delivered"] == 7 and metrics["lag_ms"] == 0.0
+
+
+def test_stop_gives_up_after_the_drain_timeout():
+    async def scenario():
+        sink = SlowSink()
+        worker = SinkWorker(sink, retries=0)
+        for i in range(3):
+            await worker.put({"n": i})
+        worker.start()
+        await worker.stop(0.05)
+        return sink.items, worker.metrics()
+
+    items, metrics = asyncio.run(scenario())
+
+    assert items == []
+    assert metrics["delivered"] == 0 and metrics["queue_depth"] == 2
@@ -0,0 +1,163 @@
+import asyncio
+import marshal
+import os
+import time
+
+import pytest
+
+from app.schemas.messages import Conversation
+from app.services import snapshot
+from app.services.conversation_cache import ConversationCache
+from app.services.delta_sync import DeltaSyncEngine
+from app.services.profile_cache import ProfileCache
+from app.services.snapshot import _HEADER, CacheSnapshotter, decode_snapshot, encode_snapshot
+from app.services.token_manager import TokenManager, TokenStatus
+
+STATE = {
+    "profiles": [("u1", 1e12, "maria"), ("u2", 1e12, None)],
+    "conversations": [("ig", 3, "abc", b'[{"id":"t1"}]', 1700000000.5, False)],
+    "tokens": [("fp", True, 0, ["instagram_basic"], 1700000000.0, None)],
+    "delta_sync": [("watermarks", [("ig", 5)]), ("seen", [("m1", 6)])],
+}
+
+
+def test_encode_decode_round_trip():
+    data = encode_snapshot(STATE, 1700000000.25)
+
+    assert decode_snapshot(data) == (1700000000.25, STATE)
+
+
+def test_decode_rejects_other_formats_and_truncated_files():
+    data = encode_snapshot(STATE, 1.0)
+    header = list(_HEADER.unpack_from(data))
+
+    def with_header(**changes) -> bytes:
+        fields = dict(zip(("magic", "version", "marshal_version", "created_at", "size"), header))
+        fields.update(changes)
+        return _HEADER.pack(*fields.values()) + data[_HEADER.size:]
+
+    assert decode_snapshot(data[:-1]) is None
+    assert decode_snapshot(data[:5]) is None
+    assert decode_snapshot(with_header(magic=b"XXXX")) is None
+    assert decode_snapshot(with_header(version=snapshot.FORMAT_VERSION + 1)) is None
+    assert decode_snapshot(with_header(marshal_version=marshal.version + 1)) is None
+
+
+def test_write_is_atomic(tmp_path, monkeypatch):
+    path = tmp_path / "snap" / "caches.bin"
+    snapshotter = CacheSnapshotter(str(path), interval_s=60, max_age_s=3600)
+    snapshotter._write(STATE, 1.0)
+    assert os.listdir(path.parent) == ["caches.bin"]  # sin .tmp colgados
+
+    def fail_replace(src, dst):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(snapshot.os, "replace", fail_replace)
+    with pytest.raises(OSError):
+        snapshotter._write({"profiles": []}, 2.0)
+    # El snapshot anterior sigue entero
+    assert decode_snapshot(path.read_bytes()) == (1.0, STATE)
+
+
+def _fresh_caches(monkeypatch) -> dict:
+    caches = {
+        "profiles": ProfileCache(),
+        "conversations": ConversationCache(ttl_s=60),
+        "tokens": TokenManager(),
+        "delta_sync": DeltaSyncEngine(interval_s=120, min_interval_s=30, max_interval_s=900),
+    }
+    monkeypatch.setattr(snapshot, "_caches", lambda: caches)
+    return caches
+
+
+def test_save_then_load_restores_every_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "caches.bin")
+    before = _fresh_caches(monkeypatch)
+    before["profiles"].set("u1", "maria")
+    entry = before["conversations"].store("ig", [Conversation(id="t1", participants=["ig", "u1"])])
+    before["tokens"]._status["fp"] = TokenStatus(True, 0, ["instagram_basic"])
+    before["delta_sync"].watermarks["ig"] = 5
+    before["delta_sync"].note_seen("m1", 6)
+    asyncio.run(CacheSnapshotter(path, interval_s=60, max_age_s=3600).save())
+
+    after = _fresh_caches(monkeypatch)
+    loader = CacheSnapshotter(path, interval_s=60, max_age_s=3600)
+    asyncio.run(loader.load())
+
+    assert loader.loaded == {"profiles": 1, "conversations": 1, "tokens": 1, "delta_sync": 1}
+    assert after["profiles"].get("u1") == (True, "maria")
+    restored = after["conversations"]._entries["ig"]
+    assert restored.etag == entry.etag and restored.stale
+    assert after["tokens"]._status["fp"].is_valid
+    assert after["delta_sync"].watermarks == {"ig": 5} and "m1" in after["delta_sync"]._seen
+
+
+def test_load_ignores_snapshots_older_than_max_age(tmp_path, monkeypatch):
+    path = tmp_path / "caches.bin"
+    path.write_bytes(encode_snapshot(STATE, time.time() - 7200))
+    caches = _fresh_caches(monkeypatch)
+
+    asyncio.run(CacheSnapshotter(str(path), interval_s=60, max_age_s=3600).load())
+
+    assert caches["profiles"].export_state() == []
+
+
+def test_profile_import_skips_expired_and_never_overwrites():
+    cache = ProfileCache(max_entries=2)
+    cache.set("u1", "nuevo")
+
+    loaded = cache.import_state([("u1", 1e12, "viejo"), ("u2", 1.0, "vencido"), ("u3", 1e12, "otro")])
+
+    assert loaded == 1
+    assert cache.get("u1") == (True, "nuevo")
+    assert cache.get("u2") == (False, None)
+    # Los restaurados quedan como los más viejos: salen primero
+    cache.set("u4", "recien")
+    assert cache.get("u3") == (False, None)
+
+
+def test_conversation_import_is_stale_and_keeps_entries_resolved_since_boot():
+    cache = ConversationCache(ttl_s=60)
+    live = cache.store("ig", [Conversation(id="t1", participants=["ig"])])
+
+    loaded = cache.import_state(
+        [("ig", 9, "x", b"[]", time.time(), False), ("page", 4, "d", b"[]", time.time(), False)]
+    )
+
+    assert loaded == 1
+    assert cache.fresh("ig") is live
+    assert cache.fresh("page") is None  # stale: se vuelve a leer de Graph
+    assert cache._entries["page"].etag == '"c4-d"'
+
+
+def test_token_import_skips_invalid_and_existing_statuses():
+    manager = TokenManager()
+    manager._status["live"] = TokenStatus(False, 0, error="190")
+
+    loaded = manager.import_state(
+        [("live", True, 0, [], 1.0, None), ("bad", False, 0, [], 1.0, "190"), ("ok", True, 0, [], 1.0, None)]
+    )
+
+    assert loaded == 1
+    assert set(manager._status) == {"live", "ok"}
+    assert not manager._status["live"].is_valid
+
+
+def test_delta_sync_restores_seen_as_oldest_and_exports_only_above_the_floor():
+    engine = DeltaSyncEngine(interval_s=120, min_interval_s=30, max_interval_s=900, max_seen=4)
+    engine.watermarks["ig"] = 100
+    engine.note_seen("live", 150)
+
+    engine.import_state([("watermarks", [("ig", 1), ("page", 50)]), ("seen", [("a", 60), ("b", 120)])])
+
+    assert engine.watermarks == {"ig": 100, "page": 50}
+    assert list(engine._seen) == ["b", "a", "live"]
+    engine.note_seen("n1", 200)
+    engine.note_seen("n2", 210)
+    # Al pasar el tope se descartan primero los restaurados
+    assert list(engine._seen) == ["a", "live", "n1", "n2"]
+
+    exported = dict(engine.export_state())
+    assert [mid for mid, _ in exported["seen"]] == ["a", "live", "n1", "n2"]
+    engine.watermarks["page"] = 100
+    assert [mid for mid, _ in dict(engine.export_state())["seen"]] == ["live", "n1", "n2"]